@@ -19,7 +19,7 @@ load_dotenv(Path(__file__).parent / ".env")
 from src.utils.config import load_config
 from src.utils.llm_client import LLMClient
 from src.utils.cost_tracker import CostTracker
-from src.utils.db import init_db
+from src.utils.db import init_db, configure_db
 
 
 def check_agent_teams_available() -> bool:
@@ -41,7 +41,10 @@ def is_lite_mode(config: dict) -> bool:
 def run_pipeline(config: dict):
     """完整 pipeline：抓取 → 清洗 → GPU标签 → 三层漏斗 → 痛点提取 → 推理需求 → PPHI → 报告"""
     # DB 初始化（只在进程首次调用时执行建表+迁移）
+    configure_db(config.get("database"))
     init_db()
+    from src.utils.content_store import configure_content_store
+    configure_content_store(config)
 
     lite = is_lite_mode(config)
     if lite:
@@ -64,12 +67,23 @@ def run_pipeline(config: dict):
         return
     print()
 
+    skip_steps = config.get("lite_mode", {}).get("skip_steps", []) if lite else []
+
+    # 流式模式：每个源抓完即在后台清洗/打标/过滤/漏斗分类，与后续抓取重叠
+    stream = None
+    if config.get("runtime", {}).get("streaming", False):
+        from src.analyzers.stream import StreamingPreprocessor
+        stream = StreamingPreprocessor(config, llm, skip_ai_filter="ai_filter" in skip_steps)
+
     # 1. 抓取
     from src.scrapers import scrape_all_forums
-    print("[1] 数据采集...")
+    print("[1] 数据采集..." + ("（流式预处理）" if stream else ""))
     skip_sources = config.get("lite_mode", {}).get("skip_sources", []) if lite else []
-    raw_posts = scrape_all_forums(config, skip_sources=skip_sources)
+    raw_posts = scrape_all_forums(config, skip_sources=skip_sources,
+                                  on_source_done=stream.submit if stream else None)
     print(f"  获取 {len(raw_posts)} 条新讨论")
+    if stream and not raw_posts:
+        stream.finish()
     if not raw_posts:
         print("  本轮无新数据，重新计算历史排名（PPHI 时间衰减）")
         print()
@@ -94,44 +108,58 @@ def run_pipeline(config: dict):
         return
     print()
 
-    # 2. 清洗
-    from src.cleaners import clean_data
-    print("[2] 数据清洗...")
-    cleaned = clean_data(raw_posts, config)
-    print(f"  去重后 {len(cleaned)} 条")
-    print()
-
-    # 3. GPU 产品标签（L0 本地，零 token）
-    from src.utils.gpu_tagger import tag_posts
-    print("[3] GPU 产品标签...")
-    cleaned = tag_posts(cleaned)
-    tagged_count = sum(1 for p in cleaned if p.get("_gpu_tags", {}).get("models"))
-    print(f"  识别到具体型号: {tagged_count} 条 | 识别到品牌: {sum(1 for p in cleaned if p.get('_gpu_tags', {}).get('brands'))} 条")
-    print()
-
-    # 3.5 AI 相关性过滤（在 GPU tagger 之后，利用 _gpu_tags 快速通道）
-    skip_steps = config.get("lite_mode", {}).get("skip_steps", []) if lite else []
-    if "ai_filter" in skip_steps:
-        print("[3.5] AI 相关性过滤... 跳过（轻量模式）")
+    if stream:
+        # 2-4. 流式预处理已随抓取完成，这里只等待尾批并做 L3 分流
+        from src.analyzers.funnel import select_funnel
+        print("[2-4] 流式预处理收尾（清洗 → GPU 标签 → AI 过滤 → 漏斗 L1/L2）...")
+        classified = stream.finish()
+        print(f"  去重后 {stream.cleaned_count} 条 | 识别到具体型号 {stream.tagged_models} 条 | "
+              f"AI 过滤排除 {stream.dropped} 条 | 进入漏斗 {len(classified)} 条")
+        deep_posts, light_posts = select_funnel(classified)
+        print()
     else:
-        from src.filters import filter_gpu_relevant
-        print("[3.5] AI 相关性过滤...")
-        pre_count = len(cleaned)
-        cleaned = filter_gpu_relevant(cleaned, llm, shadow=False)
-        dropped_count = pre_count - len(cleaned)
-        # 持久化 relevance 结果到 DB
+        # 2. 清洗
+        from src.cleaners import clean_data
+        print("[2] 数据清洗...")
+        cleaned = clean_data(raw_posts, config)
+        print(f"  去重后 {len(cleaned)} 条")
+        print()
+
+        # 3. GPU 产品标签（L0 本地，零 token）
+        from src.utils.gpu_tagger import tag_posts
+        print("[3] GPU 产品标签...")
+        cleaned = tag_posts(cleaned)
+        tagged_count = sum(1 for p in cleaned if p.get("_gpu_tags", {}).get("models"))
+        print(f"  识别到具体型号: {tagged_count} 条 | 识别到品牌: {sum(1 for p in cleaned if p.get('_gpu_tags', {}).get('brands'))} 条")
         try:
-            from src.utils.db import save_posts
-            save_posts(cleaned)
+            from src.utils.db import save_post_tags
+            save_post_tags(cleaned)
         except Exception as e:
-            print(f"  [!] 保存 relevance 结果失败: {e}")
-    print()
+            print(f"  [!] 保存 GPU 标签失败: {e}")
+        print()
 
-    # 4. 三层漏斗
-    from src.analyzers.funnel import run_funnel
-    print("[4] 三层漏斗筛选...")
-    deep_posts, light_posts = run_funnel(cleaned, llm)
-    print()
+        # 3.5 AI 相关性过滤（在 GPU tagger 之后，利用 _gpu_tags 快速通道）
+        if "ai_filter" in skip_steps:
+            print("[3.5] AI 相关性过滤... 跳过（轻量模式）")
+        else:
+            from src.filters import filter_gpu_relevant
+            print("[3.5] AI 相关性过滤...")
+            pre_count = len(cleaned)
+            cleaned = filter_gpu_relevant(cleaned, llm, shadow=False)
+            dropped_count = pre_count - len(cleaned)
+            # 持久化 relevance 结果到 DB
+            try:
+                from src.utils.db import update_relevance
+                update_relevance(cleaned)
+            except Exception as e:
+                print(f"  [!] 保存 relevance 结果失败: {e}")
+        print()
+
+        # 4. 三层漏斗
+        from src.analyzers.funnel import run_funnel
+        print("[4] 三层漏斗筛选...")
+        deep_posts, light_posts = run_funnel(cleaned, llm)
+        print()
 
     # 5. 痛点提取（对 deep + light 分别处理）
     from src.analyzers import analyze_pain_points, infer_hidden_needs, merge_pain_insights
@@ -208,23 +236,23 @@ def run_pipeline(config: dict):
                     from src.utils.db import get_db
                     import json as _json
                     backfill_names = set(b["pain_point"] for b in backfill)
-                    for hn in hidden_needs:
-                        orig = hn.get("_original_pain", "") or hn.get("pain_point", "")
-                        if orig in backfill_names and hn.get("hidden_need"):
-                            inferred_obj = {
-                                "hidden_need": hn["hidden_need"],
-                                "confidence": hn.get("confidence", 0.5),
-                                "reasoning_chain": hn.get("reasoning_chain", []),
-                                "munger_review": hn.get("munger_review"),
-                            }
-                            with get_db() as conn:
+                    with get_db() as conn:
+                        for hn in hidden_needs:
+                            orig = hn.get("_original_pain", "") or hn.get("pain_point", "")
+                            if orig in backfill_names and hn.get("hidden_need"):
+                                inferred_obj = {
+                                    "hidden_need": hn["hidden_need"],
+                                    "confidence": hn.get("confidence", 0.5),
+                                    "reasoning_chain": hn.get("reasoning_chain", []),
+                                    "munger_review": hn.get("munger_review"),
+                                }
                                 conn.execute(
                                     """UPDATE pphi_history SET hidden_need = ?, inferred_need_json = ?
                                        WHERE pain_point = ? AND (hidden_need IS NULL OR hidden_need = '')
                                        AND run_date = (SELECT MAX(run_date) FROM pphi_history)""",
                                     (hn["hidden_need"], _json.dumps(inferred_obj, ensure_ascii=False), orig)
                                 )
-                            print(f"    回填: {orig[:25]} → {hn['hidden_need'][:30]}")
+                                print(f"    回填: {orig[:25]} → {hn['hidden_need'][:30]}")
                 except Exception as e:
                     print(f"    [!] 回填写入失败: {e}")
     print()
@@ -339,14 +367,28 @@ def run_pipeline(config: dict):
     if usage["fallback_count"] > 0:
         print(f"  [!] LLM 降级 {usage['fallback_count']} 次 | 实际模型: {usage['models_used']}")
 
-    # DB 备份（每轮结束后备份，保留最近 7 份）
+    # DB 备份（每轮结束后在线备份，保留策略见 database.backup）
     try:
         from src.utils.db import backup_db, cleanup_old_history
-        backup_db()
+        backup_cfg = config.get("database", {}).get("backup", {})
+        backup_db(max_backups=backup_cfg.get("keep", 7),
+                  compress=backup_cfg.get("compress", False),
+                  keep_daily=backup_cfg.get("keep_daily", 0),
+                  pages_per_step=backup_cfg.get("pages_per_step", 1024))
         cleanup_old_history(keep_runs=30)
+        from src.cleaners.near_dup import prune_index
+        prune_index(config)
     except Exception as e:
         print(f"  [!] DB 备份/清理失败: {e}")
 
+    # 内容库维护（压实旧 JSONL、冷热分层）放到后台，不占用本轮时间
+    from src.utils.content_store import start_background_maintenance
+    start_background_maintenance(config)
+
+    from src.utils.db import get_db_stats
+    db_stats = get_db_stats()
+    print(f"[DB] 连接 {db_stats['connections_opened']} 次 | 语句 {db_stats['queries']} 条 | 事务 {db_stats['transactions']} 个")
+
     # 周报（每周一自动生成）
     if datetime.now().weekday() == 0:  # Monday
         try:
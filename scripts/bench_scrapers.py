@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""爬虫离线基准：用录制的 HTTP 响应回放，测各数据源解析吞吐
+
+用法:
+  python scripts/bench_scrapers.py --record            # 联网抓一轮，录制到 data/cassettes/
+  python scripts/bench_scrapers.py                     # 回放全部数据源（不联网、零延迟）
+  python scripts/bench_scrapers.py -s techpowerup mydrivers --repeat 20
+
+回放时只调用 fetch_posts（不写 raw JSONL / .last_id / DB），
+耗时即解析 + GPU 标签时间，可用来对比正则改动前后的性能和产出。
+"""
+
+import sys
+import time
+import argparse
+import copy
+sys.stdout.reconfigure(encoding='utf-8')
+sys.path.insert(0, ".")
+from pathlib import Path
+from dotenv import load_dotenv
+load_dotenv(Path(".env"))
+
+from src.utils.config import load_config
+from src.scrapers import _get_scraper_map
+
+
+def bench_source(name: str, scraper_cls, config: dict, repeat: int) -> dict:
+    """回放 repeat 次，返回 {posts, requests_missed, best_sec, mean_sec}"""
+    timings = []
+    posts = []
+    misses = 0
+    for _ in range(repeat):
+        scraper = scraper_cls(config)
+        t0 = time.perf_counter()
+        posts = scraper.fetch_posts(None)
+        timings.append(time.perf_counter() - t0)
+        misses = scraper.replay_misses
+    return {
+        "posts": len(posts),
+        "misses": misses,
+        "best": min(timings),
+        "mean": sum(timings) / len(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫离线基准（HTTP 录制/回放）")
+    parser.add_argument("-s", "--sources", nargs="*", help="只测指定数据源（默认全部已实现爬虫）")
+    parser.add_argument("--record", action="store_true", help="联网运行一轮并录制响应")
+    parser.add_argument("--repeat", type=int, default=5, help="回放重复次数（取最好成绩）")
+    args = parser.parse_args()
+
+    config = copy.deepcopy(load_config("config/config.yaml"))
+    config.setdefault("runtime", {})["http_mode"] = "record" if args.record else "replay"
+
+    scraper_map = _get_scraper_map()
+    names = args.sources or list(scraper_map)
+    unknown = [n for n in names if n not in scraper_map]
+    if unknown:
+        print(f"[!] 未知数据源: {', '.join(unknown)}")
+        names = [n for n in names if n in scraper_map]
+
+    if args.record:
+        from src.scrapers.base_scraper import close_http_clients
+        for name in names:
+            print(f"录制 {name}...")
+            t0 = time.time()
+            try:
+                posts = scraper_map[name](config).fetch_posts(None)
+                print(f"  {len(posts)} 条 ({time.time() - t0:.0f}s)")
+            except Exception as e:
+                print(f"  [!] {name} 录制失败: {e}")
+        close_http_clients()
+        return
+
+    print(f"{'source':<12} {'posts':>6} {'miss':>5} {'best ms':>9} {'mean ms':>9} {'posts/s':>9}")
+    for name in names:
+        try:
+            r = bench_source(name, scraper_map[name], config, max(1, args.repeat))
+        except Exception as e:
+            print(f"{name:<12} [!] 回放失败: {e}")
+            continue
+        rate = r["posts"] / r["best"] if r["best"] > 0 else 0
+        print(f"{name:<12} {r['posts']:>6} {r['misses']:>5} {r['best'] * 1000:>9.1f} "
+              f"{r['mean'] * 1000:>9.1f} {rate:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
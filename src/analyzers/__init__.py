@@ -770,3 +770,5 @@ def _save_results(results: list[dict], config: dict, prefix: str):
     with open(output_file, "a", encoding="utf-8") as f:
         for r in results:
             f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+    from src.utils.columnar import save_records
+    save_records(prefix, results, config)
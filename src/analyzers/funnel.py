@@ -138,8 +138,8 @@ def l3_select(posts: list[dict], max_deep: int = 50, max_light: int = 50) -> tup
     return deep, light
 
 
-def run_funnel(posts: list[dict], llm: LLMClient) -> tuple[list[dict], list[dict]]:
-    """执行完整三层漏斗，返回 (deep_list, light_list)
+def classify_funnel(posts: list[dict], llm: LLMClient) -> list[dict]:
+    """漏斗 L1 + L2：信号打分 + LLM 标题分类（流式模式下按批调用）
 
     v9 改进：无信号帖子也送 L2 判断，不再直接标 class=0
     （防止漏掉"标题无信号但内容有痛点"的帖子）
@@ -157,7 +157,16 @@ def run_funnel(posts: list[dict], llm: LLMClient) -> tuple[list[dict], list[dict
     all_for_l2 = pain_posts + no_signal
     if all_for_l2:
         all_for_l2 = l2_batch_classify(all_for_l2, llm)
-    posts = all_for_l2
+    return all_for_l2
+
+
+def select_funnel(posts: list[dict]) -> tuple[list[dict], list[dict]]:
+    """漏斗 L3：对已完成 L1/L2 的帖子分流，返回 (deep_list, light_list)
+
+    先按"有信号优先、信号分降序"重排，多批结果合并后与整批处理顺序一致。
+    """
+    posts = sorted(posts, key=lambda x: (x.get("_pain_signals", 0) > 0,
+                                         x.get("_pain_signal_score", 0)), reverse=True)
 
     # L3
     deep, light = l3_select(posts)
@@ -174,3 +183,8 @@ def run_funnel(posts: list[dict], llm: LLMClient) -> tuple[list[dict], list[dict
             print(f"  L3 保底: 从 light 提升 {len(promoted)} 条到 deep（总计 {len(deep)} 条）")
 
     return deep, light
+
+
+def run_funnel(posts: list[dict], llm: LLMClient) -> tuple[list[dict], list[dict]]:
+    """执行完整三层漏斗，返回 (deep_list, light_list)"""
+    return select_funnel(classify_funnel(posts, llm))
@@ -0,0 +1,87 @@
+"""GPU-Insight 流式预处理 — 抓完一个源就开始清洗/打标/过滤/漏斗分类
+
+runtime.streaming 开启时，scrape_all_forums 每完成一个数据源就把新帖交给这里，
+后台线程按源（微批）依次执行：清洗 → GPU 标签 → AI 相关性过滤 → 漏斗 L1/L2。
+LLM 分类与仍在抓取的慢源（Bilibili、Reddit 评论）重叠执行，
+抓取结束后只剩最后一批的处理时间，再统一做 L3 分流。
+"""
+
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class StreamingPreprocessor:
+    """单后台线程串行处理各源微批（LLMClient 只在该线程内使用）"""
+
+    def __init__(self, config: dict, llm, skip_ai_filter: bool = False):
+        self.config = config
+        self.llm = llm
+        self.skip_ai_filter = skip_ai_filter
+        self._queue: queue.Queue = queue.Queue()
+        self._seen: set = set()  # 跨源内容去重
+        self.cleaned_count = 0
+        self.tagged_models = 0
+        self.dropped = 0
+        self.classified: list[dict] = []
+        self._thread = threading.Thread(target=self._worker, name="stream-preprocess", daemon=True)
+        self._thread.start()
+
+    def submit(self, source_name: str, posts: list[dict]):
+        """scrape_all_forums 回调：某个源入库完成，交付其新帖"""
+        if posts:
+            self._queue.put((source_name, posts))
+
+    def finish(self, timeout: float = None) -> list[dict]:
+        """等待所有已提交批次处理完，返回完成 L1/L2 的帖子（交给 select_funnel）"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print("  [!] 流式预处理未在时限内完成，使用已处理部分")
+        return list(self.classified)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            source_name, posts = item
+            try:
+                self._process(source_name, posts)
+            except Exception as e:
+                print(f"  [!] [流式] {source_name} 预处理失败: {e}")
+
+    def _process(self, source_name: str, posts: list[dict]):
+        from src.cleaners import clean_data
+        from src.utils.gpu_tagger import tag_posts
+        from src.analyzers.funnel import classify_funnel
+
+        t0 = time.time()
+        print(f"  [流式] {source_name}: {len(posts)} 条进入预处理")
+        cleaned = clean_data(posts, self.config, seen=self._seen)
+        cleaned = tag_posts(cleaned)
+        try:
+            from src.utils.db import save_post_tags
+            save_post_tags(cleaned)
+        except Exception as e:
+            print(f"  [!] [流式] {source_name} 保存 GPU 标签失败: {e}")
+        self.cleaned_count += len(cleaned)
+        self.tagged_models += sum(1 for p in cleaned if p.get("_gpu_tags", {}).get("models"))
+
+        if not self.skip_ai_filter:
+            from src.filters import filter_gpu_relevant
+            from src.utils.db import update_relevance
+            pre_count = len(cleaned)
+            cleaned = filter_gpu_relevant(cleaned, self.llm, shadow=False)
+            self.dropped += pre_count - len(cleaned)
+            # 持久化 relevance 结果到 DB
+            try:
+                update_relevance(cleaned)
+            except Exception as e:
+                print(f"  [!] 保存 relevance 结果失败: {e}")
+
+        if cleaned:
+            self.classified.extend(classify_funnel(cleaned, self.llm))
+        print(f"  [流式] {source_name}: 预处理完成 {len(cleaned)} 条 ({time.time() - t0:.0f}s)")
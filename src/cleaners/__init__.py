@@ -7,16 +7,22 @@ from datetime import datetime
 from pathlib import Path
 
 
-def clean_data(posts: list[dict], config: dict) -> list[dict]:
-    """清洗数据：去重 + 规范化 + 截断"""
+def clean_data(posts: list[dict], config: dict, seen: set = None) -> list[dict]:
+    """清洗数据：去重 + 规范化 + 截断
+
+    Args:
+        seen: 跨批次共享的内容哈希集合（流式模式逐源清洗时传入）
+    """
     if not posts:
         return []
 
     # 1. 编码统一（Python 默认 UTF-8）
     # 2. 繁简转换
-    posts = _convert_traditional(posts)
-    # 3. 内存去重（同批次内）
-    posts = _deduplicate(posts)
+    posts = _convert_traditional(posts, config)
+    # 3. 内存去重（同批次内；传入 seen 时跨批次）
+    posts = _deduplicate(posts, seen)
+    # 3.5 近似去重（MinHash + LSH，跨轮次、跨数据源；重复帖记入簇，不进入漏斗）
+    posts = _near_deduplicate(posts, config)
     # 4. 持久化去重已在爬虫层完成（scrape_all_forums → filter_new_posts + save_posts）
     #    此处不再重复过滤，避免爬虫 save_posts 后 cleaner 误判为"旧帖"
     # 5. 截断长文本
@@ -27,24 +33,20 @@ def clean_data(posts: list[dict], config: dict) -> list[dict]:
     return posts
 
 
-def _convert_traditional(posts: list[dict]) -> list[dict]:
-    """繁简转换"""
-    try:
-        import opencc
-        converter = opencc.OpenCC("t2s")
-        for post in posts:
-            if "content" in post:
-                post["content"] = converter.convert(post["content"])
-            if "title" in post:
-                post["title"] = converter.convert(post["title"])
-    except ImportError:
-        pass  # opencc 未安装时跳过
+def _convert_traditional(posts: list[dict], config: dict = None) -> list[dict]:
+    """繁简转换（预筛 + 缓存 + 大批量多进程，见 t2s.py）"""
+    from src.cleaners.t2s import convert_texts
+    fields = [(post, key) for post in posts for key in ("title", "content") if post.get(key)]
+    converted = convert_texts([post[key] for post, key in fields], config)
+    for (post, key), text in zip(fields, converted):
+        post[key] = text
     return posts
 
 
-def _deduplicate(posts: list[dict]) -> list[dict]:
-    """SimHash 去重（简化版：基于内容哈希）"""
-    seen = set()
+def _deduplicate(posts: list[dict], seen: set = None) -> list[dict]:
+    """精确去重：正文（无正文用标题）md5 相同视为重复"""
+    if seen is None:
+        seen = set()
     unique = []
     for post in posts:
         content = post.get("content", "") or post.get("title", "")
@@ -55,6 +57,20 @@ def _deduplicate(posts: list[dict]) -> list[dict]:
     return unique
 
 
+def _near_deduplicate(posts: list[dict], config: dict) -> list[dict]:
+    """近似去重，失败时原样返回（不能因为索引问题中断清洗）"""
+    from src.cleaners.near_dup import find_near_duplicates
+    try:
+        kept, stats = find_near_duplicates(posts, config)
+    except Exception as e:
+        print(f"  [!] 近似去重失败，跳过: {e}")
+        return posts
+    if stats["duplicates"]:
+        print(f"  近似去重: {stats['posts']} 条中 {stats['duplicates']} 条归入已有簇 | "
+              f"候选比对 {stats['candidates']} 次 | {stats['posts_per_sec']:.0f} 条/s")
+    return kept
+
+
 def _truncate(posts: list[dict], max_chars: int = 2000) -> list[dict]:
     """截断长文本"""
     for post in posts:
@@ -73,3 +89,5 @@ def _save_cleaned(posts: list[dict], config: dict):
     with open(output_file, "a", encoding="utf-8") as f:
         for post in posts:
             f.write(json.dumps(post, ensure_ascii=False) + "\n")
+    from src.utils.columnar import save_records
+    save_records("cleaned", posts, config)
@@ -0,0 +1,208 @@
+"""GPU-Insight 近似去重 — MinHash 签名 + SQLite 持久化 LSH 分带索引
+
+_deduplicate 只能去掉内容完全相同的帖子。转帖、引用楼和多站转载的同一条新闻
+（VideoCardz 的稿子在 Reddit、NGA、快科技各出现一次）措辞略有不同，会各自消耗一次 LLM。
+
+这里对每条帖子的字符 n-gram 计算 MinHash 签名（单次哈希分桶 + 稠密化，
+每个 shingle 只算一次哈希），签名按 bands 分带写入 near_dup_bands；
+新帖只和落在同一桶的历史帖比对，跨轮次、跨数据源都能命中。
+估计 Jaccard ≥ threshold 视为重复：不删帖，post_minhash 记录其所属簇（簇 id = 最早出现的帖子），
+重复帖不进入后续漏斗，同批的首帖在 _near_dups 中列出它们。
+"""
+
+import hashlib
+import re
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+_DEFAULTS = {
+    "enabled": True,
+    "threshold": 0.7,
+    "num_perm": 128,
+    "bands": 32,
+    "shingle": 3,
+    "min_chars": 40,
+    "retention_days": 60,
+}
+
+_MAX_CHARS = 4000  # 只取正文前段计算签名，长帖的转载差异主要在尾部
+_STRIP_RE = re.compile(r"https?://\S+|[\s\W_]+", re.UNICODE)
+_EMPTY = (1 << 64) - 1
+
+
+def _settings(config: dict) -> dict:
+    settings = dict(_DEFAULTS)
+    settings.update((config or {}).get("near_dup") or {})
+    return settings
+
+
+def _normalize(post: dict) -> str:
+    text = f"{post.get('title', '')} {post.get('content', '')}"[:_MAX_CHARS]
+    return _STRIP_RE.sub("", text.lower())
+
+
+def minhash(text: str, num_perm: int = 128, shingle: int = 3) -> array:
+    """单次哈希 MinHash（one permutation hashing）：哈希高位分桶、桶内取最小，空桶向右借值
+
+    num_perm 须为 2 的幂。返回 array('Q')，长度 num_perm。
+    """
+    bits = num_perm.bit_length() - 1
+    shift = 64 - bits
+    low = (1 << shift) - 1
+    sig = [_EMPTY] * num_perm
+    for gram in {text[i:i + shingle] for i in range(max(1, len(text) - shingle + 1))}:
+        h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+        b = h >> shift
+        v = h & low
+        if v < sig[b]:
+            sig[b] = v
+    # 稠密化：空桶取右侧最近非空桶的值，按距离混入偏移（避免不同空桶恒等）
+    if any(v != _EMPTY for v in sig):
+        raw = list(sig)
+        for i in range(num_perm):
+            if raw[i] == _EMPTY:
+                d = 1
+                while raw[(i + d) % num_perm] == _EMPTY:
+                    d += 1
+                sig[i] = (raw[(i + d) % num_perm] + d * 0x9E3779B97F4A7C15) & _EMPTY
+    return array("Q", sig)
+
+
+def similarity(a: array, b: array) -> float:
+    """签名相同位置的比例，即 Jaccard 相似度的估计"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _band_keys(sig: array, bands: int) -> list[int]:
+    rows = len(sig) // bands
+    raw = sig.tobytes()
+    width = rows * sig.itemsize
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + raw[band * width:(band + 1) * width],
+                                       digest_size=8).digest(), "big", signed=True)
+        for band in range(bands)
+    ]
+
+
+def find_near_duplicates(posts: list[dict], config: dict) -> tuple[list[dict], dict]:
+    """近似去重：返回 (保留的帖子, 统计)
+
+    重复帖从返回列表中移除但保留在 posts 表，簇关系写入 post_minhash。
+    统计含 posts / checked / candidates / duplicates / clusters / seconds / posts_per_sec。
+    """
+    settings = _settings(config)
+    stats = {"posts": len(posts), "checked": 0, "candidates": 0, "duplicates": 0,
+             "clusters": 0, "seconds": 0.0, "posts_per_sec": 0.0}
+    if not posts or not settings["enabled"]:
+        return posts, stats
+
+    from src.utils.db import get_db, _chunks
+
+    t0 = time.perf_counter()
+    num_perm, bands = int(settings["num_perm"]), int(settings["bands"])
+    if num_perm & (num_perm - 1) or num_perm % bands:
+        raise ValueError(f"near_dup: num_perm={num_perm} 须为 2 的幂且能被 bands={bands} 整除")
+    threshold = float(settings["threshold"])
+
+    entries = []  # (post, sig, keys)
+    for post in posts:
+        text = _normalize(post)
+        if len(text) < settings["min_chars"] or not post.get("id"):
+            continue
+        sig = minhash(text, num_perm, int(settings["shingle"]))
+        entries.append((post, sig, _band_keys(sig, bands)))
+    stats["checked"] = len(entries)
+
+    kept_ids = {id(p) for p in posts}
+    with get_db() as conn:
+        # 一次取出本批所有桶里的历史帖
+        bucket_posts: dict[int, set] = {}
+        all_keys = list({k for _, _, keys in entries for k in keys})
+        for chunk in _chunks(all_keys):
+            for r in conn.execute(
+                f"SELECT bucket, post_id FROM near_dup_bands WHERE bucket IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ):
+                bucket_posts.setdefault(r[0], set()).add(r[1])
+        known: dict[str, tuple] = {}  # post_id → (sig, cluster_id)
+        candidate_ids = list({pid for ids in bucket_posts.values() for pid in ids})
+        for chunk in _chunks(candidate_ids):
+            for r in conn.execute(
+                f"SELECT post_id, signature, cluster_id FROM post_minhash WHERE post_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ):
+                known[r[0]] = (array("Q", r[1]), r[2])
+
+        batch_canonical: dict[str, dict] = {}
+        rows, band_rows = [], []
+        for post, sig, keys in entries:
+            pid = post["id"]
+            if pid in known:  # 同一帖子重复抓取：沿用已有簇
+                cluster = known[pid][1]
+                if cluster != pid:
+                    kept_ids.discard(id(post))
+                    stats["duplicates"] += 1
+                continue
+            candidates = {c for k in keys for c in bucket_posts.get(k, ()) if c != pid}
+            stats["candidates"] += len(candidates)
+            best, best_sim = None, threshold
+            for cand in candidates:
+                sim = similarity(sig, known[cand][0]) if cand in known else 0.0
+                if sim >= best_sim:
+                    best, best_sim = cand, sim
+            cluster = known[best][1] if best else pid
+            rows.append((pid, post.get("source", ""), sig.tobytes(), cluster, best_sim if best else None))
+            band_rows.extend((k, pid) for k in keys)
+            known[pid] = (sig, cluster)
+            for k in keys:
+                bucket_posts.setdefault(k, set()).add(pid)
+            if best:
+                kept_ids.discard(id(post))
+                stats["duplicates"] += 1
+                head = batch_canonical.get(cluster)
+                if head is not None:
+                    head.setdefault("_near_dups", []).append(
+                        {"id": pid, "source": post.get("source", ""), "url": post.get("url", ""),
+                         "similarity": round(best_sim, 3)})
+            else:
+                batch_canonical[pid] = post
+                stats["clusters"] += 1
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO post_minhash (post_id, source, signature, cluster_id, similarity) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.executemany("INSERT OR IGNORE INTO near_dup_bands VALUES (?, ?)", band_rows)
+
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    stats["posts_per_sec"] = round(len(posts) / stats["seconds"], 1) if stats["seconds"] else 0.0
+    return [p for p in posts if id(p) in kept_ids], stats
+
+
+def get_cluster(post_id: str) -> list[dict]:
+    """帖子所在簇的全部成员（首帖在前）"""
+    from src.utils.db import get_db
+    with get_db(readonly=True) as conn:
+        row = conn.execute("SELECT cluster_id FROM post_minhash WHERE post_id = ?", (post_id,)).fetchone()
+        if not row:
+            return []
+        return [dict(r) for r in conn.execute(
+            """SELECT m.post_id, m.source, m.similarity, p.title, p.url
+               FROM post_minhash m LEFT JOIN posts p ON p.id = m.post_id
+               WHERE m.cluster_id = ? ORDER BY m.similarity IS NOT NULL, m.created_at""",
+            (row[0],),
+        )]
+
+
+def prune_index(config: dict) -> int:
+    """删除超过 retention_days 的签名和分带，控制索引大小"""
+    from src.utils.db import get_db
+    days = _settings(config)["retention_days"]
+    cutoff = (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    with get_db() as conn:
+        conn.execute(
+            """DELETE FROM near_dup_bands WHERE post_id IN (
+                   SELECT post_id FROM post_minhash WHERE created_at < ?)""", (cutoff,)
+        )
+        return conn.execute("DELETE FROM post_minhash WHERE created_at < ?", (cutoff,)).rowcount
@@ -0,0 +1,179 @@
+"""GPU-Insight 繁简转换 — 进程级转换器 + 字符集预筛 + 结果缓存 + 大批量多进程
+
+大部分帖子根本不需要转换：Reddit / TechPowerUp / VideoCardz 是纯英文，
+NGA / 贴吧 / B 站本来就是简体。这里按以下顺序处理每段文本：
+  1. 纯 ASCII → 原样返回
+  2. 不含任何繁体字（t2s 词典中会被改写的字符集）→ 原样返回
+  3. 按内容哈希查缓存
+  4. 剩余文本超过 pool_min 条时分给进程池，否则在本进程转换
+
+字符集取自 opencc 词典：文本不含其中任何字符时，t2s 的每个匹配都是恒等映射，
+预筛不会改变转换结果。拿不到词典文件（如官方 C++ 绑定）时退化为"含 CJK 字符才转换"。
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+_DEFAULTS = {
+    "cache_size": 50000,    # 进程内缓存条数
+    "pool_min": 2000,       # 待转换文本超过此数才启用进程池
+    "workers": 0,           # 0 = min(4, CPU 数)
+}
+
+_CJK_RE = re.compile(r"[㐀-鿿豈-﫿]")
+
+_lock = threading.RLock()
+_converter = None
+_converter_missing = False
+_trad_chars: frozenset | None = None
+_cache: OrderedDict = OrderedDict()
+_pool = None
+_stats = {"texts": 0, "skipped": 0, "cache_hits": 0, "converted": 0}
+
+
+def _settings(config: dict | None) -> dict:
+    settings = dict(_DEFAULTS)
+    settings.update((config or {}).get("cleaning", {}).get("t2s") or {})
+    return settings
+
+
+def get_converter():
+    """本进程共用的 t2s 转换器；opencc 未安装返回 None"""
+    global _converter, _converter_missing
+    if _converter is None and not _converter_missing:
+        with _lock:
+            if _converter is None and not _converter_missing:
+                try:
+                    import opencc
+                    _converter = opencc.OpenCC("t2s")
+                except ImportError:
+                    _converter_missing = True  # opencc 未安装时跳过
+    return _converter
+
+
+def _load_trad_chars() -> frozenset | None:
+    """t2s 词典中会被改写的字符（词组取与译文不同的位置）"""
+    try:
+        import opencc
+        directory = Path(opencc.__file__).parent / "dictionary"
+        chars = set()
+        for name in ("TSCharacters.txt", "TSPhrases.txt"):
+            with open(directory / name, encoding="utf-8") as f:
+                for line in f:
+                    key, _, values = line.rstrip("\n").partition("\t")
+                    value = values.split(" ")[0]
+                    if not key or key == value:
+                        continue
+                    if len(key) == len(value):
+                        chars.update(a for a, b in zip(key, value) if a != b)
+                    else:
+                        chars.update(key)
+        return frozenset(chars)
+    except (ImportError, OSError):
+        return None
+
+
+def needs_conversion(text: str) -> bool:
+    """预筛：纯 ASCII 或不含繁体字的文本无需转换"""
+    global _trad_chars
+    if not text or text.isascii():
+        return False
+    if _trad_chars is None:
+        with _lock:
+            if _trad_chars is None:
+                _trad_chars = _load_trad_chars() or frozenset()
+    if _trad_chars:
+        return not _trad_chars.isdisjoint(text)
+    return bool(_CJK_RE.search(text))
+
+
+def _key(text: str) -> bytes:
+    return hashlib.md5(text.encode("utf-8")).digest()
+
+
+def _convert_chunk(texts: list[str]) -> list[str]:
+    """进程池 worker：每个子进程各自持有一个转换器"""
+    converter = get_converter()
+    return [converter.convert(t) for t in texts]
+
+
+def _get_pool(workers: int):
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                _pool = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def convert_texts(texts: list[str], config: dict = None) -> list[str]:
+    """批量繁→简，返回与输入等长的列表"""
+    settings = _settings(config)
+    if get_converter() is None:
+        return list(texts)
+
+    result = list(texts)
+    pending: dict[bytes, list[int]] = {}  # 哈希 → 待转换的下标（同文本只转一次）
+    with _lock:
+        for i, text in enumerate(texts):
+            _stats["texts"] += 1
+            if not needs_conversion(text):
+                _stats["skipped"] += 1
+                continue
+            key = _key(text)
+            cached = _cache.get(key)
+            if cached is not None:
+                _cache.move_to_end(key)
+                result[i] = cached
+                _stats["cache_hits"] += 1
+            else:
+                pending.setdefault(key, []).append(i)
+    if not pending:
+        return result
+
+    keys = list(pending)
+    sources = [texts[pending[k][0]] for k in keys]
+    workers = settings["workers"] or min(4, os.cpu_count() or 1)
+    converted = None
+    if len(sources) >= settings["pool_min"] and workers > 1:
+        size = -(-len(sources) // workers)
+        try:
+            pool = _get_pool(workers)
+            converted = [t for part in pool.map(_convert_chunk, [sources[i:i + size]
+                                                                 for i in range(0, len(sources), size)])
+                         for t in part]
+        except Exception as e:
+            print(f"  [!] 繁简转换进程池失败，改为单进程: {e}")
+            shutdown_pool()
+    if converted is None:
+        converted = _convert_chunk(sources)
+
+    with _lock:
+        _stats["converted"] += len(keys)
+        for key, text in zip(keys, converted):
+            for i in pending[key]:
+                result[i] = text
+            _cache[key] = text
+        while len(_cache) > settings["cache_size"]:
+            _cache.popitem(last=False)
+    return result
+
+
+def get_stats() -> dict:
+    with _lock:
+        return dict(_stats)
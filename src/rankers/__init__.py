@@ -33,6 +33,9 @@ def calculate_pphi(insights: list[dict], config: dict) -> list[dict]:
     if len(aggregated) > 5:
         aggregated = _llm_dedup_aggregated(aggregated, config)
 
+    # 分配稳定的痛点实体 id（趋势查询、历史关联、永久链接都按 id）
+    _assign_entities(aggregated)
+
     # 计算 PPHI（改进版：增强区分度）
     rankings = []
     for pain_point, data in aggregated.items():
@@ -85,7 +88,8 @@ def calculate_pphi(insights: list[dict], config: dict) -> list[dict]:
             "category": data.get("category", ""),
             "affected_users": data.get("affected_users", ""),
             "evidence": data.get("evidence", ""),
-            "trend": _detect_trend(pain_point, pphi),
+            "entity_id": data.get("entity_id"),
+            "trend": _detect_trend(pain_point, pphi, data.get("entity_id")),
             "inferred_need": data.get("inferred_need_obj"),  # 完整的推理对象
             "total_replies": data.get("total_replies", 0),
             "total_likes": data.get("total_likes", 0),
@@ -119,6 +123,7 @@ def _load_historical_insights() -> list[dict]:
     """
     try:
         from src.utils.db import get_db
+        _backfill_entities()
         with get_db() as conn:
 
             # 取最新一轮的累积排名数据（已包含历史合并的 GPU 标签）
@@ -130,8 +135,8 @@ def _load_historical_insights() -> list[dict]:
 
             latest_date = latest_run["rd"]
             rows = conn.execute(
-                """SELECT pain_point, pphi_score, mentions, gpu_tags,
-                          source_urls, hidden_need, total_replies, total_likes,
+                """SELECT id, entity_id, pain_point, pphi_score, mentions,
+                          hidden_need, total_replies, total_likes,
                           inferred_need_json, category, affected_users
                    FROM pphi_history
                    WHERE run_date = ?
@@ -139,55 +144,48 @@ def _load_historical_insights() -> list[dict]:
                 (latest_date,)
             ).fetchall()
 
+            # GPU 标签 / 来源帖子从关联表按轮次取（入库时已按 posts.url 解析出 post_id）
+            tags_by_id: dict[int, dict] = {}
+            for t in conn.execute(
+                "SELECT history_id, kind, value FROM history_gpu_tags WHERE run_date = ?", (latest_date,)
+            ):
+                tags = tags_by_id.setdefault(t["history_id"], {k: [] for k in ("brands", "models", "series", "manufacturers")})
+                tags.setdefault(t["kind"], []).append(t["value"])
+            links_by_id: dict[int, list] = {}
+            for link in conn.execute(
+                """SELECT history_id, url, post_id, source FROM history_posts
+                   WHERE run_date = ? ORDER BY history_id, seq""", (latest_date,)
+            ):
+                links_by_id.setdefault(link["history_id"], []).append(link)
+            engagement = {
+                e["history_id"]: e for e in conn.execute(
+                    """SELECT hp.history_id, SUM(p.replies) AS replies, SUM(p.likes) AS likes,
+                              MIN(NULLIF(p.timestamp, '')) AS earliest
+                       FROM history_posts hp JOIN posts p ON p.id = hp.post_id
+                       WHERE hp.run_date = ? GROUP BY hp.history_id""", (latest_date,)
+                )
+            }
+
             insights = []
             for r in rows:
-                gpu_tags = json.loads(r["gpu_tags"]) if r["gpu_tags"] else {}
-                source_urls = json.loads(r["source_urls"]) if r["source_urls"] else []
-
-                # 从 source_urls 推断来源，构造 source_post_ids
-                source_post_ids = []
-                for url in source_urls:
-                    if "reddit" in url:
-                        slug = url.rstrip("/").split("/")[-1]
-                        source_post_ids.append(f"reddit_{slug}")
-                    elif "nga" in url:
-                        tid = url.split("tid=")[-1].split("&")[0] if "tid=" in url else ""
-                        if tid:
-                            source_post_ids.append(f"nga_{tid}")
-                    elif "bilibili" in url:
-                        bv = url.rstrip("/").split("/")[-1]
-                        source_post_ids.append(f"bilibili_{bv}")
-                    elif "v2ex" in url:
-                        tid = url.rstrip("/").split("/")[-1]
-                        source_post_ids.append(f"v2ex_{tid}")
-                    elif "mydrivers" in url:
-                        slug = url.rstrip("/").split("/")[-1]
-                        source_post_ids.append(f"mydrivers_{slug}")
-                    elif "techpowerup" in url:
-                        slug = url.rstrip("/").split("/")[-1]
-                        source_post_ids.append(f"techpowerup_{slug}")
-                    elif "videocardz" in url:
-                        slug = url.rstrip("/").split("/")[-1]
-                        source_post_ids.append(f"videocardz_{slug}")
-                    else:
-                        source_post_ids.append(f"unknown_{url[-20:]}")
-
-                # 互动数据：优先用 pphi_history 存储的累积值，fallback 到 posts 表查询
+                gpu_tags = {k: sorted(v) for k, v in tags_by_id.get(r["id"], {}).items()}
+                links = links_by_id.get(r["id"], [])
+                source_urls = [link["url"] for link in links if link["url"]]
+                # 未解析到帖子的 URL 保留占位 id（来源未知）
+                source_post_ids = [
+                    link["post_id"] or f"{link['source'] or 'unknown'}_{(link['url'] or '')[-20:]}"
+                    for link in links
+                ]
+
+                # 互动数据：优先用 pphi_history 存储的累积值，fallback 到关联帖子汇总
                 total_replies = r["total_replies"] or 0
                 total_likes = r["total_likes"] or 0
                 earliest_timestamp = ""
-                if total_replies == 0 and total_likes == 0 and source_post_ids:
-                    placeholders = ",".join("?" * len(source_post_ids))
-                    post_rows = conn.execute(
-                        f"""SELECT replies, likes, timestamp FROM posts
-                            WHERE id IN ({placeholders})""",
-                        source_post_ids
-                    ).fetchall()
-                    total_replies = sum(row["replies"] or 0 for row in post_rows)
-                    total_likes = sum(row["likes"] or 0 for row in post_rows)
-                    timestamps = [row["timestamp"] for row in post_rows if row["timestamp"]]
-                    if timestamps:
-                        earliest_timestamp = min(timestamps)
+                if total_replies == 0 and total_likes == 0 and r["id"] in engagement:
+                    e = engagement[r["id"]]
+                    total_replies = e["replies"] or 0
+                    total_likes = e["likes"] or 0
+                    earliest_timestamp = e["earliest"] or ""
 
                 hidden_need_obj = None
                 # 优先从完整 JSON 加载（含 reasoning_chain + munger_review）
@@ -219,6 +217,7 @@ def _load_historical_insights() -> list[dict]:
                     "total_replies": total_replies,
                     "total_likes": total_likes,
                     "earliest_timestamp": earliest_timestamp,
+                    "entity_id": r["entity_id"],
                     "_hist_mentions": r["mentions"] or 0,  # 历史累积的 mentions 数
                 })
 
@@ -229,6 +228,61 @@ def _load_historical_insights() -> list[dict]:
         return []
 
 
+def _assign_entities(aggregated: dict):
+    """为每个聚合痛点分配实体 id，写回 data["entity_id"] 及其成员 insight（供 save_pain_points）"""
+    names = [name for name in aggregated if aggregated[name].get("_aliases")]
+    if not names:
+        return
+    groups = []
+    for name in names:
+        data = aggregated[name]
+        groups.append({
+            "key": _normalize_pain_point(name)[0] or name,
+            "display_name": name,
+            "category": data.get("category", ""),
+            "aliases": data["_aliases"],
+            "entity_ids": data.get("_entity_ids", set()),
+        })
+    try:
+        from src.utils.db import assign_pain_entities
+        ids = assign_pain_entities(groups)
+    except Exception as e:
+        print(f"  [!] 痛点实体分配失败(不影响排名): {e}")
+        return
+    for name, entity_id in zip(names, ids):
+        data = aggregated[name]
+        data["entity_id"] = entity_id
+        for item in data.get("_items", []):
+            item["entity_id"] = entity_id
+
+
+def _backfill_entities():
+    """旧库升级：把 entity_id 为空的历史行按规范化名称归入实体（只在有空值时执行）"""
+    from src.utils.db import get_db, assign_pain_entities
+    with get_db() as conn:
+        names = [r[0] for r in conn.execute(
+            """SELECT DISTINCT pain_point FROM pphi_history WHERE entity_id IS NULL
+               UNION SELECT DISTINCT pain_point FROM pain_points WHERE entity_id IS NULL"""
+        )]
+        if not names:
+            return
+        by_key: dict[str, list[str]] = {}
+        for name in names:
+            by_key.setdefault(_normalize_pain_point(name)[0] or name, []).append(name)
+        keys = list(by_key)
+        ids = assign_pain_entities([
+            {"key": k, "display_name": by_key[k][0], "aliases": {k: by_key[k][0]}} for k in keys
+        ])
+        for key, entity_id in zip(keys, ids):
+            marks = ",".join("?" * len(by_key[key]))
+            for table in ("pphi_history", "pain_points"):
+                conn.execute(
+                    f"UPDATE {table} SET entity_id = ? WHERE entity_id IS NULL AND pain_point IN ({marks})",
+                    [entity_id, *by_key[key]],
+                )
+    print(f"  [历史] 痛点实体回填: {len(names)} 个名称 → {len(keys)} 个实体")
+
+
 def _normalize_pain_point(pain_point: str) -> tuple[str, str]:
     """规范化痛点名称，返回 (规范化名称, 原始名称)
 
@@ -417,6 +471,10 @@ def _llm_dedup_aggregated(aggregated: dict, config: dict) -> dict:
                 if not dst_data.get("inferred_need_obj") and src_data.get("inferred_need_obj"):
                     dst_data["inferred_need_obj"] = src_data["inferred_need_obj"]
                     dst_data["hidden_need"] = src_data.get("hidden_need", "")
+                # 痛点实体：别名与历史 id 并入主条目，入库时合并为同一实体
+                dst_data.setdefault("_aliases", {}).update(src_data.get("_aliases", {}))
+                dst_data.setdefault("_entity_ids", set()).update(src_data.get("_entity_ids", set()))
+                dst_data.setdefault("_items", []).extend(src_data.get("_items", []))
 
                 del aggregated[merge_name]
                 merged_indices.add(idx)
@@ -467,6 +525,10 @@ def _aggregate(insights: list[dict]) -> dict:
                 "total_replies": 0,
                 "total_likes": 0,
                 "timestamps": [],
+                # 痛点实体：合入的规范化名 → 原始名、历史行已有的实体 id、成员 insight
+                "_aliases": {},
+                "_entity_ids": set(),
+                "_items": [],
             }
         else:
             # 匹配到已有条目（精确匹配或同义词匹配），更新展示名
@@ -474,6 +536,11 @@ def _aggregate(insights: list[dict]) -> dict:
             if len(original_pp) > len(current_display) or (original_pp.startswith("显卡") and not current_display.startswith("显卡")):
                 name_mapping[matched_key] = original_pp
 
+        agg[matched_key]["_aliases"].setdefault(normalized_pp, original_pp)
+        if item.get("entity_id"):
+            agg[matched_key]["_entity_ids"].add(item["entity_id"])
+        agg[matched_key]["_items"].append(item)
+
         # count: 如果 insight 来自历史累积（已有 mentions），用 mentions；否则 +1
         hist_mentions = item.get("_hist_mentions", 0)
         agg[matched_key]["count"] += hist_mentions if hist_mentions > 0 else 1
@@ -655,8 +722,8 @@ def _classify_quality_tier(data: dict) -> str:
     return "silver"
 
 
-def _detect_trend(pain_point: str, current_score: float) -> str:
-    """检测趋势：对比最近 3 轮 PPHI 历史数据（规范化名称匹配）
+def _detect_trend(pain_point: str, current_score: float, entity_id: int = None) -> str:
+    """检测趋势：对比最近 3 轮 PPHI 历史数据（有实体 id 时按 id 索引查询，否则规范化名称匹配）
 
     返回: "hot" | "rising" | "falling" | "stable" | "new"
     - hot: 连续 3 轮上升（PPHI 每轮增长 > 2）
@@ -681,22 +748,28 @@ def _detect_trend(pain_point: str, current_score: float) -> str:
             # 从第 2 轮开始查找匹配（跳过当前轮）
             prev_dates = [r["run_date"] for r in rows[1:]]
             placeholders = ",".join("?" * len(prev_dates))
-            prev_points = conn.execute(
-                f"""SELECT pain_point, pphi_score, run_date FROM pphi_history
-                    WHERE run_date IN ({placeholders})
-                    ORDER BY run_date DESC""",
-                prev_dates
-            ).fetchall()
-
-        if not prev_points:
-            return "new"
-
-        # 收集该痛点在各轮的分数（按时间倒序）
-        scores_by_date = {}
-        for row in prev_points:
-            normalized_prev, _ = _normalize_pain_point(row["pain_point"])
-            if normalized_current == normalized_prev:
-                scores_by_date[row["run_date"]] = row["pphi_score"]
+            if entity_id:
+                scores_by_date = {
+                    row["run_date"]: row["score"] for row in conn.execute(
+                        f"""SELECT run_date, MAX(pphi_score) AS score FROM pphi_history
+                            WHERE entity_id = ? AND run_date IN ({placeholders})
+                            GROUP BY run_date""",
+                        [entity_id, *prev_dates]
+                    )
+                }
+            else:
+                prev_points = conn.execute(
+                    f"""SELECT pain_point, pphi_score, run_date FROM pphi_history
+                        WHERE run_date IN ({placeholders})
+                        ORDER BY run_date DESC""",
+                    prev_dates
+                ).fetchall()
+                # 收集该痛点在各轮的分数（按时间倒序）
+                scores_by_date = {}
+                for row in prev_points:
+                    normalized_prev, _ = _normalize_pain_point(row["pain_point"])
+                    if normalized_current == normalized_prev:
+                        scores_by_date[row["run_date"]] = row["pphi_score"]
 
         if not scores_by_date:
             return "new"
@@ -743,3 +816,6 @@ def _save_rankings(rankings: list[dict], config: dict):
     history_file = output_dir / f"rankings_{date_str}.json"
     with open(history_file, "w", encoding="utf-8") as f:
         json.dump(output, f, ensure_ascii=False, indent=2)
+
+    from src.utils.columnar import save_records
+    save_records("rankings", rankings, config)
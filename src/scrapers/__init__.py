@@ -1,14 +1,13 @@
 """GPU-Insight 爬虫模块"""
 
-from src.utils.config import get_enabled_sources
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 
+from src.utils.config import get_enabled_sources
 
-def scrape_all_forums(config: dict, skip_sources: list[str] = None) -> list[dict]:
-    """串行抓取所有已启用的论坛（带增量检查点）
 
-    Args:
-        skip_sources: 跳过的数据源列表（轻量模式用）
-    """
+def _get_scraper_map() -> dict:
+    """数据源名 → 爬虫类"""
     from .chiphell_pw_scraper import ChiphellPlaywrightScraper
     from .reddit_scraper import RedditScraper
     from .tieba_scraper import TiebaScraper
@@ -18,9 +17,8 @@ def scrape_all_forums(config: dict, skip_sources: list[str] = None) -> list[dict
     from .v2ex_scraper import V2EXScraper
     from .mydrivers_scraper import MyDriversScraper
     from .techpowerup_scraper import TechPowerUpScraper
-    from src.utils.db import filter_new_posts, save_posts, save_checkpoint, get_checkpoint
 
-    scraper_map = {
+    return {
         "chiphell": ChiphellPlaywrightScraper,
         "reddit": RedditScraper,
         "tieba": TiebaScraper,
@@ -32,51 +30,194 @@ def scrape_all_forums(config: dict, skip_sources: list[str] = None) -> list[dict
         "techpowerup": TechPowerUpScraper,
     }
 
+
+def scrape_all_forums(config: dict, skip_sources: list[str] = None,
+                      on_source_done=None) -> list[dict]:
+    """抓取所有已启用的论坛（带增量检查点）
+
+    runtime.parallel_scraping 开启时各数据源在线程池中并行抓取，
+    同一域名的请求仍由 BaseScraper 统一排队间隔；DB 写入始终在主线程串行执行。
+
+    Args:
+        skip_sources: 跳过的数据源列表（轻量模式用）
+        on_source_done: 回调 on_source_done(source_name, new_posts)，每个源入库后在主线程调用
+            （流式模式用它把新帖交给后台预处理）
+    """
+    from src.utils.db import get_checkpoint
+
+    scraper_map = _get_scraper_map()
     enabled = get_enabled_sources(config)
-    all_posts = []
 
-    for source_name, source_config in enabled.items():
+    # 待抓取任务：(source_name, scraper_cls, checkpoint)
+    jobs = []
+    for source_name in enabled:
         if skip_sources and source_name in skip_sources:
             print(f"  跳过 {source_name}（轻量模式）")
             continue
         scraper_cls = scraper_map.get(source_name)
-        if scraper_cls:
-            cp = get_checkpoint(source_name)
-            cp_info = f"(上次: {cp['last_scrape_at'][:16]}, 累计: {cp['total_scraped']})" if cp else "(首次)"
-            print(f"  抓取 {source_name} {cp_info}...")
-
-            scraper = scraper_cls(config)
-            posts = scraper.scrape()
-            raw_count = len(posts)
-
-            # 增量过滤：只保留新帖（在 save 之前过滤）
-            new_posts = filter_new_posts(posts)
-            # 保存所有帖子（新帖插入，旧帖更新互动数据）
-            save_posts(posts)
-            # 更新检查点
-            save_checkpoint(source_name, len(new_posts))
-
-            all_posts.extend(new_posts)  # 只传新帖给后续分析
-            print(f"    获取 {raw_count} 条, 新增 {len(new_posts)} 条")
-
-            # 连续零新增告警：检查最近 3 次是否都是 0
-            if len(new_posts) == 0 and cp:
-                _check_zero_alert(source_name, cp)
-        else:
+        if not scraper_cls:
             print(f"  {source_name} 爬虫尚未实现，跳过")
+            continue
+        jobs.append((source_name, scraper_cls, get_checkpoint(source_name)))
+
+    # 自适应调度：未到期的源本轮跳过
+    from .scheduler import plan_sources
+    due, skipped = plan_sources(config, [name for name, _, _ in jobs])
+    for source_name, reason in skipped.items():
+        print(f"  跳过 {source_name}（未到期：{reason}）")
+    jobs = [job for job in jobs if job[0] in due]
+
+    runtime = config.get("runtime", {})
+    timeout = runtime.get("source_timeout_sec", 900)
+    workers = max(1, runtime.get("scrape_workers", 4))
 
+    if runtime.get("parallel_scraping", False) and len(jobs) > 1:
+        new_by_source = _scrape_parallel(jobs, config, workers, timeout, on_source_done)
+    else:
+        new_by_source = _scrape_serial(jobs, config, timeout, on_source_done)
+
+    # 关闭共享连接池并输出连接复用统计
+    from .base_scraper import close_http_clients
+    http = close_http_clients()
+    if http["requests"]:
+        print(f"  [HTTP] 请求 {http['requests']} 次 | 新建连接 {http['connections']} | "
+              f"复用 {http['reused']} ({http['reuse_rate']:.0%})")
+
+    # 限流统计（令牌桶跨轮保留已学到的速率，只清空计数）
+    from .rate_limiter import get_rate_limiter
+    limiter = get_rate_limiter()
+    for domain, st in limiter.stats().items():
+        if st["requests"]:
+            print(f"  [限流] {domain}: 请求 {st['requests']} | 被限 {st['throttled']} | "
+                  f"等待 {st['waited_sec']}s | 当前 {st['rate_per_min']}/min")
+    limiter.reset_stats()
+
+    # 按配置顺序拼接，保证下游输入顺序稳定
+    all_posts = []
+    for source_name, _, _ in jobs:
+        all_posts.extend(new_by_source.get(source_name, []))
     return all_posts
 
 
-def _check_zero_alert(source_name: str, checkpoint: dict):
+def _checkpoint_info(cp: dict | None) -> str:
+    return f"(上次: {cp['last_scrape_at'][:16]}, 累计: {cp['total_scraped']})" if cp else "(首次)"
+
+
+def _run_scraper(source_name: str, scraper_cls, config: dict, timeout: float) -> tuple[list[dict], dict]:
+    """在当前线程执行单个爬虫，超过 timeout 后后续请求直接放弃（协作式超时）
+
+    Returns:
+        (posts, run_info)：run_info 含耗时、请求/错误/限流次数、是否全部 304 未变化
+    """
+    t0 = time.time()
+    scraper = scraper_cls(config)
+    scraper.deadline = t0 + timeout
+    posts = scraper.scrape()
+    info = dict(getattr(scraper, "request_stats", {}))
+    info["not_modified"] = getattr(scraper, "not_modified", False)
+    info["duration_sec"] = time.time() - t0
+    return posts, info
+
+
+def _scrape_serial(jobs: list, config: dict, timeout: float, on_source_done=None) -> dict:
+    """串行抓取（原有行为）"""
+    new_by_source = {}
+    for source_name, scraper_cls, cp in jobs:
+        print(f"  抓取 {source_name} {_checkpoint_info(cp)}...")
+        posts, info = _run_scraper(source_name, scraper_cls, config, timeout)
+        new_by_source[source_name] = _ingest_source(source_name, posts, info)
+        if on_source_done:
+            on_source_done(source_name, new_by_source[source_name])
+    return new_by_source
+
+
+def _scrape_parallel(jobs: list, config: dict, workers: int, timeout: float,
+                     on_source_done=None) -> dict:
+    """并行抓取：每个数据源一个线程，结果按完成顺序在主线程入库"""
+    new_by_source = {}
+    print(f"  并行抓取 {len(jobs)} 个数据源（{min(workers, len(jobs))} 线程，单源超时 {timeout}s）")
+    for source_name, _, cp in jobs:
+        print(f"    - {source_name} {_checkpoint_info(cp)}")
+
+    # 兜底超时：协作式超时失效时（如卡在 Playwright 内部），主线程不再等待
+    rounds = -(-len(jobs) // workers)
+    overall_timeout = timeout * rounds + 60
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scraper")
+    futures = {
+        pool.submit(_run_scraper, source_name, scraper_cls, config, timeout): source_name
+        for source_name, scraper_cls, _ in jobs
+    }
+    try:
+        for future in as_completed(futures, timeout=overall_timeout):
+            source_name = futures[future]
+            try:
+                posts, info = future.result()
+            except Exception as e:
+                print(f"  [!] {source_name} 抓取异常: {e}")
+                posts, info = [], {"errors": 1}
+            print(f"  [{source_name}] 完成 ({info.get('duration_sec', 0):.0f}s)")
+            new_by_source[source_name] = _ingest_source(source_name, posts, info)
+            if on_source_done:
+                on_source_done(source_name, new_by_source[source_name])
+    except FuturesTimeout:
+        pending = [futures[f] for f in futures if not f.done()]
+        print(f"  [!] 抓取总超时，放弃: {', '.join(pending)}")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return new_by_source
+
+
+def _ingest_source(source_name: str, posts: list[dict], info: dict = None) -> list[dict]:
+    """单个数据源结果入库：增量过滤 → 保存 → 检查点 → 抓取历史，返回新帖
+
+    info: _run_scraper 的 run_info；not_modified（源站 304）时零新增属正常，不触发告警
+    """
+    from src.utils.db import filter_new_posts, save_posts, save_checkpoint, save_scrape_run
+
+    info = info or {}
+    not_modified = info.get("not_modified", False)
+
+    raw_count = len(posts)
+    # 增量过滤：只保留新帖（在 save 之前过滤）
+    new_posts = filter_new_posts(posts)
+    # 保存所有帖子（新帖插入，旧帖更新互动数据）
+    save_posts(posts)
+    # 正文/评论进压缩内容库（按 content_hash 去重，未启用时跳过）
+    from src.utils.content_store import get_content_store
+    store = get_content_store()
+    if store is not None:
+        try:
+            store.put_many(posts)
+        except Exception as e:
+            print(f"    [!] {source_name} 写入内容库失败: {e}")
+    # 更新检查点
+    save_checkpoint(source_name, len(new_posts))
+    save_scrape_run(source_name, raw_count, len(new_posts),
+                    requests=info.get("requests", 0), errors=info.get("errors", 0),
+                    rate_limited=info.get("rate_limited", 0), not_modified=not_modified,
+                    duration_sec=info.get("duration_sec", 0.0))
+    print(f"    {source_name}: 获取 {raw_count} 条, 新增 {len(new_posts)} 条"
+          + (" (未变化 304)" if not_modified else ""))
+
+    # 连续零新增告警：最近 3 次抓取都是 0（304 未变化除外）
+    if len(new_posts) == 0 and not not_modified:
+        _check_zero_alert(source_name)
+    return new_posts
+
+
+def _check_zero_alert(source_name: str, runs: int = 3):
     """检查数据源是否连续多轮零新增，输出告警"""
     try:
-        from src.utils.db import get_db
-        with get_db() as conn:
-            # 查最近 3 次 checkpoint 的 last_post_count
-            # scrape_checkpoints 只存最新一条，改用 pphi_history 间接判断
-            # 简化：如果 last_post_count == 0 且 total_scraped 没变化，说明连续无新增
-            if checkpoint.get("last_post_count", 0) == 0:
-                print(f"    [!] {source_name} 连续零新增，请检查爬虫或目标站点是否正常")
+        from src.utils.db import get_scrape_history
+        history = get_scrape_history(source_name, limit=runs)
+        if len(history) < runs:
+            return
+        if all(r["new_posts"] == 0 and not r["not_modified"] for r in history):
+            errors = sum(r["errors"] for r in history)
+            limited = sum(r["rate_limited"] for r in history)
+            print(f"    [!] {source_name} 连续 {runs} 轮零新增（错误 {errors} 次，限流 {limited} 次），"
+                  f"请检查爬虫或目标站点是否正常")
     except Exception:
         pass
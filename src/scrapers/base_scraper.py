@@ -5,12 +5,19 @@ import time
 import random
 import hashlib
 import ssl
+import threading
+import importlib.util
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlsplit
 
 import httpx
 
+from src.scrapers import cassette
+from src.scrapers.rate_limiter import get_rate_limiter, DEFAULT_BURST
+
 # 全局 UA 池 — 真实浏览器指纹，所有爬虫共享
 _USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
@@ -21,6 +28,103 @@ _USER_AGENTS = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
 ]
 
+# HTTP/2 与 Brotli 为可选依赖（httpx[http2,brotli]），未安装时自动降级
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_BROTLI = (importlib.util.find_spec("brotli") is not None
+           or importlib.util.find_spec("brotlicffi") is not None)
+_ACCEPT_ENCODING = "gzip, deflate, br" if _BROTLI else "gzip, deflate"
+
+# 连接池：(host, verify) → httpx.Client，所有爬虫共享 keep-alive 连接（Cookie 罐只存服务端下发的 Cookie）
+_CLIENTS: dict[tuple[str, bool], httpx.Client] = {}
+_CLIENTS_LOCK = threading.Lock()
+# 连接复用统计：host → {"requests": n, "connections": m}
+_HTTP_STATS: dict[str, dict] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _get_client(host: str, verify: bool) -> httpx.Client:
+    """获取（或创建）该 host 的共享连接池客户端"""
+    key = (host, verify)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = httpx.Client(
+                http2=_HTTP2,
+                verify=verify,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5,
+                                    keepalive_expiry=60),
+            )
+            _CLIENTS[key] = client
+        return client
+
+
+def _send(client: httpx.Client, request: httpx.Request, cookies: dict = None) -> httpx.Response:
+    """发送请求；带爬虫自己的 Cookie 时手动跟随重定向
+
+    这些 Cookie 只随请求发送，不写入共享客户端的 Cookie 罐（同 host 的其他爬虫看不到）。
+    httpx 自动重定向时只取 Cookie 罐，所以同 host 的每一跳重新带上。
+    """
+    if not cookies:
+        return client.send(request)
+    resp = client.send(request, follow_redirects=False)
+    for _ in range(client.max_redirects):
+        nxt = resp.next_request
+        if nxt is None:
+            break
+        if nxt.url.host == request.url.host:
+            jar = httpx.Cookies(client.cookies)
+            jar.update(cookies)
+            nxt.headers.pop("Cookie", None)
+            jar.set_cookie_header(nxt)
+        resp = client.send(nxt, follow_redirects=False)
+    return resp
+
+
+def _count_request(host: str):
+    with _STATS_LOCK:
+        _HTTP_STATS.setdefault(host, {"requests": 0, "connections": 0})["requests"] += 1
+
+
+def _make_trace(host: str):
+    """httpcore trace 回调：每次真正建立 TCP 连接时计数（复用连接不会触发）"""
+    def trace(event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            with _STATS_LOCK:
+                _HTTP_STATS.setdefault(host, {"requests": 0, "connections": 0})["connections"] += 1
+    return trace
+
+
+def get_http_stats() -> dict:
+    """连接复用统计：{"requests", "connections", "reused", "reuse_rate", "by_host"}"""
+    with _STATS_LOCK:
+        by_host = {h: dict(v) for h, v in _HTTP_STATS.items()}
+    requests = sum(v["requests"] for v in by_host.values())
+    connections = sum(v["connections"] for v in by_host.values())
+    reused = max(0, requests - connections)
+    return {
+        "requests": requests,
+        "connections": connections,
+        "reused": reused,
+        "reuse_rate": round(reused / requests, 3) if requests else 0.0,
+        "by_host": by_host,
+    }
+
+
+def close_http_clients() -> dict:
+    """关闭所有共享客户端（每轮抓取结束调用，避免空闲连接跨轮失效），返回并清空统计"""
+    stats = get_http_stats()
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _CLIENTS.clear()
+    with _STATS_LOCK:
+        _HTTP_STATS.clear()
+    return stats
+
 
 class BaseScraper(ABC):
     """所有爬虫的基类 — 提供统一反爬、限流处理、SSL 容错"""
@@ -36,6 +140,31 @@ class BaseScraper(ABC):
         self.raw_path.mkdir(parents=True, exist_ok=True)
         self._last_id_file = self.raw_path / ".last_id"
         self._ua = random.choice(_USER_AGENTS)
+        # 协作式超时：由 scrape_all_forums 设置，超过后 safe_request 不再发请求
+        self.deadline: float | None = None
+        self._deadline_warned = False
+        # enrich_posts 阶段预算：存在工作线程本地，超时截断后仍在跑的线程也不会拿到更宽的 deadline
+        self._stage = threading.local()
+        # 条件请求缓存：url → {"etag", "last_modified"}，成功入库后才落盘
+        self._http_cache_file = self.raw_path / ".http_cache.json"
+        self._http_cache: dict | None = None
+        self._http_cache_pending: dict[str, dict] = {}
+        self._conditional_total = 0
+        self._conditional_304 = 0
+        # HTTP 录制/回放：live / record / replay（见 cassette.py）
+        self.http_mode = config.get("runtime", {}).get("http_mode", "live")
+        if self.http_mode not in cassette.HTTP_MODES:
+            print(f"  [!] 未知 http_mode: {self.http_mode}，按 live 处理")
+            self.http_mode = "live"
+        self._cassette_dir = cassette.cassette_dir(config, source_name)
+        self.replay_misses = 0
+        # 本轮请求健康度（写入 scrape_history，供调度器退避）
+        self.request_stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self._stats_lock = threading.Lock()  # enrich_posts 工作线程并发计数
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.request_stats[key] += 1
 
     @abstractmethod
     def fetch_posts(self, last_id: str = None) -> list[dict]:
@@ -47,6 +176,7 @@ class BaseScraper(ABC):
         last_id = self._load_last_id()
         try:
             posts = self.fetch_posts(last_id)
+            self._commit_http_cache()
             if posts:
                 self._save_raw(posts)
                 newest_id = posts[0].get("id", "")
@@ -55,8 +185,100 @@ class BaseScraper(ABC):
             return posts
         except Exception as e:
             print(f"  [!] {self.source_name} 抓取失败: {e}")
+            self._count("errors")
             return []
 
+    def enrich_posts(self, posts: list[dict], fetch_fn, label: str = "评论",
+                     min_replies: int = 0, max_items: int = 10, time_budget: float | None = 120,
+                     should_stop=None, use_comment_cache: bool = True) -> int:
+        """热帖详情（评论/正文）有界并发抓取
+
+        按 replies 降序取前 max_items 条依次提交，回复最多的帖子最先拿到令牌，
+        超时截断时损失的总是低价值帖子。同域名速率仍由令牌桶约束。
+
+        Args:
+            fetch_fn: fetch_fn(post) -> dict | None，返回要写回帖子的字段，在工作线程执行
+            time_budget: 本阶段墙钟预算（秒），与单源 deadline 取较早者；None 只受单源 deadline 约束
+            should_stop: 无参回调，返回 True 时不再开始新的抓取（如检测到风控）
+            use_comment_cache: 有评论快照的帖子跳过重抓；fetch_fn 还补正文时须传 False（快照不含正文）
+
+        Returns:
+            成功补全的帖子数
+        """
+        runtime = self.config.get("runtime", {})
+        hot = [p for p in posts if p.get("replies", 0) > min_replies]
+        if use_comment_cache:
+            hot = self._skip_cached_comments(hot, runtime)
+        candidates = sorted(hot, key=lambda p: p.get("replies", 0), reverse=True)[:max_items]
+        if not candidates:
+            return 0
+
+        workers = self.source_config.get("enrich_workers", runtime.get("enrich_workers", 3))
+        workers = max(1, min(workers, len(candidates)))
+        stage_deadline = self.deadline
+        if time_budget is not None:
+            budget_deadline = time.time() + time_budget
+            if stage_deadline is None or budget_deadline < stage_deadline:
+                stage_deadline = budget_deadline
+        # 兜底：卡在单个请求内部时主线程最多再等 30s
+        wait_timeout = max(0.0, stage_deadline - time.time()) + 30 if stage_deadline else None
+
+        def task(post):
+            if should_stop and should_stop():
+                return None
+            self._stage.deadline = stage_deadline
+            try:
+                return fetch_fn(post)
+            finally:
+                self._stage.deadline = None
+
+        print(f"    抓取 {len(candidates)} 条热帖{label}（{workers} 并发）...", end=" ")
+        fetched = 0
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{self.source_name}-enrich")
+        futures = {pool.submit(task, p): p for p in candidates}
+        try:
+            for future in as_completed(futures, timeout=wait_timeout):
+                try:
+                    updates = future.result()
+                except Exception:
+                    continue
+                if updates:
+                    futures[future].update(updates)
+                    fetched += 1
+        except FuturesTimeout:
+            print(f"(超时截断)", end=" ")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            if not self._deadline_passed():
+                self._deadline_warned = False
+        print(f"成功 {fetched} 条")
+        return fetched
+
+    def _skip_cached_comments(self, posts: list[dict], runtime: dict) -> list[dict]:
+        """评论缓存：库中已有评论快照且回复增长不超过阈值的帖子直接复用快照，不再重抓"""
+        delta = self.source_config.get("comment_refetch_delta",
+                                       runtime.get("comment_refetch_delta", 10))
+        # 录制/回放需要完整请求序列，不走评论缓存
+        if delta is None or delta < 0 or not posts or self.http_mode != "live":
+            return posts
+        try:
+            from src.utils.db import get_comment_snapshots
+            snapshots = get_comment_snapshots([p["id"] for p in posts if p.get("id")])
+        except Exception as e:
+            print(f"    [!] {self.source_name} 评论缓存读取失败: {e}")
+            return posts
+
+        remaining = []
+        for p in posts:
+            snap = snapshots.get(p.get("id"))
+            if snap and p.get("replies", 0) - snap["comments_replies"] <= delta:
+                p.setdefault("comments", snap["comments"])
+            else:
+                remaining.append(p)
+        if len(remaining) < len(posts):
+            print(f"    评论缓存命中 {len(posts) - len(remaining)} 条")
+        return remaining
+
     def _save_raw(self, posts: list[dict]):
         """保存原始数据到 JSONL"""
         date_str = datetime.now().strftime("%Y-%m-%d")
@@ -67,6 +289,42 @@ class BaseScraper(ABC):
                 post["_source"] = self.source_name
                 f.write(json.dumps(post, ensure_ascii=False) + "\n")
 
+    @property
+    def not_modified(self) -> bool:
+        """本轮所有条件请求都返回 304（站点无变化，零新增属正常）"""
+        return self._conditional_total > 0 and self._conditional_304 == self._conditional_total
+
+    def _load_http_cache(self) -> dict:
+        if self._http_cache is None:
+            try:
+                self._http_cache = json.loads(self._http_cache_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._http_cache = {}
+        return self._http_cache
+
+    def _conditional_headers(self, url: str) -> dict:
+        """根据已存校验器生成 If-None-Match / If-Modified-Since"""
+        entry = self._load_http_cache().get(url) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _commit_http_cache(self):
+        """fetch_posts 正常返回后再写入校验器，避免解析失败后被 304 永久跳过"""
+        if not self._http_cache_pending:
+            return
+        cache = self._load_http_cache()
+        cache.update(self._http_cache_pending)
+        self._http_cache_pending = {}
+        try:
+            self._http_cache_file.write_text(json.dumps(cache, ensure_ascii=False, indent=1),
+                                             encoding="utf-8")
+        except OSError as e:
+            print(f"  [!] {self.source_name} HTTP 缓存写入失败: {e}")
+
     def _load_last_id(self) -> str | None:
         if self._last_id_file.exists():
             return self._last_id_file.read_text().strip()
@@ -75,12 +333,36 @@ class BaseScraper(ABC):
     def _save_last_id(self, last_id: str):
         self._last_id_file.write_text(last_id)
 
-    @staticmethod
-    def random_delay(min_sec: float = 2.0, max_sec: float = 5.0):
-        """随机延迟 + ±20% 抖动，防反爬"""
-        base = random.uniform(min_sec, max_sec)
-        jitter = base * random.uniform(-0.2, 0.2)
-        time.sleep(max(0.5, base + jitter))
+    def throttle(self, url: str, delay: tuple = (2.0, 4.5)) -> bool:
+        """按域名令牌桶等待预算（跨爬虫、跨线程共享）
+
+        速率取 config sources.<name>.rate_limit（per_minute / burst）；
+        未配置时按 delay 均值推算，与旧的固定 sleep 同速。
+        Returns:
+            False 表示等待会超过 deadline，应放弃本次请求
+        """
+        limiter = get_rate_limiter()
+        rl = self.source_config.get("rate_limit") or {}
+        per_minute = rl.get("per_minute") or 60.0 / max(0.5, sum(delay) / 2)
+        limiter.configure(url, per_minute, rl.get("burst", DEFAULT_BURST))
+        return limiter.acquire(url, deadline=self._current_deadline())
+
+    def report_throttle(self, url: str, status: int, retry_after: str = None,
+                        attempt: int = 0) -> float:
+        """上报限流信号（429/412/403 或接口层风控码），返回该域名暂停秒数"""
+        self._count("rate_limited")
+        return get_rate_limiter().on_throttle(url, status, retry_after, attempt)
+
+    def _current_deadline(self) -> float | None:
+        """单源 deadline 与本线程所在 enrich 阶段 deadline 中较早者"""
+        stage = getattr(self._stage, "deadline", None)
+        if stage is None or (self.deadline is not None and self.deadline < stage):
+            return self.deadline
+        return stage
+
+    def _deadline_passed(self) -> bool:
+        deadline = self._current_deadline()
+        return deadline is not None and time.time() > deadline
 
     @staticmethod
     def hash_author(author_id: str) -> str:
@@ -93,7 +375,7 @@ class BaseScraper(ABC):
             "User-Agent": self._ua,
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
             "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7",
-            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Encoding": _ACCEPT_ENCODING,
             "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1",
         }
@@ -106,54 +388,86 @@ class BaseScraper(ABC):
     def safe_request(self, url: str, referer: str = None, timeout: int = 30,
                      delay: tuple = (2.0, 4.5), extra_headers: dict = None,
                      cookies: dict = None, max_retries: int = 3,
-                     verify_ssl: bool = None) -> httpx.Response | None:
+                     verify_ssl: bool = None,
+                     conditional: bool = False) -> httpx.Response | None:
         """统一安全请求 — 自动处理 403/429/SSL 错误 + 指数退避
 
+        请求走按 host 共享的 httpx.Client（keep-alive + HTTP/2），
+        cookies 只随本次请求发送；服务端下发的 Cookie 进客户端 Cookie 罐，后续同 host 请求自动携带。
+        发请求前经域名令牌桶限流，429/412/403 反馈给限流器暂停该域名并降速。
+
         Args:
+            delay: 未配置 rate_limit 时用于推算该域名速率的延迟区间（秒）
+            conditional: 携带上次的 ETag / Last-Modified；内容未变时返回 304 响应，
+                调用方应直接跳过解析（仅 live 模式生效）
             verify_ssl: True/False 强制指定，None 则自动（首次 True，重试 False）
 
         Returns:
             httpx.Response on success, None on failure (已打印错误日志)
         """
+        if self.http_mode == "replay":
+            return self._replay(url)
+
         headers = self.get_headers(referer=referer, extra=extra_headers)
+        conditional = conditional and self.http_mode == "live"
+        if conditional:
+            headers.update(self._conditional_headers(url))
+            self._conditional_total += 1
+        host = urlsplit(url).netloc
 
         for attempt in range(max_retries):
+            if self._deadline_passed() or not self.throttle(url, delay):
+                if not self._deadline_warned:
+                    self._deadline_warned = True
+                    print(f"    [!] {self.source_name} 超过时限，跳过剩余请求")
+                return None
             if verify_ssl is not None:
                 verify = verify_ssl
             else:
                 verify = attempt == 0  # 第二次尝试禁用 SSL 验证
             try:
-                self.random_delay(*delay)
                 # 显式设置 connect/read/write 超时，避免 Windows 下连接挂起
                 to = httpx.Timeout(timeout, connect=min(timeout, 10))
-                resp = httpx.get(url, headers=headers, timeout=to,
-                                 follow_redirects=True, verify=verify,
-                                 cookies=cookies)
+                client = _get_client(host, verify)
+                _count_request(host)
+                self._count("requests")
+                request = client.build_request("GET", url, headers=headers, cookies=cookies, timeout=to,
+                                               extensions={"trace": _make_trace(host)})
+                resp = _send(client, request, cookies)
 
                 if resp.status_code == 429:
-                    # 指数退避: 30s → 60s → 120s，加随机抖动
-                    base_wait = int(resp.headers.get("Retry-After", 30))
-                    backoff = min(base_wait * (2 ** attempt), 120)
-                    jitter = random.uniform(0, backoff * 0.3)
-                    wait = backoff + jitter
+                    # 暂停该域名（Retry-After × 2^attempt），下次 throttle 自动等待
+                    wait = self.report_throttle(url, 429, resp.headers.get("Retry-After"), attempt)
                     print(f"    [!] {self.source_name} 限流(429)，退避 {wait:.0f}s (attempt {attempt+1})...")
-                    time.sleep(wait)
                     continue
 
                 if resp.status_code == 412:
                     # Bilibili 风控等，不重试
+                    self.report_throttle(url, 412, resp.headers.get("Retry-After"))
+                    self._record(url, resp)
                     return resp
 
                 if resp.status_code == 403:
+                    self.report_throttle(url, 403, resp.headers.get("Retry-After"))
                     if attempt < max_retries - 1:
-                        # 退避后重试
-                        backoff = 5 * (2 ** attempt) + random.uniform(0, 3)
-                        time.sleep(backoff)
                         continue
                     print(f"    [!] {self.source_name} 被拒(403): {url[:80]}")
+                    self._count("errors")
                     return None
 
+                if resp.status_code == 304 and conditional:
+                    get_rate_limiter().on_success(url)
+                    self._conditional_304 += 1
+                    return resp
+
                 resp.raise_for_status()
+                get_rate_limiter().on_success(url)
+                if conditional:
+                    etag = resp.headers.get("ETag")
+                    last_modified = resp.headers.get("Last-Modified")
+                    if etag or last_modified:
+                        self._http_cache_pending[url] = {"etag": etag, "last_modified": last_modified}
+                self._record(url, resp)
                 return resp
 
             except (httpx.ReadError, ssl.SSLError):
@@ -161,15 +475,36 @@ class BaseScraper(ABC):
                     time.sleep(3 * (attempt + 1))
                     continue  # SSL 降级重试
                 print(f"    [!] {self.source_name} SSL 错误: {url[:80]}")
+                self._count("errors")
                 return None
             except httpx.TimeoutException:
                 if attempt < max_retries - 1:
                     time.sleep(5 * (attempt + 1))
                     continue
                 print(f"    [!] {self.source_name} 超时: {url[:80]}")
+                self._count("errors")
                 return None
             except Exception as e:
                 print(f"    [!] {self.source_name} 请求失败: {e}")
+                self._count("errors")
                 return None
 
+        # 重试次数用完仍是 429
+        print(f"    [!] {self.source_name} 持续限流(429)，放弃: {url[:80]}")
+        self._count("errors")
         return None
+
+    def _record(self, url: str, resp: httpx.Response):
+        if self.http_mode != "record":
+            return
+        try:
+            cassette.record(self._cassette_dir, url, resp)
+        except OSError as e:
+            print(f"    [!] {self.source_name} 录制失败: {e}")
+
+    def _replay(self, url: str) -> httpx.Response | None:
+        """回放模式：不联网、不限流，未录制的 URL 按请求失败处理"""
+        resp = cassette.replay(self._cassette_dir, url)
+        if resp is None:
+            self.replay_misses += 1
+        return resp
@@ -59,7 +59,7 @@ class BilibiliScraper(BaseScraper):
         keywords = list(self.search_keywords)
         random.shuffle(keywords)
 
-        for i, keyword in enumerate(keywords):
+        for keyword in keywords:
             try:
                 encoded_kw = quote(keyword)
                 full_url = (
@@ -67,12 +67,10 @@ class BilibiliScraper(BaseScraper):
                     f"?search_type=video&keyword={encoded_kw}"
                     f"&order=pubdate&duration=0&page=1&pagesize=20"
                 )
-                # 关键词间递增延迟: 4-7s, 5-8s, 6-9s...
-                kw_delay = (4.0 + i * 1.0, 7.0 + i * 1.0)
                 resp = self.safe_request(
                     full_url,
                     referer=f"https://search.bilibili.com/all?keyword={encoded_kw}",
-                    delay=kw_delay,
+                    delay=(4.0, 7.0),
                     extra_headers=self._bili_headers(),
                     cookies=self._session_cookies,
                 )
@@ -88,6 +86,7 @@ class BilibiliScraper(BaseScraper):
                 data = resp.json()
                 if data.get("code") != 0:
                     if data.get("code") == -412:
+                        self.report_throttle(full_url, 412)
                         print(f"    [!] Bilibili 被限流(-412)，停止搜索")
                         self._rate_limited = True
                         break
@@ -114,27 +113,16 @@ class BilibiliScraper(BaseScraper):
         if self._rate_limited:
             print(f"    跳过评论抓取（限流中）")
         else:
-            hot_posts = [p for p in posts if p.get("replies", 0) > 5][:8]  # 最多8条，避免耗时
-            if hot_posts:
-                print(f"    抓取 {len(hot_posts)} 条热门视频评论...", end=" ")
-                fetched = 0
-                import time as _time
-                comment_start = _time.time()
-                for p in hot_posts:
-                    # 总耗时超过 120s 则停止
-                    if _time.time() - comment_start > 120:
-                        print(f"(超时截断)", end=" ")
-                        break
-                    comments = self._fetch_comments(p)
-                    if comments:
-                        p["comments"] = comments[:2000]
-                        fetched += 1
-                    elif self._rate_limited:
-                        break  # 评论 API 也被限流，停止
-                print(f"成功 {fetched} 条")
+            # 最多 8 条，评论 API 也被限流时停止
+            self.enrich_posts(posts, self._enrich_comments, label="视频评论", min_replies=5,
+                              max_items=8, should_stop=lambda: self._rate_limited)
 
         return posts
 
+    def _enrich_comments(self, post: dict) -> dict | None:
+        comments = self._fetch_comments(post)
+        return {"comments": comments[:2000]} if comments else None
+
     def _fetch_comments(self, post: dict, max_comments: int = 10) -> str | None:
         """抓取视频 Top 评论（按热度排序）"""
         # 从 bvid 获取 aid（Bilibili 评论 API 需要 aid）
@@ -0,0 +1,165 @@
+"""GPU-Insight 常驻浏览器池 — Playwright 只启动一次，跨轮复用
+
+浏览器跑在独立的 asyncio 工作线程里（async API 不绑定调用线程），
+爬虫线程通过 fetch_pages() 同步调用。每个 key（通常是数据源名）一个常驻
+BrowserContext + 页面池，拦截图片/字体/CSS/媒体等非文档资源。
+"""
+
+import asyncio
+import atexit
+import threading
+
+# 非文档资源直接 abort，只加载 HTML 和挑战脚本
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}
+
+
+async def _block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class BrowserPool:
+    """常驻 Chromium + 按 key 复用的 context / 页面池"""
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._pw = None
+        self._browser = None
+        self._contexts: dict[str, object] = {}
+        self._pages: dict[str, list] = {}
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name="playwright", daemon=True)
+                self._thread.start()
+
+    def _run(self, coro, timeout: float):
+        self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(timeout)
+
+    async def _get_context(self, key: str, user_agent: str, locale: str, cookies: list[dict]):
+        if self._browser is None or not self._browser.is_connected():
+            from playwright.async_api import async_playwright
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=True)
+            self._contexts.clear()
+            self._pages.clear()
+        ctx = self._contexts.get(key)
+        if ctx is None:
+            ctx = await self._browser.new_context(user_agent=user_agent, locale=locale)
+            await ctx.route("**/*", _block_resources)
+            if cookies:
+                await ctx.add_cookies(cookies)
+            self._contexts[key] = ctx
+            self._pages[key] = []
+        return ctx
+
+    async def _fetch(self, key: str, urls: list[str], wait_selector: str | None,
+                     concurrency: int, timeout_ms: int, before, user_agent: str,
+                     locale: str, cookies: list[dict]) -> dict[str, str | None]:
+        ctx = await self._get_context(key, user_agent, locale, cookies)
+        pages = self._pages[key]
+        while len(pages) < concurrency:
+            pages.append(await ctx.new_page())
+        idle: asyncio.Queue = asyncio.Queue()
+        for page in pages[:concurrency]:
+            idle.put_nowait(page)
+
+        loop = asyncio.get_running_loop()
+
+        async def one(url: str) -> str | None:
+            # 限流回调是同步阻塞的，放到默认线程池里等
+            if before and not await loop.run_in_executor(None, before, url):
+                return None
+            page = await idle.get()
+            try:
+                await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+                if wait_selector:
+                    await page.wait_for_selector(wait_selector, timeout=min(timeout_ms, 10000))
+                return await page.content()
+            except Exception as e:
+                print(f"    [!] {key} 页面加载失败: {url[:80]} ({e.__class__.__name__})")
+                return None
+            finally:
+                idle.put_nowait(page)
+
+        results = await asyncio.gather(*(one(u) for u in urls))
+        return dict(zip(urls, results))
+
+    def fetch_pages(self, key: str, urls: list[str], wait_selector: str = None,
+                    concurrency: int = 2, timeout: float = 30, before=None,
+                    user_agent: str = None, locale: str = "zh-CN",
+                    cookies: list[dict] = None) -> dict[str, str | None]:
+        """并行渲染多个页面，返回 url → HTML（失败为 None）
+
+        Args:
+            before: 每个 url 开始加载前调用的同步回调（如令牌桶限流），返回 False 则跳过
+            cookies: 仅在首次创建该 key 的 context 时注入
+        """
+        overall = timeout * (-(-len(urls) // max(1, concurrency))) + 60
+        return self._run(self._fetch(key, urls, wait_selector, max(1, concurrency),
+                                     int(timeout * 1000), before, user_agent, locale,
+                                     cookies or []), overall)
+
+    def cookies(self, key: str, urls: list[str] = None) -> list[dict]:
+        """导出该 context 当前的 Cookie（挑战通过后用于 httpx 快速通道）"""
+        ctx = self._contexts.get(key)
+        if ctx is None:
+            return []
+        return self._run(ctx.cookies(urls) if urls else ctx.cookies(), 30)
+
+    async def _shutdown(self):
+        for ctx in list(self._contexts.values()):
+            try:
+                await ctx.close()
+            except Exception:
+                pass
+        self._contexts.clear()
+        self._pages.clear()
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._pw is not None:
+            try:
+                await self._pw.stop()
+            except Exception:
+                pass
+            self._pw = None
+
+    def close(self):
+        """关闭浏览器并停止工作线程（进程退出时自动调用）"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._run(self._shutdown(), 30)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+
+_POOL: BrowserPool | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """进程级常驻浏览器池"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BrowserPool()
+            atexit.register(_POOL.close)
+        return _POOL
@@ -0,0 +1,59 @@
+"""GPU-Insight HTTP 录制/回放 — 离线基准测试与解析回归
+
+runtime.http_mode:
+  live    正常联网（默认）
+  record  联网，同时把每个最终响应写入 data/cassettes/<source>/
+  replay  不联网、不限流，直接从 cassette 读取响应；未录制的 URL 视为请求失败
+
+一个 URL 一个 JSON 文件，文件名取 URL 的 sha1 前缀，内容可直接阅读/手改。
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import httpx
+
+HTTP_MODES = ("live", "record", "replay")
+
+# 响应体已解码，回放时这些头会与内容不符
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def cassette_dir(config: dict, source_name: str) -> Path:
+    base = config.get("paths", {}).get("cassettes", "data/cassettes")
+    return Path(base) / source_name
+
+
+def _cassette_file(directory: Path, url: str) -> Path:
+    return directory / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+def record(directory: Path, url: str, resp: httpx.Response):
+    """保存一次响应（同 URL 覆盖）"""
+    directory.mkdir(parents=True, exist_ok=True)
+    headers = {k: v for k, v in resp.headers.items() if k.lower() not in _DROP_HEADERS}
+    entry = {
+        "url": url,
+        "status": resp.status_code,
+        "headers": headers,
+        "encoding": resp.encoding or "utf-8",
+        "body": resp.text,
+    }
+    _cassette_file(directory, url).write_text(json.dumps(entry, ensure_ascii=False),
+                                              encoding="utf-8")
+
+
+def replay(directory: Path, url: str) -> httpx.Response | None:
+    """读取录制的响应，未录制返回 None"""
+    path = _cassette_file(directory, url)
+    if not path.exists():
+        return None
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    encoding = entry.get("encoding") or "utf-8"
+    return httpx.Response(
+        entry["status"],
+        headers=entry.get("headers", {}),
+        content=entry["body"].encode(encoding, errors="replace"),
+        request=httpx.Request("GET", url),
+    )
@@ -22,7 +22,6 @@ class ChiphellScraper(BaseScraper):
         """抓取 Chiphell 显卡板块新帖"""
         posts = []
         try:
-            import httpx
             from bs4 import BeautifulSoup
 
             headers = {
@@ -31,27 +30,24 @@ class ChiphellScraper(BaseScraper):
             }
 
             for forum_url in self.forum_urls:
-                try:
-                    self.random_delay(1.0, 3.0)
-                    resp = httpx.get(forum_url, headers=headers, timeout=30, follow_redirects=True)
-                    resp.raise_for_status()
-
-                    soup = BeautifulSoup(resp.text, "html.parser")
-                    # Discuz 论坛结构：帖子列表在 #threadlisttableid 或 .bm_c
-                    thread_list = soup.select("tbody[id^='normalthread_']")
-
-                    for thread in thread_list:
-                        try:
-                            post = self._parse_thread(thread, last_id)
-                            if post:
-                                posts.append(post)
-                        except Exception as e:
-                            continue
-
-                except httpx.HTTPError as e:
-                    print(f"    [!] 请求失败 {forum_url}: {e}")
+                resp = self.safe_request(forum_url, delay=(1.0, 3.0), extra_headers=headers)
+                if resp is None:
+                    if self._deadline_passed():
+                        break
                     continue
 
+                soup = BeautifulSoup(resp.text, "html.parser")
+                # Discuz 论坛结构：帖子列表在 #threadlisttableid 或 .bm_c
+                thread_list = soup.select("tbody[id^='normalthread_']")
+
+                for thread in thread_list:
+                    try:
+                        post = self._parse_thread(thread, last_id)
+                        if post:
+                            posts.append(post)
+                    except Exception as e:
+                        continue
+
         except ImportError as e:
             print(f"  [!] 缺少依赖: {e}")
             print("     请运行: pip install httpx beautifulsoup4 lxml")
@@ -103,15 +99,14 @@ class ChiphellScraper(BaseScraper):
     def fetch_post_detail(self, url: str) -> str:
         """抓取帖子详情内容（二次请求）"""
         try:
-            import httpx
             from bs4 import BeautifulSoup
 
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
             }
-            self.random_delay(2.0, 5.0)
-            resp = httpx.get(url, headers=headers, timeout=30, follow_redirects=True)
-            resp.raise_for_status()
+            resp = self.safe_request(url, delay=(2.0, 5.0), extra_headers=headers)
+            if resp is None:
+                return ""
 
             soup = BeautifulSoup(resp.text, "html.parser")
             # 主楼内容
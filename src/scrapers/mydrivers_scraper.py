@@ -39,7 +39,11 @@ class MyDriversScraper(BaseScraper):
                 resp = self.safe_request(page_url,
                                          referer="https://www.mydrivers.com/",
                                          delay=(2.0, 4.0),
-                                         extra_headers={"Accept-Language": "zh-CN,zh;q=0.9"})
+                                         extra_headers={"Accept-Language": "zh-CN,zh;q=0.9"},
+                                         conditional=True)
+                if resp and resp.status_code == 304:
+                    print(f"    快科技: 页面未变化 (304) {page_url}")
+                    continue
                 if not resp or resp.status_code != 200:
                     print(f"    [!] 快科技: 请求失败 {page_url}")
                     continue
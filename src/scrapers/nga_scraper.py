@@ -34,7 +34,7 @@ class NGAScraper(BaseScraper):
 
     def fetch_posts(self, last_id: str = None) -> list[dict]:
         """抓取 NGA 硬件区帖子"""
-        if not self.cookies:
+        if not self.cookies and self.http_mode != "replay":
             print("    [!] NGA Cookie 为空，跳过")
             return []
 
@@ -54,19 +54,9 @@ class NGAScraper(BaseScraper):
         for p in posts:
             tag_post(p)
 
-        # 抓取热门帖子正文（回复>3的帖子更可能有痛点讨论）
-        hot_posts = [p for p in posts if p.get("replies", 0) > 3][:30]
-        if hot_posts:
-            print(f"    抓取 {len(hot_posts)} 条热帖正文...", end=" ")
-            fetched = 0
-            for p in hot_posts:
-                main_content, comments = self._fetch_thread_content(p["id"].replace("nga_", ""))
-                if main_content:
-                    p["content"] = main_content
-                    fetched += 1
-                if comments:
-                    p["comments"] = comments[:2000]
-            print(f"成功 {fetched} 条")
+        # 抓取热门帖子正文（回复>3的帖子更可能有痛点讨论）；评论快照不含正文，不走评论缓存
+        self.enrich_posts(posts, self._enrich_thread, label="正文", min_replies=3, max_items=30,
+                          time_budget=None, use_comment_cache=False)
 
         return posts
 
@@ -161,6 +151,15 @@ class NGAScraper(BaseScraper):
             "timestamp": post_time.isoformat(),
         }
 
+    def _enrich_thread(self, post: dict) -> dict | None:
+        main_content, comments = self._fetch_thread_content(post["id"].replace("nga_", ""))
+        updates = {}
+        if main_content:
+            updates["content"] = main_content
+        if comments:
+            updates["comments"] = comments[:2000]
+        return updates or None
+
     def _fetch_thread_content(self, tid: str) -> tuple[str | None, str | None]:
         """抓取帖子首楼正文 + Top 回复，分离返回 (content, comments)"""
         try:
@@ -0,0 +1,189 @@
+"""GPU-Insight 按域名令牌桶限流器 — 替代固定随机 sleep
+
+每个可注册域名（www.reddit.com 与 old.reddit.com 共用 reddit.com）一个令牌桶，
+所有爬虫线程共享。请求只在预算不足时等待；遇到 429/412/403 时
+按 Retry-After 暂停该域名并减半速率，之后每次成功请求逐步恢复（AIMD）。
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# 未配置 rate_limit 时的默认预算
+DEFAULT_PER_MINUTE = 20
+DEFAULT_BURST = 2
+# 速率下限（被限流后最多降到基准的 1/8）
+MIN_RATE_FACTOR = 0.125
+# 每次成功请求恢复基准速率的比例
+RECOVERY_STEP = 0.1
+# 单次封禁时长上限（秒）
+MAX_BLOCK_SEC = 300
+
+# 二级域名后缀（xxx.com.cn 之类需要保留三段）
+_SECOND_LEVEL = {"com", "net", "org", "gov", "edu", "co"}
+
+
+def registrable_domain(url_or_host: str) -> str:
+    """提取可注册域名：old.reddit.com → reddit.com, bbs.nga.cn → nga.cn"""
+    host = urlsplit(url_or_host).hostname if "//" in url_or_host else url_or_host
+    host = (host or "").lower().split(":")[0]
+    parts = host.split(".")
+    if len(parts) <= 2:
+        return host
+    if parts[-2] in _SECOND_LEVEL and len(parts[-1]) == 2:
+        return ".".join(parts[-3:])
+    return ".".join(parts[-2:])
+
+
+def parse_retry_after(value: str | None, default: float = 30.0) -> float:
+    """解析 Retry-After（秒数或 HTTP 日期）"""
+    if not value:
+        return default
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(value)
+        return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """单域名令牌桶（预约式：令牌可透支为负，等待时间 = 欠额 / 速率）"""
+
+    def __init__(self, per_minute: float, burst: int, now: float):
+        self.base_rate = max(per_minute, 0.1) / 60.0
+        self.rate = self.base_rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = now
+        self.blocked_until = 0.0
+        self.strikes = 0  # 连续被限流次数
+        self.stats = {"requests": 0, "throttled": 0, "waited_sec": 0.0}
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """预约一个令牌，返回需要等待的秒数"""
+        # 封禁期内令牌不增长，从解封时刻开始计算
+        start = max(now, self.blocked_until)
+        self._refill(start)
+        self.tokens -= 1
+        wait = start - now
+        if self.tokens < 0:
+            wait += -self.tokens / self.rate
+        return wait
+
+    def cancel(self):
+        """撤销一次预约（等待会超过 deadline 时）"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def penalize(self, now: float, block_sec: float):
+        self.strikes += 1
+        self.rate = max(self.base_rate * MIN_RATE_FACTOR, self.rate / 2)
+        self.blocked_until = max(self.blocked_until, now + min(block_sec, MAX_BLOCK_SEC))
+        # 清空存量令牌，解封后按新速率慢启动
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, self.blocked_until)
+        self.stats["throttled"] += 1
+
+    def reward(self):
+        self.strikes = 0
+        self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+
+class RateLimiter:
+    """按域名共享的令牌桶集合（线程安全）"""
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, url: str, per_minute: float, burst: int = DEFAULT_BURST):
+        """为 url 所属域名设定预算（已存在则保留，先配置者生效）"""
+        domain = registrable_domain(url)
+        with self._lock:
+            if domain not in self._buckets:
+                self._buckets[domain] = TokenBucket(per_minute, burst, self._clock())
+
+    def _bucket(self, url: str) -> TokenBucket:
+        domain = registrable_domain(url)
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            bucket = TokenBucket(DEFAULT_PER_MINUTE, DEFAULT_BURST, self._clock())
+            self._buckets[domain] = bucket
+        return bucket
+
+    def acquire(self, url: str, deadline: float | None = None) -> bool:
+        """等待直到该域名有预算；deadline 为 time.time() 时间戳
+
+        Returns:
+            False 表示等待会超过 deadline（未消耗令牌）
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+            wait = bucket.reserve(self._clock())
+            if deadline is not None and time.time() + wait > deadline:
+                bucket.cancel()
+                return False
+            bucket.stats["requests"] += 1
+            bucket.stats["waited_sec"] += wait
+        if wait > 0:
+            self._sleep(wait)
+        return True
+
+    def on_success(self, url: str):
+        with self._lock:
+            self._bucket(url).reward()
+
+    def on_throttle(self, url: str, status: int, retry_after: str | None = None,
+                    attempt: int = 0):
+        """429/412/403 反馈：暂停该域名并减半速率
+
+        429 优先采用服务端 Retry-After；412/403 无该头时按连续次数指数退避。
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+            if status == 429:
+                block = parse_retry_after(retry_after, default=30.0) * (2 ** attempt)
+            else:
+                default = 60.0 if status == 412 else 5.0
+                block = parse_retry_after(retry_after, default=default) * (2 ** bucket.strikes)
+            bucket.penalize(self._clock(), block)
+            return block
+
+    def stats(self) -> dict:
+        """域名 → {requests, throttled, waited_sec, rate_per_min}"""
+        with self._lock:
+            return {
+                domain: {
+                    **b.stats,
+                    "waited_sec": round(b.stats["waited_sec"], 1),
+                    "rate_per_min": round(b.rate * 60, 1),
+                }
+                for domain, b in self._buckets.items()
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            for b in self._buckets.values():
+                b.stats = {"requests": 0, "throttled": 0, "waited_sec": 0.0}
+
+
+_LIMITER = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """进程级共享限流器"""
+    return _LIMITER
@@ -44,22 +44,8 @@ class RedditScraper(BaseScraper):
             p["_signal_score"] = self._calc_signal_score(p)
         posts.sort(key=lambda x: x["_signal_score"], reverse=True)
 
-        # 热帖评论（回复>10，最多 15 条）— 独立存储到 comments 字段
-        hot_posts = [p for p in posts if p.get("replies", 0) > 10][:15]
-        if hot_posts:
-            import time as _time
-            print(f"    抓取 {len(hot_posts)} 条热帖评论...", end=" ")
-            fetched = 0
-            deadline = _time.time() + 120  # 总超时 2 分钟
-            for p in hot_posts:
-                if _time.time() > deadline:
-                    print(f"(超时，已获取 {fetched} 条)", end=" ")
-                    break
-                comments = self._fetch_comments(p)
-                if comments:
-                    p["comments"] = comments[:2000]
-                    fetched += 1
-            print(f"成功 {fetched} 条")
+        # 热帖评论（回复>10，最多 15 条，总预算 2 分钟）— 独立存储到 comments 字段
+        self.enrich_posts(posts, self._enrich_comments, min_replies=10, max_items=15)
 
         return posts
 
@@ -87,6 +73,10 @@ class RedditScraper(BaseScraper):
                 return []
         return []
 
+    def _enrich_comments(self, post: dict) -> dict | None:
+        comments = self._fetch_comments(post)
+        return {"comments": comments[:2000]} if comments else None
+
     def _fetch_comments(self, post: dict, max_comments: int = 5) -> str | None:
         """抓取帖子 Top N 评论"""
         post_id = post["id"].replace("reddit_", "")
@@ -0,0 +1,83 @@
+"""GPU-Insight 自适应抓取调度 — 按 interval_hours + 历史产出决定本轮抓哪些源
+
+有效间隔 = sources.<name>.interval_hours × 产出系数 × 健康系数：
+  - 连续 N 轮零新增：系数 2^(N-1)，上限 max_backoff_factor（304 未变化同样计入）
+  - 上一轮被限流或错误过半：再 ×2，给站点喘息时间
+距上次抓取超过有效间隔（留 10% 余量，避免与 cycle 周期抖动错开）即本轮到期。
+"""
+
+from datetime import datetime, timezone
+
+
+def _hours_since(ts: str, now: datetime) -> float | None:
+    try:
+        return (now - datetime.fromisoformat(ts)).total_seconds() / 3600
+    except (TypeError, ValueError):
+        return None
+
+
+def effective_interval(source_config: dict, history: list[dict], sched: dict,
+                       default_hours: float) -> tuple[float, str]:
+    """计算有效抓取间隔（小时）及原因说明
+
+    Args:
+        history: 最近抓取记录（新 → 旧），见 db.get_scrape_history
+        default_hours: 未配置 interval_hours 时的间隔（runtime.cycle_interval_hours）
+    """
+    base = float(source_config.get("interval_hours", default_hours))
+    if not history:
+        return base, "无历史"
+
+    factor = 1.0
+    reasons = []
+
+    zero_streak = 0
+    for run in history:
+        if run["new_posts"] > 0:
+            break
+        zero_streak += 1
+
+    if zero_streak >= 2:
+        factor *= min(2 ** (zero_streak - 1), sched.get("max_backoff_factor", 4))
+        reasons.append(f"连续 {zero_streak} 轮零新增")
+
+    last = history[0]
+    if last["rate_limited"] > 0 or (last["requests"] and last["errors"] * 2 > last["requests"]):
+        factor *= 2
+        reasons.append("上轮限流/错误")
+
+    hours = max(sched.get("min_interval_hours", 1), base * factor)
+    return hours, "、".join(reasons) or "正常"
+
+
+def plan_sources(config: dict, source_names: list[str], now: datetime = None) -> tuple[list[str], dict]:
+    """决定本轮要抓的数据源
+
+    Returns:
+        (due, skipped)：到期的源列表（保持原顺序），跳过的源 → 原因
+    """
+    sched = config.get("scheduling", {})
+    if not sched.get("enabled", False):
+        return list(source_names), {}
+
+    from src.utils.db import get_scrape_history
+
+    # scrape_history 时间为 SQLite datetime('now')，即 UTC
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    default_hours = config.get("runtime", {}).get("cycle_interval_hours", 4)
+    slack = sched.get("slack_ratio", 0.1)
+
+    due, skipped = [], {}
+    for name in source_names:
+        history = get_scrape_history(name, limit=10)
+        if not history:
+            due.append(name)
+            continue
+        hours, reason = effective_interval(config.get("sources", {}).get(name, {}),
+                                           history, sched, default_hours)
+        elapsed = _hours_since(history[0]["scraped_at"], now)
+        if elapsed is None or elapsed >= hours * (1 - slack):
+            due.append(name)
+        else:
+            skipped[name] = f"间隔 {hours:g}h（{reason}），距上次 {elapsed:.1f}h"
+    return due, skipped
@@ -32,7 +32,10 @@ class TechPowerUpScraper(BaseScraper):
         try:
             resp = self.safe_request("https://www.techpowerup.com/",
                                      referer="https://www.techpowerup.com/",
-                                     delay=(2.0, 4.0))
+                                     delay=(2.0, 4.0), conditional=True)
+            if resp and resp.status_code == 304:
+                print(f"    TechPowerUp: 首页未变化 (304)")
+                return []
             if not resp or resp.status_code != 200:
                 print(f"    [!] TechPowerUp: 请求失败")
                 return []
@@ -31,7 +31,10 @@ class V2EXScraper(BaseScraper):
                 url = f"https://www.v2ex.com/api/topics/show.json?node_name={node}"
                 resp = self.safe_request(url, referer="https://www.v2ex.com/",
                                          delay=(1.5, 3.0),
-                                         extra_headers={"Accept": "application/json"})
+                                         extra_headers={"Accept": "application/json"},
+                                         conditional=True)
+                if resp and resp.status_code == 304:
+                    continue  # 节点无新话题
                 if resp and resp.status_code == 200:
                     for item in resp.json():
                         post = self._parse_topic(item)
@@ -49,7 +52,8 @@ class V2EXScraper(BaseScraper):
             url = "https://www.v2ex.com/api/topics/hot.json"
             resp = self.safe_request(url, referer="https://www.v2ex.com/",
                                      delay=(2.0, 4.0),
-                                     extra_headers={"Accept": "application/json"})
+                                     extra_headers={"Accept": "application/json"},
+                                     conditional=True)
             if resp and resp.status_code == 200:
                 for item in resp.json():
                     title = item.get("title", "")
@@ -68,24 +72,14 @@ class V2EXScraper(BaseScraper):
             tag_post(p)
 
         # 热帖回复抓取（回复>3 的帖子，最多 10 条，总超时 120 秒）
-        import time
-        hot_posts = [p for p in posts if p.get("replies", 0) > 3][:10]
-        if hot_posts:
-            print(f"    抓取 {len(hot_posts)} 条热帖回复...", end=" ")
-            fetched = 0
-            t0 = time.time()
-            for p in hot_posts:
-                if time.time() - t0 > 120:
-                    print(f"(超时120s，跳过剩余)", end=" ")
-                    break
-                comments = self._fetch_replies(p)
-                if comments:
-                    p["comments"] = comments[:2000]
-                    fetched += 1
-            print(f"成功 {fetched} 条")
+        self.enrich_posts(posts, self._enrich_replies, label="回复", min_replies=3, max_items=10)
 
         return posts
 
+    def _enrich_replies(self, post: dict) -> dict | None:
+        comments = self._fetch_replies(post)
+        return {"comments": comments[:2000]} if comments else None
+
     def _fetch_replies(self, post: dict, max_replies: int = 5) -> str | None:
         """抓取 V2EX 帖子回复"""
         topic_id = post["id"].replace("v2ex_", "")
@@ -21,13 +21,16 @@ class VideoCardzScraper(BaseScraper):
         posts = []
 
         try:
-            # 禁用 Brotli（httpx 未装 brotli 包会返回乱码）
+            # Accept-Encoding 由 BaseScraper 按是否安装 brotli 自动协商
             resp = self.safe_request(
                 "https://www.videocardz.com/",
                 referer="https://www.google.com/",
                 delay=(3.0, 5.0),
-                extra_headers={"Accept-Encoding": "gzip, deflate"},
+                conditional=True,
             )
+            if resp and resp.status_code == 304:
+                print(f"    VideoCardz: 首页未变化 (304)")
+                return []
             if not resp or resp.status_code != 200:
                 print(f"    [!] VideoCardz: HTTP {resp.status_code if resp else 'None'}")
                 return []
@@ -0,0 +1,205 @@
+"""GPU-Insight 列式数据集 — 清洗帖子 / 痛点 / 隐藏需求 / 排名按日期、来源分区写 Parquet
+
+data/processed 下的 JSONL 只能逐行解析；离线分析、回放几个月的数据时，
+大部分字节（正文、评论、推理链）其实用不到。开启 columnar.enabled 后（需 pyarrow），
+每次写 JSONL 的同时追加一份 Parquet：
+
+  <columnar.path>/<数据集>/date=YYYY-MM-DD/source=<来源>/part-HHMMSS-xxxxxxxx.parquet
+
+  - 嵌套字段（dict / list）存为 JSON 字符串，标量保持原类型
+  - 每个数据集的 _schema.json 记录各列类型：新列直接追加；
+    同一列出现不兼容的新类型时放宽（int → double，其余 → string），读取时旧文件按登记类型转换
+  - 读取走 pyarrow.dataset：只解码选中的列，date / source 过滤在分区目录层面裁剪
+"""
+
+import json
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = None
+    pq = None
+
+DATASETS = ("cleaned", "pain_points", "hidden_needs", "reviewed", "rankings")
+_PARTITION_FIELDS = ("date", "source")
+
+_lock = threading.Lock()
+_warned = False
+
+
+def _settings(config: dict | None) -> dict:
+    return (config or {}).get("columnar") or {}
+
+
+def is_enabled(config: dict | None) -> bool:
+    """配置开启且 pyarrow 可用（缺依赖时只提示一次）"""
+    global _warned
+    if not _settings(config).get("enabled", False):
+        return False
+    if pa is None:
+        if not _warned:
+            print("  [!] columnar.enabled 已开启但未安装 pyarrow，跳过 Parquet 写入")
+            _warned = True
+        return False
+    return True
+
+
+def _root(config: dict | None) -> Path:
+    return Path(_settings(config).get("path", "data/columnar"))
+
+
+def _flatten(record: dict) -> dict:
+    row = {}
+    for key, value in record.items():
+        if key in _PARTITION_FIELDS:
+            continue  # 由分区目录还原
+        if isinstance(value, (dict, list, tuple, set)):
+            row[key] = json.dumps(list(value) if isinstance(value, set) else value,
+                                  ensure_ascii=False, default=str)
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            row[key] = value
+        else:
+            row[key] = str(value)
+    return row
+
+
+def _load_schema(directory: Path) -> dict[str, str]:
+    path = directory / "_schema.json"
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return {}
+
+
+def _column(values: list, registered: str | None):
+    """按登记类型建列（安全转换，不截断）；不兼容时整数放宽为 double，其余退回 string
+
+    返回 (array, 类型名)。
+    """
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        array = None  # 同一列混了不同 Python 类型
+    if array is not None:
+        inferred = str(array.type)
+        if registered in (None, "null"):
+            return array, inferred
+        try:
+            return array.cast(pa.type_for_alias(registered)), registered
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass
+        if {registered, inferred} <= {"int64", "double"}:
+            return array.cast(pa.float64()), "double"
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string()), "string"
+
+
+def write_records(dataset: str, records: list[dict], config: dict,
+                  source_key: str = "source", when: datetime = None) -> list[Path]:
+    """把一批记录按 (日期, 来源) 分区写成 Parquet，返回写出的文件
+
+    没有来源字段的记录（痛点、排名等跨源汇总）归入 source=all。
+    """
+    if not records or not is_enabled(config):
+        return []
+    when = when or datetime.now()
+    directory = _root(config) / dataset
+    groups: dict[str, list[dict]] = {}
+    for record in records:
+        source = record.get(source_key) or record.get("_source") or "all"
+        row = _flatten(record)
+        row["_written_at"] = when.isoformat(timespec="seconds")
+        groups.setdefault(str(source), []).append(row)
+
+    written = []
+    with _lock:
+        directory.mkdir(parents=True, exist_ok=True)
+        schema = _load_schema(directory)
+        changed = False
+        for source, rows in groups.items():
+            names = list(dict.fromkeys(k for row in rows for k in row))
+            arrays = []
+            for name in names:
+                array, type_name = _column([row.get(name) for row in rows], schema.get(name))
+                if schema.get(name) != type_name:
+                    schema[name] = type_name
+                    changed = True
+                arrays.append(array)
+            table = pa.Table.from_arrays(arrays, names=names)
+            part_dir = directory / f"date={when:%Y-%m-%d}" / f"source={source}"
+            part_dir.mkdir(parents=True, exist_ok=True)
+            path = part_dir / f"part-{when:%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+            pq.write_table(table, path, compression=_settings(config).get("compression", "zstd"))
+            written.append(path)
+        if changed:
+            (directory / "_schema.json").write_text(json.dumps(schema, ensure_ascii=False, indent=1),
+                                                    encoding="utf-8")
+    return written
+
+
+def save_records(dataset: str, records: list[dict], config: dict, **kwargs):
+    """JSONL 落盘处的附加写入：出错只打印，不影响主流程"""
+    try:
+        write_records(dataset, records, config, **kwargs)
+    except Exception as e:
+        print(f"  [!] Parquet 写入失败（{dataset}）: {e}")
+
+
+def open_dataset(dataset: str, config: dict = None):
+    """打开数据集（pyarrow.dataset.Dataset，未读取任何数据）；不存在返回 None"""
+    if pa is None:
+        raise ImportError("读取列式数据集需要 pyarrow")
+    import pyarrow.dataset as ds
+    directory = _root(config) / dataset
+    if not directory.exists():
+        return None
+    registered = _load_schema(directory)
+    fields = [pa.field(name, pa.type_for_alias(t)) for name, t in registered.items()]
+    fields += [pa.field(name, pa.string()) for name in _PARTITION_FIELDS]
+    return ds.dataset(str(directory), format="parquet", schema=pa.schema(fields),
+                      partitioning=ds.partitioning(pa.schema([(n, pa.string()) for n in _PARTITION_FIELDS]),
+                                                   flavor="hive"))
+
+
+def _filter(since: str = None, until: str = None, sources: list[str] = None):
+    import pyarrow.dataset as ds
+    expr = None
+    for part in (
+        ds.field("date") >= since if since else None,
+        ds.field("date") <= until if until else None,
+        ds.field("source").isin(list(sources)) if sources else None,
+    ):
+        if part is not None:
+            expr = part if expr is None else expr & part
+    return expr
+
+
+def scan(dataset: str, columns: list[str] = None, since: str = None, until: str = None,
+         sources: list[str] = None, config: dict = None, batch_size: int = 10000):
+    """惰性读取：逐批产出 pyarrow.RecordBatch，只解码 columns 指定的列
+
+    since / until 为 YYYY-MM-DD（含），与 sources 一起在分区层面裁剪文件。
+    """
+    data = open_dataset(dataset, config)
+    if data is None:
+        return
+    yield from data.to_batches(columns=columns, filter=_filter(since, until, sources),
+                               batch_size=batch_size)
+
+
+def iter_records(dataset: str, columns: list[str] = None, **kwargs):
+    """按行产出 dict（JSON 字符串列保持原样，需要时自行 json.loads）"""
+    for batch in scan(dataset, columns, **kwargs):
+        yield from batch.to_pylist()
+
+
+def read_table(dataset: str, columns: list[str] = None, since: str = None, until: str = None,
+               sources: list[str] = None, config: dict = None):
+    """一次读成 pyarrow.Table（可 .to_pandas() 做分析）"""
+    data = open_dataset(dataset, config)
+    if data is None:
+        return None
+    return data.to_table(columns=columns, filter=_filter(since, until, sources))
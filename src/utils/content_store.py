@@ -0,0 +1,468 @@
+"""GPU-Insight 帖子内容存储 — 按 content_hash 去重的压缩正文/评论库
+
+正文和评论原先只留在每日 JSONL（data/raw、data/processed）里，无限增长也无法随机读取。
+这里把完整帖子 JSON 压缩后存进独立的 SQLite 文件（不拖大主库和备份）：
+
+  - 压缩：优先 zstd + 用语料训练的字典（需 zstandard 包），缺失时退回 zlib 预置字典
+  - 分层：hot（近 hot_days 天，快速压缩）→ warm（高压缩级别重压）
+          → archive（超过 archive_days 天，移入 paths.archive 下的归档库，仍可按 hash 读取）
+  - 压实（默认关闭）：compact_raw_after_days > 0 时，更早的 JSONL gzip 移到 paths.archive
+          （帖子文件先导入，归档校验行数一致后才删原文件）
+  - 同一内容后续抓取带来新评论时覆盖旧快照
+"""
+
+import gzip
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+_LEVELS = {
+    "zstd": {"hot": 3, "warm": 19, "archive": 19},
+    "zlib": {"hot": 6, "warm": 9, "archive": 9},
+}
+_ZLIB_DICT_MAX = 32 * 1024  # deflate 窗口只用得到字典最后 32KB
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS content (
+        hash TEXT PRIMARY KEY,
+        post_id TEXT,
+        codec TEXT NOT NULL,
+        dict_id INTEGER,
+        tier TEXT NOT NULL DEFAULT 'hot',
+        raw_size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        created_at TEXT DEFAULT (datetime('now'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_content_tier ON content(tier, created_at);
+    CREATE INDEX IF NOT EXISTS idx_content_post ON content(post_id);
+    CREATE TABLE IF NOT EXISTS dictionaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codec TEXT NOT NULL,
+        data BLOB NOT NULL,
+        samples INTEGER DEFAULT 0,
+        trained_at_rowid INTEGER DEFAULT 0,   -- 训练时 content 的最大 rowid，之后的新条目计入重训阈值
+        created_at TEXT DEFAULT (datetime('now'))
+    );
+"""
+
+
+class ContentStore:
+    """压缩内容库（线程安全：单连接 + 锁）"""
+
+    def __init__(self, path: Path, archive_path: Path = None, settings: dict = None):
+        settings = settings or {}
+        self.path = Path(path)
+        self.archive_path = Path(archive_path) if archive_path else None
+        self.codec = "zstd" if zstandard is not None and settings.get("codec", "zstd") == "zstd" else "zlib"
+        self.hot_days = settings.get("hot_days", 7)
+        self.archive_days = settings.get("archive_days", 90)
+        self.dict_size = settings.get("dict_size", 64 * 1024)
+        self.dict_samples = settings.get("dict_samples", 2000)
+        self.retrain_every = settings.get("retrain_every", 5000)
+        self._lock = threading.Lock()
+        self._dicts: dict[int, bytes] = {}
+        self._zstd_ctx: dict[tuple, object] = {}  # (方向, level, dict_id) → 压缩/解压上下文
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = self._open(self.path)
+        self._archive_conn = None
+        self._dict_id = self._latest_dict_id()
+
+    def _open(self, path: Path) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(path), check_same_thread=False)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # 仅新建库生效：归档移走后可回收空间
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _archive(self) -> sqlite3.Connection | None:
+        if self.archive_path is None:
+            return None
+        if self._archive_conn is None:
+            self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+            self._archive_conn = self._open(self.archive_path)
+        return self._archive_conn
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            if self._archive_conn is not None:
+                self._archive_conn.close()
+                self._archive_conn = None
+
+    # ---- 字典 ----
+
+    def _latest_dict_id(self) -> int | None:
+        row = self._conn.execute(
+            "SELECT MAX(id) FROM dictionaries WHERE codec = ?", (self.codec,)
+        ).fetchone()
+        return row[0]
+
+    def _dict(self, dict_id: int | None) -> bytes | None:
+        if dict_id is None:
+            return None
+        if dict_id not in self._dicts:
+            row = self._conn.execute("SELECT data FROM dictionaries WHERE id = ?", (dict_id,)).fetchone()
+            if row is None and self._archive() is not None:
+                row = self._archive().execute("SELECT data FROM dictionaries WHERE id = ?", (dict_id,)).fetchone()
+            self._dicts[dict_id] = row[0] if row else None
+        return self._dicts[dict_id]
+
+    def train_dictionary(self) -> int | None:
+        """用最近入库的内容训练压缩字典，之后写入/重压的条目使用新字典"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT codec, dict_id, data FROM content ORDER BY created_at DESC LIMIT ?",
+                (self.dict_samples,),
+            ).fetchall()
+            samples = [self._decompress(codec, dict_id, data) for codec, dict_id, data in rows]
+            if len(samples) < 20:
+                return self._dict_id
+            if self.codec == "zstd":
+                try:
+                    data = zstandard.train_dictionary(self.dict_size, samples).as_bytes()
+                except zstandard.ZstdError as e:
+                    print(f"  [!] zstd 字典训练失败: {e}")
+                    return self._dict_id
+            else:
+                # zlib 预置字典：常见片段放在末尾（离待压数据最近，引用距离最短）
+                data = b"".join(reversed(samples))[-_ZLIB_DICT_MAX:]
+            cur = self._conn.execute(
+                """INSERT INTO dictionaries (codec, data, samples, trained_at_rowid)
+                   VALUES (?, ?, ?, (SELECT COALESCE(MAX(rowid), 0) FROM content))""",
+                (self.codec, data, len(samples)),
+            )
+            self._conn.commit()
+            self._dict_id = cur.lastrowid
+            self._dicts[self._dict_id] = data
+            return self._dict_id
+
+    # ---- 压缩 ----
+
+    def _compress(self, raw: bytes, tier: str) -> bytes:
+        level = _LEVELS[self.codec][tier]
+        zdict = self._dict(self._dict_id)
+        if self.codec == "zstd":
+            key = ("c", level, self._dict_id)
+            if key not in self._zstd_ctx:
+                cdict = zstandard.ZstdCompressionDict(zdict) if zdict else None
+                self._zstd_ctx[key] = zstandard.ZstdCompressor(level=level, dict_data=cdict)
+            return self._zstd_ctx[key].compress(raw)
+        if zdict:
+            c = zlib.compressobj(level, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+        else:
+            c = zlib.compressobj(level)
+        return c.compress(raw) + c.flush()
+
+    def _decompress(self, codec: str, dict_id: int | None, data: bytes) -> bytes:
+        zdict = self._dict(dict_id)
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("内容以 zstd 压缩，需要安装 zstandard")
+            key = ("d", 0, dict_id)
+            if key not in self._zstd_ctx:
+                cdict = zstandard.ZstdCompressionDict(zdict) if zdict else None
+                self._zstd_ctx[key] = zstandard.ZstdDecompressor(dict_data=cdict)
+            return self._zstd_ctx[key].decompress(data)
+        d = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+        return d.decompress(data) + d.flush()
+
+    # ---- 读写 ----
+
+    def put_many(self, posts: list[dict]) -> int:
+        """写入帖子（按 content_hash 去重），返回新写入或更新的条数
+
+        已存在的 hash 只在带来了不同的非空评论时覆盖（评论随后续抓取刷新）；
+        既无正文也无标题的记录不是帖子，跳过。
+        """
+        from src.utils.db import content_hash
+        items = {}
+        for post in posts:
+            text = post.get("content", "") or post.get("title", "")
+            if not text:
+                continue
+            h = content_hash(text)
+            if h not in items or post.get("comments"):
+                items[h] = post  # 同批同内容取最后一条带评论的
+        if not items:
+            return 0
+        with self._lock:
+            known = {}
+            hashes = list(items)
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                known.update((r[0], r[1:]) for r in self._conn.execute(
+                    f"SELECT hash, codec, dict_id, data FROM content WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk))
+            rows, updates = [], []
+            for h, post in items.items():
+                if h in known:
+                    comments = post.get("comments")
+                    if not comments or json.loads(self._decompress(*known[h])).get("comments") == comments:
+                        continue
+                raw = json.dumps(post, ensure_ascii=False).encode("utf-8")
+                data = self._compress(raw, "hot")
+                row = (h, post.get("id", ""), self.codec, self._dict_id, len(raw), len(data), data)
+                (updates if h in known else rows).append(row)
+            self._conn.executemany(
+                """INSERT OR IGNORE INTO content (hash, post_id, codec, dict_id, raw_size, stored_size, data)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+            # 以 hot 级别重压；created_at 不变，下次 retier 按原时间迁层
+            self._conn.executemany(
+                """UPDATE content SET post_id = ?, codec = ?, dict_id = ?, tier = 'hot',
+                       raw_size = ?, stored_size = ?, data = ? WHERE hash = ?""",
+                [(*row[1:], row[0]) for row in updates],
+            )
+            self._conn.commit()
+            pending = self._conn.execute(
+                """SELECT COUNT(*) FROM content WHERE rowid > COALESCE(
+                       (SELECT trained_at_rowid FROM dictionaries WHERE id = ?), 0)""",
+                (self._dict_id,),
+            ).fetchone()[0] if rows else 0
+        # 首个字典在攒够 dict_samples 条后训练，之后每新增 retrain_every 条重训
+        threshold = self.dict_samples if self._dict_id is None else self.retrain_every
+        if rows and pending >= threshold:
+            self.train_dictionary()
+        return len(rows) + len(updates)
+
+    def get(self, content_hash: str) -> dict | None:
+        """按 content_hash 随机读取一条帖子（含已归档的）"""
+        return self.get_many([content_hash]).get(content_hash)
+
+    def get_many(self, hashes: list[str]) -> dict[str, dict]:
+        result = {}
+        with self._lock:
+            for conn in (self._conn, self._archive()):
+                missing = [h for h in hashes if h not in result]
+                if conn is None or not missing:
+                    continue
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    for h, codec, dict_id, data in conn.execute(
+                        f"SELECT hash, codec, dict_id, data FROM content WHERE hash IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ):
+                        result[h] = json.loads(self._decompress(codec, dict_id, data))
+        return result
+
+    def load_posts(self, post_ids: list[str]) -> dict[str, dict]:
+        """按帖子 id 取完整内容（经主库 posts.content_hash 定位）"""
+        from src.utils.db import get_db
+        hash_of = {}
+        with get_db(readonly=True) as conn:
+            for i in range(0, len(post_ids), 500):
+                chunk = post_ids[i:i + 500]
+                hash_of.update(conn.execute(
+                    f"SELECT id, content_hash FROM posts WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        by_hash = self.get_many(list(set(hash_of.values())))
+        return {pid: by_hash[h] for pid, h in hash_of.items() if h in by_hash}
+
+    # ---- 分层 / 压实 ----
+
+    def retier(self, now: datetime = None) -> dict:
+        """hot → warm（高级别 + 最新字典重压），warm → archive（移入归档库）"""
+        # created_at 为 SQLite datetime('now')，即 UTC
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        warm_before = (now - timedelta(days=self.hot_days)).strftime("%Y-%m-%d %H:%M:%S")
+        archive_before = (now - timedelta(days=self.archive_days)).strftime("%Y-%m-%d %H:%M:%S")
+        moved = {"warm": 0, "archive": 0}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hash, codec, dict_id, data FROM content WHERE tier = 'hot' AND created_at < ?",
+                (warm_before,),
+            ).fetchall()
+            updates = []
+            for h, codec, dict_id, data in rows:
+                data = self._compress(self._decompress(codec, dict_id, data), "warm")
+                updates.append((self.codec, self._dict_id, len(data), data, h))
+            self._conn.executemany(
+                """UPDATE content SET codec = ?, dict_id = ?, tier = 'warm', stored_size = ?, data = ?
+                   WHERE hash = ?""",
+                updates,
+            )
+            moved["warm"] = len(updates)
+
+            archive = self._archive()
+            if archive is not None:
+                rows = self._conn.execute(
+                    """SELECT hash, post_id, codec, dict_id, raw_size, stored_size, data, created_at
+                       FROM content WHERE tier != 'hot' AND created_at < ?""",
+                    (archive_before,),
+                ).fetchall()
+                if rows:
+                    # 归档库需要能独立解压：带上用到的字典
+                    for dict_id in {r[3] for r in rows if r[3] is not None}:
+                        codec, zdict = self._conn.execute(
+                            "SELECT codec, data FROM dictionaries WHERE id = ?", (dict_id,)
+                        ).fetchone()
+                        archive.execute(
+                            "INSERT OR IGNORE INTO dictionaries (id, codec, data) VALUES (?, ?, ?)",
+                            (dict_id, codec, zdict),
+                        )
+                    archive.executemany(
+                        """INSERT OR IGNORE INTO content
+                           (hash, post_id, codec, dict_id, tier, raw_size, stored_size, data, created_at)
+                           VALUES (?, ?, ?, ?, 'archive', ?, ?, ?, ?)""",
+                        rows,
+                    )
+                    archive.commit()
+                    self._conn.executemany("DELETE FROM content WHERE hash = ?", [(r[0],) for r in rows])
+                moved["archive"] = len(rows)
+            self._conn.commit()
+            if moved["archive"]:
+                self._conn.execute("PRAGMA incremental_vacuum")
+        return moved
+
+    def compact_jsonl(self, directories: list[Path], archive_dir: Path, older_than_days: int = 0,
+                      today: datetime = None) -> dict:
+        """把超过 N 天的 JSONL 原文件 gzip 后移到 archive_dir/<目录名>/（N <= 0 时不做任何事）
+
+        只有帖子文件（data/raw/<来源>/YYYY-MM-DD.jsonl、cleaned_YYYY-MM-DD.jsonl）先导入内容库；
+        痛点 / 隐藏需求 / 审核结果等其余文件只归档，不当作帖子读取。
+        归档写完后重新打开核对行数，一致才删除原文件。
+        """
+        files = bytes_before = bytes_after = 0
+        if older_than_days <= 0:
+            return {"files": files, "bytes_before": bytes_before, "bytes_after": bytes_after}
+        today = today or datetime.now()
+        cutoff = (today - timedelta(days=older_than_days)).strftime("%Y-%m-%d")
+        for directory in directories:
+            for path in sorted(Path(directory).glob("*.jsonl")):
+                # 文件名形如 2026-02-01.jsonl / cleaned_2026-02-01.jsonl
+                prefix, _, date_part = path.stem.rpartition("_")
+                if len(date_part) != 10 or date_part >= cutoff:
+                    continue
+                if prefix in ("", "cleaned"):
+                    posts = []
+                    with open(path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                posts.append(json.loads(line))
+                            except ValueError:
+                                continue
+                    self.put_many(posts)
+                dest_dir = Path(archive_dir) / Path(directory).name
+                dest_dir.mkdir(parents=True, exist_ok=True)
+                dest = dest_dir / f"{path.name}.gz"
+                archived = _gzip_lines(dest) if dest.exists() else 0
+                if archived is None:
+                    print(f"  [!] 已有归档损坏，保留原文件: {path}")
+                    continue
+                with open(path, "rb") as src, gzip.open(dest, "ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                with open(path, "rb") as src:
+                    expected = sum(1 for _ in src)
+                if _gzip_lines(dest) != archived + expected:
+                    print(f"  [!] 归档校验失败，保留原文件: {path}")
+                    continue
+                bytes_before += path.stat().st_size
+                bytes_after += dest.stat().st_size
+                path.unlink()
+                files += 1
+        return {"files": files, "bytes_before": bytes_before, "bytes_after": bytes_after}
+
+    def stats(self) -> dict:
+        """各层条数、原始/压缩字节数与压缩率"""
+        tiers = {}
+        with self._lock:
+            for conn in (self._conn, self._archive()):
+                if conn is None:
+                    continue
+                for tier, n, raw, stored in conn.execute(
+                    "SELECT tier, COUNT(*), SUM(raw_size), SUM(stored_size) FROM content GROUP BY tier"
+                ):
+                    t = tiers.setdefault(tier, {"items": 0, "raw_bytes": 0, "stored_bytes": 0})
+                    t["items"] += n
+                    t["raw_bytes"] += raw or 0
+                    t["stored_bytes"] += stored or 0
+        raw = sum(t["raw_bytes"] for t in tiers.values())
+        stored = sum(t["stored_bytes"] for t in tiers.values())
+        for t in tiers.values():
+            t["ratio"] = round(t["raw_bytes"] / t["stored_bytes"], 2) if t["stored_bytes"] else 0
+        return {"codec": self.codec, "dict_id": self._dict_id, "tiers": tiers,
+                "raw_bytes": raw, "stored_bytes": stored,
+                "ratio": round(raw / stored, 2) if stored else 0}
+
+
+def _gzip_lines(path: Path) -> int | None:
+    """gzip 文件的行数（支持追加写入的多段 gzip），损坏时返回 None"""
+    try:
+        with gzip.open(path, "rb") as f:
+            return sum(1 for _ in f)
+    except (OSError, EOFError):
+        return None
+
+
+_STORE: ContentStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def configure_content_store(config: dict) -> ContentStore | None:
+    """按 config.content_store 创建进程级内容库（enabled=false 时不启用）"""
+    global _STORE
+    settings = config.get("content_store", {})
+    if not settings.get("enabled", False):
+        return None
+    paths = config.get("paths", {})
+    with _STORE_LOCK:
+        if _STORE is None:
+            archive_dir = Path(paths.get("archive", "data/archive"))
+            _STORE = ContentStore(Path(settings.get("path", "data/content.db")),
+                                  archive_dir / "content_archive.db", settings)
+        return _STORE
+
+
+def get_content_store() -> ContentStore | None:
+    return _STORE
+
+
+def run_maintenance(config: dict) -> dict | None:
+    """压实旧 JSONL + 分层迁移，打印压缩率（main 每轮结束后在后台线程调用）"""
+    store = configure_content_store(config)
+    if store is None:
+        return None
+    settings = config.get("content_store", {})
+    paths = config.get("paths", {})
+    t0 = time.time()
+    raw_root = Path(paths.get("raw_data", "data/raw"))
+    directories = [d for d in raw_root.iterdir() if d.is_dir()] if raw_root.exists() else []
+    directories.append(Path(paths.get("processed_data", "data/processed")))
+    compacted = store.compact_jsonl(directories, Path(paths.get("archive", "data/archive")),
+                                    settings.get("compact_raw_after_days", 0))
+    moved = store.retier()
+    stats = store.stats()
+    print(f"  [内容库] 压实 JSONL {compacted['files']} 个 "
+          f"({compacted['bytes_before'] / 1024:.0f}KB → {compacted['bytes_after'] / 1024:.0f}KB) | "
+          f"转 warm {moved['warm']} / archive {moved['archive']} | "
+          f"{stats['codec']} 压缩率 {stats['ratio']}x ({time.time() - t0:.1f}s)")
+    return {"compacted": compacted, "moved": moved, "stats": stats}
+
+
+def start_background_maintenance(config: dict) -> threading.Thread | None:
+    """后台执行 run_maintenance（非 daemon：进程退出前会等它完成，cycle 模式下与 sleep 重叠）"""
+    if not config.get("content_store", {}).get("enabled", False):
+        return None
+
+    def _run():
+        try:
+            run_maintenance(config)
+        except Exception as e:
+            print(f"  [!] 内容库维护失败: {e}")
+
+    thread = threading.Thread(target=_run, name="content-maintenance")
+    thread.start()
+    return thread
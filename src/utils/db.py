@@ -2,6 +2,8 @@
 
 import sqlite3
 import json
+import threading
+import time
 import hashlib
 from contextlib import contextmanager
 from datetime import datetime
@@ -11,136 +13,286 @@ DB_PATH = Path("data/gpu_insight.db")
 
 # 标记是否已初始化（进程级单例）
 _initialized = False
+_fts_available = False
+
+# 连接级 PRAGMA（configure_db 可覆盖；journal_mode=WAL 是库级持久设置，只在 init_db 设一次）
+_DEFAULT_PRAGMAS = {
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",    # WAL 下 NORMAL 不会损坏库，只可能丢最后一次提交
+    "temp_store": "MEMORY",
+    "cache_size": -16000,       # 负数单位 KiB，即 16MB 页缓存
+    "mmap_size": 268435456,     # 256MB 内存映射读
+}
+_pragmas = dict(_DEFAULT_PRAGMAS)
+_STATEMENT_CACHE = 256
+
+# 每个线程复用一条读写连接 + 一条只读连接（sqlite3 连接不能跨线程共享）
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"connections_opened": 0, "queries": 0, "transactions": 0}
+
+
+def configure_db(settings: dict | None):
+    """按 config.yaml 的 database 段调整连接参数（需在首次 get_db 前调用）"""
+    global _STATEMENT_CACHE
+    settings = dict(settings or {})
+    _STATEMENT_CACHE = int(settings.pop("cached_statements", _STATEMENT_CACHE))
+    for key, value in settings.items():
+        if key in _DEFAULT_PRAGMAS:
+            _pragmas[key] = value
+    close_db()
 
 
 def init_db():
-    """进程启动时调用一次 — 建表 + 迁移。后续 get_db() 不再重复执行。"""
-    global _initialized
+    """进程启动时调用一次 — 按 user_version 执行 schema 迁移（见 migrations.py）。后续 get_db() 不再重复执行。"""
+    global _initialized, _fts_available
     if _initialized:
         return
+    from src.utils.migrations import migrate
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA busy_timeout=5000")
-    _init_tables(conn)
-    conn.close()
+    conn = sqlite3.connect(str(DB_PATH), isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        migrate(conn)
+        _fts_available = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+        ).fetchone() is not None
+    finally:
+        conn.close()
     _initialized = True
 
 
+def _count_query(_statement):
+    with _stats_lock:
+        _stats["queries"] += 1
+
+
+def _open_connection(path: str, readonly: bool) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True,
+                               cached_statements=_STATEMENT_CACHE)
+    else:
+        conn = sqlite3.connect(path, cached_statements=_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    for key, value in _pragmas.items():
+        conn.execute(f"PRAGMA {key}={value}")
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+    conn.set_trace_callback(_count_query)
+    with _stats_lock:
+        _stats["connections_opened"] += 1
+    return conn
+
+
 @contextmanager
-def get_db() -> sqlite3.Connection:
-    """获取数据库连接（context manager，自动关闭）"""
+def get_db(readonly: bool = False) -> sqlite3.Connection:
+    """获取当前线程复用的数据库连接（context manager）
+
+    嵌套调用共享同一连接和事务，只有最外层退出时提交（异常则回滚）。
+    readonly=True 返回只读连接（Web 端查询用），不参与写事务。
+    """
     global _initialized
     if not _initialized:
         init_db()
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA busy_timeout=5000")
+    path = str(DB_PATH)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    slot = conns.get(readonly)
+    # DB_PATH 被替换（测试用临时库）时换新连接
+    if slot is None or slot["path"] != path:
+        if slot is not None and slot["depth"] == 0:
+            slot["conn"].close()
+        slot = conns[readonly] = {"conn": _open_connection(path, readonly), "path": path, "depth": 0}
+
+    conn = slot["conn"]
+    slot["depth"] += 1
     try:
         yield conn
-        conn.commit()
+        if slot["depth"] == 1 and conn.in_transaction:
+            conn.commit()
+            with _stats_lock:
+                _stats["transactions"] += 1
     except Exception:
-        conn.rollback()
+        if slot["depth"] == 1:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        slot["depth"] -= 1
 
 
-def _init_tables(conn: sqlite3.Connection):
-    """初始化表结构"""
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS posts (
-            id TEXT PRIMARY KEY,
-            source TEXT NOT NULL,
-            content_hash TEXT NOT NULL,
-            title TEXT,
-            url TEXT,
-            replies INTEGER DEFAULT 0,
-            likes INTEGER DEFAULT 0,
-            gpu_tags TEXT,
-            timestamp TEXT,
-            created_at TEXT DEFAULT (datetime('now'))
-        );
-        CREATE INDEX IF NOT EXISTS idx_posts_hash ON posts(content_hash);
-        CREATE INDEX IF NOT EXISTS idx_posts_source ON posts(source);
-
-        CREATE TABLE IF NOT EXISTS pain_points (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            run_date TEXT NOT NULL,
-            pain_point TEXT NOT NULL,
-            category TEXT,
-            mentions INTEGER DEFAULT 0,
-            sources TEXT,
-            gpu_tags TEXT,
-            source_urls TEXT,
-            evidence TEXT,
-            hidden_need TEXT,
-            confidence REAL DEFAULT 0,
-            pphi_score REAL DEFAULT 0,
-            total_replies INTEGER DEFAULT 0,
-            total_likes INTEGER DEFAULT 0,
-            earliest_timestamp TEXT,
-            created_at TEXT DEFAULT (datetime('now'))
-        );
-        CREATE INDEX IF NOT EXISTS idx_pp_date ON pain_points(run_date);
-
-        CREATE TABLE IF NOT EXISTS pphi_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            run_date TEXT NOT NULL,
-            rank INTEGER NOT NULL,
-            pain_point TEXT NOT NULL,
-            pphi_score REAL NOT NULL,
-            mentions INTEGER DEFAULT 0,
-            gpu_tags TEXT,
-            source_urls TEXT,
-            hidden_need TEXT,
-            created_at TEXT DEFAULT (datetime('now'))
-        );
-        CREATE INDEX IF NOT EXISTS idx_pphi_date ON pphi_history(run_date);
-        CREATE INDEX IF NOT EXISTS idx_pphi_date_pain ON pphi_history(run_date, pain_point);
-
-        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
-            source TEXT PRIMARY KEY,
-            last_scrape_at TEXT NOT NULL,
-            last_post_count INTEGER DEFAULT 0,
-            total_scraped INTEGER DEFAULT 0
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_posts_url ON posts(url);
-    """)
-    conn.commit()
-
-    # 迁移：为旧表添加新列（如果不存在）
-    _migrate_tables(conn)
-
-
-def _migrate_tables(conn: sqlite3.Connection):
-    """增量迁移：安全添加新列"""
-    migrations = [
-        ("pain_points", "total_replies", "INTEGER DEFAULT 0"),
-        ("pain_points", "total_likes", "INTEGER DEFAULT 0"),
-        ("pain_points", "earliest_timestamp", "TEXT"),
-        ("pphi_history", "total_replies", "INTEGER DEFAULT 0"),
-        ("pphi_history", "total_likes", "INTEGER DEFAULT 0"),
-        ("pphi_history", "inferred_need_json", "TEXT"),  # v9.5: 完整推理对象（reasoning_chain + munger_review）
-        ("pphi_history", "category", "TEXT"),  # v9.5: 痛点分类
-        ("pphi_history", "affected_users", "TEXT"),  # v9.5: 影响范围
-        ("posts", "comments", "TEXT"),
-        # v9: AI 相关性过滤结果
-        ("posts", "relevance_class", "INTEGER DEFAULT -1"),
-        ("posts", "relevance_reason", "TEXT"),
-        # v9.9: 数据质量分层
-        ("pphi_history", "quality_tier", "TEXT DEFAULT 'bronze'"),
-        # v1.2: 证据字段
-        ("pphi_history", "evidence", "TEXT"),
-    ]
-    for table, column, col_type in migrations:
-        try:
-            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
-            conn.commit()
-        except sqlite3.OperationalError:
-            pass  # 列已存在
+def close_db():
+    """关闭当前线程缓存的连接（配置变更或线程结束前调用）"""
+    conns = getattr(_local, "conns", None) or {}
+    for slot in conns.values():
+        if slot["depth"] == 0:
+            slot["conn"].close()
+    _local.conns = {}
+
+
+def get_db_stats() -> dict:
+    """进程级连接/查询计数"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+_TAG_KINDS = ("brands", "models", "series", "manufacturers")
+
+
+def _tag_rows(owner_id, gpu_tags: dict, *extra) -> list[tuple]:
+    """{"models": [...], ...} → [(owner_id, *extra, kind, value), ...]"""
+    if not isinstance(gpu_tags, dict):
+        return []
+    return [(owner_id, *extra, kind, value)
+            for kind in _TAG_KINDS for value in set(gpu_tags.get(kind) or []) if value]
+
+
+def _resolve_post_links(conn: sqlite3.Connection, urls: list[str],
+                        post_ids: list[str] = ()) -> list[tuple]:
+    """把痛点的 source_urls / source_post_ids 解析为 [(seq, url, post_id, source)]
+
+    URL 按 posts.url 精确匹配（idx_posts_url）；source_post_ids 中未被 URL 覆盖的帖子追加在后面。
+    """
+    urls = [u for u in dict.fromkeys(urls or []) if u]
+    by_url, by_id = {}, {}
+    for chunk in _chunks(urls):
+        for r in conn.execute(
+            f"SELECT id, url, source FROM posts WHERE url IN ({','.join('?' * len(chunk))})", chunk
+        ):
+            by_url.setdefault(r[1], (r[0], r[2]))
+    extra_ids = [pid for pid in dict.fromkeys(post_ids or []) if pid]
+    for chunk in _chunks(extra_ids):
+        for r in conn.execute(
+            f"SELECT id, url, source FROM posts WHERE id IN ({','.join('?' * len(chunk))})", chunk
+        ):
+            by_id[r[0]] = (r[1], r[2])
+
+    links = []
+    linked_ids = set()
+    for url in urls:
+        pid, source = by_url.get(url, (None, None))
+        links.append((len(links), url, pid, source))
+        linked_ids.add(pid)
+    for pid in extra_ids:
+        if pid in linked_ids:
+            continue
+        url, source = by_id.get(pid, (None, pid.split("_")[0] if "_" in pid else None))
+        links.append((len(links), url, pid, source))
+    return links
+
+
+def rebuild_summary_tables(conn: sqlite3.Connection):
+    """从 posts / pphi_history 全量重算汇总表（迁移时回填，或怀疑计数漂移时手动修复）"""
+    for sql in (
+        "DELETE FROM source_stats",
+        "DELETE FROM run_summary",
+        "DELETE FROM pain_point_stats",
+        """INSERT INTO source_stats
+           SELECT source, COALESCE(relevance_class, -1), COUNT(*) FROM posts
+           GROUP BY source, COALESCE(relevance_class, -1)""",
+        """INSERT INTO run_summary
+           SELECT run_date, COUNT(*), MAX(pphi_score),
+                  SUM(COALESCE(hidden_need, '') != ''),
+                  (SELECT GROUP_CONCAT(pain_point) FROM (
+                       SELECT pain_point FROM pphi_history t
+                       WHERE t.run_date = h.run_date AND t.rank <= 8 ORDER BY t.rank))
+           FROM pphi_history h GROUP BY run_date""",
+        "INSERT INTO pain_point_stats SELECT pain_point, COUNT(*) FROM pphi_history GROUP BY pain_point",
+        "UPDATE summary_counters SET value = (SELECT COUNT(*) FROM run_summary) WHERE name = 'runs'",
+        "UPDATE summary_counters SET value = (SELECT COUNT(*) FROM pain_point_stats) WHERE name = 'pains'",
+    ):
+        conn.execute(sql)
+
+
+def get_summary_stats() -> dict:
+    """看板累计统计（只读汇总表，与历史数据量无关）"""
+    with get_db(readonly=True) as conn:
+        counters = {r["name"]: r["value"] for r in conn.execute("SELECT name, value FROM summary_counters")}
+        by_source, relevance = {}, {}
+        for r in conn.execute("SELECT source, relevance_class, posts FROM source_stats WHERE posts > 0"):
+            by_source[r["source"]] = by_source.get(r["source"], 0) + r["posts"]
+            relevance[r["relevance_class"]] = relevance.get(r["relevance_class"], 0) + r["posts"]
+    return {
+        "total_posts": sum(by_source.values()),
+        "total_runs": counters.get("runs", 0),
+        "total_pains": counters.get("pains", 0),
+        "total_sources": len(by_source),
+        "by_source": by_source,
+        "judged": sum(v for k, v in relevance.items() if k >= 0),
+        "kept": sum(v for k, v in relevance.items() if k > 0),
+        "dropped": relevance.get(0, 0),
+    }
+
+
+def get_run_summaries(limit: int = None) -> list[dict]:
+    """各轮汇总（新 → 旧）：run_date, pain_count, top_pphi, needs_count, top_pains"""
+    sql = "SELECT * FROM run_summary ORDER BY run_date DESC"
+    params = ()
+    if limit:
+        sql += " LIMIT ?"
+        params = (limit,)
+    with get_db(readonly=True) as conn:
+        return [dict(r) for r in conn.execute(sql, params)]
+
+
+def _sync_fts(conn: sqlite3.Connection, posts: list[dict]):
+    """save_posts 同一事务内刷新这批帖子的索引行（评论取库里合并后的值）
+
+    posts 表不存正文：本次未带正文的帖子（如 NGA 非热帖）沿用索引里已有的正文。
+    """
+    if not _fts_available:
+        return
+    by_id = {p.get("id", ""): p for p in posts}
+    rows = []
+    for chunk in _chunks(list(by_id)):
+        rows.extend(conn.execute(
+            f"SELECT rowid, id, title, comments FROM posts WHERE id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ).fetchall())
+    kept = {}
+    for chunk in _chunks([r[0] for r in rows if not by_id[r[1]].get("content")]):
+        kept.update(conn.execute(
+            f"SELECT rowid, content FROM posts_fts WHERE rowid IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ).fetchall())
+    for chunk in _chunks([r[0] for r in rows]):
+        conn.execute(f"DELETE FROM posts_fts WHERE rowid IN ({','.join('?' * len(chunk))})", chunk)
+    conn.executemany(
+        "INSERT INTO posts_fts (rowid, title, content, comments) VALUES (?, ?, ?, ?)",
+        [(rowid, title or "", by_id[pid].get("content") or kept.get(rowid) or "", comments or "")
+         for rowid, pid, title, comments in rows],
+    )
+
+
+def _loads(text, default):
+    try:
+        return json.loads(text) if text else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _history_link_rows(conn: sqlite3.Connection, history_id: int, run_date: str,
+                       gpu_tags: dict, urls: list[str], post_ids: list[str] = ()) -> tuple[list, list]:
+    """一条 pphi_history 的 (history_gpu_tags 行, history_posts 行)"""
+    return (_tag_rows(history_id, gpu_tags, run_date),
+            [(history_id, run_date, *link) for link in _resolve_post_links(conn, urls, post_ids)])
+
+
+def _insert_history_links(conn: sqlite3.Connection, history_id: int, run_date: str,
+                          gpu_tags: dict, urls: list[str], post_ids: list[str] = ()):
+    tag_rows, post_rows = _history_link_rows(conn, history_id, run_date, gpu_tags, urls, post_ids)
+    conn.executemany("INSERT OR IGNORE INTO history_gpu_tags VALUES (?, ?, ?, ?)", tag_rows)
+    conn.executemany("INSERT OR IGNORE INTO history_posts VALUES (?, ?, ?, ?, ?, ?)", post_rows)
+
+
+def _inserted_ids(conn: sqlite3.Connection, table: str, n: int) -> list[int]:
+    """本事务内 executemany 刚插入的 n 行自增 id（按插入顺序）
+
+    写事务持有写锁，期间没有其他连接插入，最新的 n 个 id 即本批。
+    """
+    rows = conn.execute(f"SELECT id FROM {table} ORDER BY id DESC LIMIT ?", (n,)).fetchall()
+    return [r[0] for r in reversed(rows)]
 
 
 def content_hash(text: str) -> str:
@@ -148,67 +300,286 @@ def content_hash(text: str) -> str:
     return hashlib.md5(text.encode("utf-8")).hexdigest()
 
 
+# IN 列表每批参数个数（远低于 SQLITE_MAX_VARIABLE_NUMBER）
+_IN_CHUNK = 500
+
+
+def _chunks(items: list, size: int = _IN_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _existing_values(conn: sqlite3.Connection, column: str, values: set) -> set:
+    """分块 IN 查询：返回 posts.<column> 中已存在的值（走 id 主键 / idx_posts_hash 索引）"""
+    found = set()
+    for chunk in _chunks(list(values)):
+        rows = conn.execute(
+            f"SELECT {column} FROM posts WHERE {column} IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        found.update(r[0] for r in rows)
+    return found
+
+
 def filter_new_posts(posts: list[dict]) -> list[dict]:
-    """过滤已入库的帖子，只返回新帖子（持久化去重）"""
+    """过滤已入库的帖子，只返回新帖子（持久化去重）
+
+    id 与内容哈希各做一次分块 IN 查询，代替逐条 "id = ? OR content_hash = ?"。
+    """
     if not posts:
         return []
 
-    with get_db() as conn:
-        new_posts = []
-        for post in posts:
-            post_id = post.get("id", "")
-            text = post.get("content", "") or post.get("title", "")
-            h = content_hash(text)
+    t0 = time.perf_counter()
+    keyed = []
+    for post in posts:
+        text = post.get("content", "") or post.get("title", "")
+        keyed.append((post, post.get("id", ""), content_hash(text)))
 
-            row = conn.execute(
-                "SELECT id FROM posts WHERE id = ? OR content_hash = ?",
-                (post_id, h)
-            ).fetchone()
+    with get_db() as conn:
+        known_ids = _existing_values(conn, "id", {pid for _, pid, _ in keyed})
+        known_hashes = _existing_values(conn, "content_hash", {h for _, _, h in keyed})
 
-            if not row:
-                new_posts.append(post)
+    new_posts = [post for post, pid, h in keyed if pid not in known_ids and h not in known_hashes]
 
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    if len(posts) >= 500:
+        print(f"  [DB] 增量过滤 {len(posts)} 条 → 新帖 {len(new_posts)} 条（{elapsed_ms:.1f}ms）")
     return new_posts
 
 
+_UPSERT_POST_SQL = """INSERT INTO posts (id, source, content_hash, title, url, replies, likes, gpu_tags, timestamp, comments, comments_replies, relevance_class, relevance_reason, tag_hash, tag_version)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        replies = MAX(posts.replies, excluded.replies),
+        likes = MAX(posts.likes, excluded.likes),
+        comments = COALESCE(excluded.comments, posts.comments),
+        comments_replies = CASE WHEN excluded.comments IS NOT NULL
+            THEN excluded.comments_replies ELSE posts.comments_replies END,
+        relevance_class = CASE WHEN excluded.relevance_class >= 0 THEN excluded.relevance_class ELSE posts.relevance_class END,
+        relevance_reason = COALESCE(excluded.relevance_reason, posts.relevance_reason)"""
+
+
+def _post_params(post: dict) -> tuple:
+    text = post.get("content", "") or post.get("title", "")
+    comments = post.get("comments") or None
+    return (
+        post.get("id", ""),
+        post.get("source", ""),
+        content_hash(text),
+        post.get("title", ""),
+        post.get("url", ""),
+        post.get("replies", 0),
+        post.get("likes", 0),
+        json.dumps(post.get("_gpu_tags", {}), ensure_ascii=False),
+        post.get("timestamp", ""),
+        comments,
+        post.get("replies", 0) if comments else None,
+        post.get("_relevance_class", -1),
+        post.get("_relevance_reason", ""),
+        post.get("_tag_hash"),
+        post.get("_tag_version"),
+    )
+
+
 def save_posts(posts: list[dict]):
-    """批量保存帖子到数据库（新帖插入，旧帖更新互动数据）"""
+    """批量保存帖子到数据库（新帖插入，旧帖更新互动数据）
+
+    参数先全部序列化，再在同一事务内 executemany。
+    """
     if not posts:
         return
 
+    params = [_post_params(post) for post in posts]
+    with get_db() as conn:
+        # 保存点：回退只撤销本批，不影响外层 get_db() 中尚未提交的写入
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT save_posts")
+        try:
+            conn.executemany(_UPSERT_POST_SQL, params)
+        except sqlite3.IntegrityError:
+            # 个别脏数据时退回逐条写入，跳过出错的行
+            conn.execute("ROLLBACK TO save_posts")
+            for row in params:
+                try:
+                    conn.execute(_UPSERT_POST_SQL, row)
+                except sqlite3.IntegrityError:
+                    pass
+        conn.execute("RELEASE save_posts")
+        tag_rows = [row for p in posts for row in _tag_rows(p.get("id", ""), p.get("_gpu_tags"))]
+        conn.executemany("INSERT OR IGNORE INTO post_gpu_tags VALUES (?, ?, ?)", tag_rows)
+        _sync_fts(conn, posts)
+
+
+def save_post_tags(posts: list[dict]):
+    """GPU 打标后回写 posts.gpu_tags 及 post_gpu_tags（抓取入库时帖子尚未打标）
+
+    库中缓存键 (tag_hash, tag_version) 与帖子一致的行标签未变，跳过。
+    """
+    tagged = [p for p in posts if p.get("id") and "_gpu_tags" in p]
+    if not tagged:
+        return
     with get_db() as conn:
-        for post in posts:
-            text = post.get("content", "") or post.get("title", "")
-            h = content_hash(text)
-            gpu_tags = json.dumps(post.get("_gpu_tags", {}), ensure_ascii=False)
+        stored = _stored_tag_keys(conn, [p["id"] for p in tagged])
+        tagged = [p for p in tagged
+                  if not p.get("_tag_hash")
+                  or stored.get(p["id"]) != (p["_tag_hash"], p.get("_tag_version"))]
+        if not tagged:
+            return
+        conn.executemany(
+            "UPDATE posts SET gpu_tags = ?, tag_hash = ?, tag_version = ? WHERE id = ?",
+            [(json.dumps(p["_gpu_tags"], ensure_ascii=False), p.get("_tag_hash"), p.get("_tag_version"), p["id"])
+             for p in tagged],
+        )
+        for chunk in _chunks([p["id"] for p in tagged]):
+            conn.execute(f"DELETE FROM post_gpu_tags WHERE post_id IN ({','.join('?' * len(chunk))})", chunk)
+        conn.executemany("INSERT OR IGNORE INTO post_gpu_tags VALUES (?, ?, ?)",
+                         [row for p in tagged for row in _tag_rows(p["id"], p["_gpu_tags"])])
+
+
+def _stored_tag_keys(conn: sqlite3.Connection, post_ids: list[str]) -> dict[str, tuple]:
+    """{post_id: (tag_hash, tag_version)}"""
+    keys = {}
+    for chunk in _chunks(list(set(post_ids))):
+        for r in conn.execute(
+            f"SELECT id, tag_hash, tag_version FROM posts WHERE id IN ({','.join('?' * len(chunk))})", chunk
+        ):
+            keys[r[0]] = (r[1], r[2])
+    return keys
+
+
+def get_stored_tags(post_ids: list[str], version: str) -> dict[str, tuple[str, dict]]:
+    """库中按 version 打过标的帖子：{post_id: (tag_hash, gpu_tags)}"""
+    found = {}
+    with get_db(readonly=True) as conn:
+        for chunk in _chunks(list(set(post_ids))):
+            for r in conn.execute(
+                f"""SELECT id, tag_hash, gpu_tags FROM posts
+                    WHERE id IN ({','.join('?' * len(chunk))}) AND tag_version = ?""",
+                (*chunk, version),
+            ):
+                found[r[0]] = (r[1], _loads(r[2], {}))
+    return found
+
+
+def get_model_mentions(limit: int = 10) -> list[tuple[str, int]]:
+    """提及帖子数最多的型号（model_mentions 汇总表）"""
+    with get_db(readonly=True) as conn:
+        return [(r[0], r[1]) for r in conn.execute(
+            "SELECT model, posts FROM model_mentions ORDER BY posts DESC, model LIMIT ?", (limit,)
+        )]
+
+
+def get_posts_by_model(model: str, source: str = None, limit: int = 50) -> list[dict]:
+    """某个 GPU 型号的相关帖子（post_gpu_tags 索引查询），按回复数降序"""
+    sql = """SELECT p.id, p.source, p.title, p.url, p.replies, p.likes, p.timestamp
+             FROM post_gpu_tags t JOIN posts p ON p.id = t.post_id
+             WHERE t.kind = 'models' AND t.value = ?"""
+    params = [model]
+    if source:
+        sql += " AND p.source = ?"
+        params.append(source)
+    sql += " ORDER BY p.replies DESC LIMIT ?"
+    params.append(limit)
+    with get_db(readonly=True) as conn:
+        return [dict(r) for r in conn.execute(sql, params)]
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_posts(query: str, source: str = None, since: str = None, until: str = None,
+                 model: str = None, limit: int = 20) -> list[dict]:
+    """全文检索帖子（标题 / 正文 / 评论），按 bm25 相关度排序
+
+    空格分隔的词之间为 AND。trigram 至少需要 3 个字符，
+    更短的词（如“显卡”）退化为 LIKE 子串匹配，此时按回复数排序。
+
+    Returns:
+        [{id, source, title, url, replies, likes, timestamp, title_hl, snippet}, ...]
+    """
+    if not _fts_available:
+        init_db()
+        if not _fts_available:
+            raise RuntimeError("全文索引不可用（SQLite 缺少 FTS5 trigram）")
+    terms = [t for t in (query or "").split() if t]
+    if not terms:
+        return []
+    long_terms = [t for t in terms if len(t) >= 3]
+    short_terms = [t for t in terms if len(t) < 3]
+
+    where, params = [], []
+    if long_terms:
+        where.append("posts_fts MATCH ?")
+        params.append(" AND ".join(_fts_phrase(t) for t in long_terms))
+    for t in short_terms:
+        where.append("(posts_fts.title LIKE ? OR posts_fts.content LIKE ? OR posts_fts.comments LIKE ?)")
+        params.extend([f"%{t}%"] * 3)
+    if source:
+        where.append("p.source = ?")
+        params.append(source)
+    if since:
+        where.append("p.timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("p.timestamp < ?")
+        params.append(until)
+    if model:
+        where.append("EXISTS (SELECT 1 FROM post_gpu_tags t WHERE t.post_id = p.id"
+                     " AND t.kind = 'models' AND t.value = ?)")
+        params.append(model)
+
+    if long_terms:
+        select_hl = ("highlight(posts_fts, 0, '<mark>', '</mark>') AS title_hl, "
+                     "snippet(posts_fts, -1, '<mark>', '</mark>', '…', 24) AS snippet")
+        order = "bm25(posts_fts, 5.0, 1.0, 0.5)"
+    else:
+        select_hl = "posts_fts.title AS title_hl, substr(posts_fts.content, 1, 80) AS snippet"
+        order = "p.replies DESC"
+    sql = f"""SELECT p.id, p.source, p.title, p.url, p.replies, p.likes, p.timestamp, {select_hl}
+              FROM posts_fts JOIN posts p ON p.rowid = posts_fts.rowid
+              WHERE {' AND '.join(where)}
+              ORDER BY {order} LIMIT ?"""
+    params.append(limit)
+    with get_db(readonly=True) as conn:
+        return [dict(r) for r in conn.execute(sql, params)]
+
+
+def update_relevance(posts: list[dict]):
+    """只回写 AI 相关性结果（relevance_class / relevance_reason），不重写整行"""
+    params = [
+        (p["_relevance_class"], p.get("_relevance_reason", ""), p.get("id", ""))
+        for p in posts if p.get("_relevance_class", -1) >= 0
+    ]
+    if not params:
+        return
+    with get_db() as conn:
+        conn.executemany(
+            "UPDATE posts SET relevance_class = ?, relevance_reason = ? WHERE id = ?",
+            params,
+        )
 
-            try:
-                conn.execute(
-                    """INSERT INTO posts (id, source, content_hash, title, url, replies, likes, gpu_tags, timestamp, comments, relevance_class, relevance_reason)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                       ON CONFLICT(id) DO UPDATE SET
-                           replies = MAX(posts.replies, excluded.replies),
-                           likes = MAX(posts.likes, excluded.likes),
-                           comments = COALESCE(excluded.comments, posts.comments),
-                           relevance_class = CASE WHEN excluded.relevance_class >= 0 THEN excluded.relevance_class ELSE posts.relevance_class END,
-                           relevance_reason = COALESCE(excluded.relevance_reason, posts.relevance_reason)""",
-                    (
-                        post.get("id", ""),
-                        post.get("source", ""),
-                        h,
-                        post.get("title", ""),
-                        post.get("url", ""),
-                        post.get("replies", 0),
-                        post.get("likes", 0),
-                        gpu_tags,
-                        post.get("timestamp", ""),
-                        post.get("comments", ""),
-                        post.get("_relevance_class", -1),
-                        post.get("_relevance_reason", ""),
-                    )
-                )
-            except sqlite3.IntegrityError:
-                pass
+
+def get_comment_snapshots(post_ids: list[str]) -> dict[str, dict]:
+    """已入库的评论快照：id → {"comments", "comments_replies"}
+
+    comments_replies 为抓取评论时的回复数；旧数据缺失时按当前 replies 计。
+    """
+    if not post_ids:
+        return {}
+    snapshots = {}
+    with get_db() as conn:
+        for chunk in _chunks(post_ids):
+            rows = conn.execute(
+                f"""SELECT id, comments, COALESCE(comments_replies, replies, 0) AS comments_replies
+                    FROM posts WHERE id IN ({",".join("?" * len(chunk))})
+                    AND comments IS NOT NULL AND comments != ''""",
+                chunk,
+            ).fetchall()
+            for r in rows:
+                snapshots[r["id"]] = {"comments": r["comments"], "comments_replies": r["comments_replies"]}
+    return snapshots
 
 
 def save_rankings(rankings: list[dict]):
@@ -216,31 +587,42 @@ def save_rankings(rankings: list[dict]):
     if not rankings:
         return
 
+    run_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+    params = [
+        (
+            run_date,
+            r.get("rank", 0),
+            r.get("pain_point", ""),
+            r.get("pphi_score", 0),
+            r.get("mentions", 0),
+            json.dumps(r.get("gpu_tags", {}), ensure_ascii=False),
+            json.dumps(r.get("source_urls", []), ensure_ascii=False),
+            r.get("hidden_need", ""),
+            r.get("total_replies", 0),
+            r.get("total_likes", 0),
+            json.dumps(r.get("inferred_need"), ensure_ascii=False) if r.get("inferred_need") else None,
+            r.get("category", ""),
+            r.get("affected_users", ""),
+            r.get("quality_tier", "bronze"),
+            r.get("evidence", ""),
+            r.get("entity_id"),
+        )
+        for r in rankings
+    ]
     with get_db() as conn:
-        run_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-        for r in rankings:
-            conn.execute(
-                """INSERT INTO pphi_history (run_date, rank, pain_point, pphi_score, mentions, gpu_tags, source_urls, hidden_need, total_replies, total_likes, inferred_need_json, category, affected_users, quality_tier, evidence)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    run_date,
-                    r.get("rank", 0),
-                    r.get("pain_point", ""),
-                    r.get("pphi_score", 0),
-                    r.get("mentions", 0),
-                    json.dumps(r.get("gpu_tags", {}), ensure_ascii=False),
-                    json.dumps(r.get("source_urls", []), ensure_ascii=False),
-                    r.get("hidden_need", ""),
-                    r.get("total_replies", 0),
-                    r.get("total_likes", 0),
-                    json.dumps(r.get("inferred_need"), ensure_ascii=False) if r.get("inferred_need") else None,
-                    r.get("category", ""),
-                    r.get("affected_users", ""),
-                    r.get("quality_tier", "bronze"),
-                    r.get("evidence", ""),
-                )
-            )
+        conn.executemany(
+            """INSERT INTO pphi_history (run_date, rank, pain_point, pphi_score, mentions, gpu_tags, source_urls, hidden_need, total_replies, total_likes, inferred_need_json, category, affected_users, quality_tier, evidence, entity_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            params,
+        )
+        tag_rows, post_rows = [], []
+        for history_id, r in zip(_inserted_ids(conn, "pphi_history", len(params)), rankings):
+            tags, links = _history_link_rows(conn, history_id, run_date, r.get("gpu_tags", {}),
+                                             r.get("source_urls", []), r.get("source_post_ids", []))
+            tag_rows.extend(tags)
+            post_rows.extend(links)
+        conn.executemany("INSERT OR IGNORE INTO history_gpu_tags VALUES (?, ?, ?, ?)", tag_rows)
+        conn.executemany("INSERT OR IGNORE INTO history_posts VALUES (?, ?, ?, ?, ?, ?)", post_rows)
 
 
 def save_pain_points(pain_points: list[dict]):
@@ -248,48 +630,151 @@ def save_pain_points(pain_points: list[dict]):
     if not pain_points:
         return
 
+    run_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+    params = []
+    for pp in pain_points:
+        source_post_ids = pp.get("source_post_ids", [])
+        sources = list(set(pid.split("_")[0] for pid in source_post_ids if "_" in pid))
+        mentions = len(source_post_ids)
+
+        inferred_need = pp.get("inferred_need") or {}
+        hidden_need = inferred_need.get("hidden_need", "") if isinstance(inferred_need, dict) else ""
+        confidence = inferred_need.get("confidence", 0) if isinstance(inferred_need, dict) else 0
+
+        params.append((
+            run_date,
+            pp.get("pain_point", ""),
+            pp.get("category", ""),
+            mentions,
+            json.dumps(sources, ensure_ascii=False),
+            json.dumps(pp.get("gpu_tags", {}), ensure_ascii=False),
+            json.dumps(pp.get("source_urls", []), ensure_ascii=False),
+            pp.get("evidence", ""),
+            hidden_need,
+            confidence,
+            pp.get("pphi_score", 0),
+            pp.get("total_replies", 0),
+            pp.get("total_likes", 0),
+            pp.get("earliest_timestamp", ""),
+            pp.get("entity_id"),
+        ))
+
+    with get_db() as conn:
+        conn.executemany(
+            """INSERT INTO pain_points (run_date, pain_point, category, mentions, sources, gpu_tags, source_urls, evidence, hidden_need, confidence, pphi_score, total_replies, total_likes, earliest_timestamp, entity_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            params,
+        )
+        conn.executemany(
+            "INSERT INTO pain_point_posts VALUES (?, ?, ?, ?, ?)",
+            [(pain_id, *link)
+             for pain_id, pp in zip(_inserted_ids(conn, "pain_points", len(params)), pain_points)
+             for link in _resolve_post_links(conn, pp.get("source_urls", []), pp.get("source_post_ids", []))],
+        )
+
+
+def _canonical_entity(conn: sqlite3.Connection, entity_id: int) -> int | None:
+    """沿 merged_into 找到当前主实体"""
+    seen = set()
+    while entity_id is not None and entity_id not in seen:
+        seen.add(entity_id)
+        row = conn.execute("SELECT merged_into FROM pain_point_entities WHERE id = ?", (entity_id,)).fetchone()
+        if row is None:
+            return None
+        if row[0] is None:
+            return entity_id
+        entity_id = row[0]
+    return entity_id
+
+
+def assign_pain_entities(groups: list[dict]) -> list[int]:
+    """为聚合后的痛点分配稳定实体 id（一个事务内完成）
+
+    Args:
+        groups: [{"key": 主规范化名, "display_name", "category",
+                  "aliases": {规范化名: 原始名}, "entity_ids": 历史行已有的实体 id}]
+
+    别名或历史 id 命中多个实体时（聚合/LLM 去重合并了跨轮痛点），
+    保留最早的实体，其余标记 merged_into 并把别名和历史行改指向它。
+    """
+    result = []
     with get_db() as conn:
-        run_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-        for pp in pain_points:
-            source_post_ids = pp.get("source_post_ids", [])
-            sources = list(set(pid.split("_")[0] for pid in source_post_ids if "_" in pid))
-            mentions = len(source_post_ids)
-
-            inferred_need = pp.get("inferred_need") or {}
-            hidden_need = inferred_need.get("hidden_need", "") if isinstance(inferred_need, dict) else ""
-            confidence = inferred_need.get("confidence", 0) if isinstance(inferred_need, dict) else 0
-
-            conn.execute(
-                """INSERT INTO pain_points (run_date, pain_point, category, mentions, sources, gpu_tags, source_urls, evidence, hidden_need, confidence, pphi_score, total_replies, total_likes, earliest_timestamp)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    run_date,
-                    pp.get("pain_point", ""),
-                    pp.get("category", ""),
-                    mentions,
-                    json.dumps(sources, ensure_ascii=False),
-                    json.dumps(pp.get("gpu_tags", {}), ensure_ascii=False),
-                    json.dumps(pp.get("source_urls", []), ensure_ascii=False),
-                    pp.get("evidence", ""),
-                    hidden_need,
-                    confidence,
-                    pp.get("pphi_score", 0),
-                    pp.get("total_replies", 0),
-                    pp.get("total_likes", 0),
-                    pp.get("earliest_timestamp", ""),
+        for g in groups:
+            aliases = dict(g.get("aliases") or {})
+            aliases.setdefault(g["key"], g["display_name"])
+            found = set()
+            for chunk in _chunks(list(aliases)):
+                found.update(r[0] for r in conn.execute(
+                    f"SELECT entity_id FROM pain_point_aliases WHERE alias_key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ))
+            found.update(i for i in g.get("entity_ids") or () if i)
+            ids = {c for c in (_canonical_entity(conn, i) for i in found) if c is not None}
+
+            if ids:
+                entity_id = min(ids)
+                others = sorted(ids - {entity_id})
+                if others:
+                    marks = ",".join("?" * len(others))
+                    conn.execute(f"UPDATE pain_point_entities SET merged_into = ? WHERE id IN ({marks})",
+                                 [entity_id, *others])
+                    for table in ("pain_point_aliases", "pphi_history", "pain_points"):
+                        conn.execute(f"UPDATE {table} SET entity_id = ? WHERE entity_id IN ({marks})",
+                                     [entity_id, *others])
+                conn.execute(
+                    """UPDATE pain_point_entities SET display_name = ?,
+                           category = COALESCE(NULLIF(?, ''), category), last_seen = datetime('now')
+                       WHERE id = ?""",
+                    (g["display_name"], g.get("category", ""), entity_id),
                 )
+            else:
+                row = conn.execute("SELECT id FROM pain_point_entities WHERE norm_key = ?", (g["key"],)).fetchone()
+                if row:
+                    entity_id = _canonical_entity(conn, row[0])
+                else:
+                    entity_id = conn.execute(
+                        "INSERT INTO pain_point_entities (norm_key, display_name, category) VALUES (?, ?, ?)",
+                        (g["key"], g["display_name"], g.get("category", "")),
+                    ).lastrowid
+            conn.executemany(
+                """INSERT INTO pain_point_aliases (alias_key, alias, entity_id) VALUES (?, ?, ?)
+                   ON CONFLICT(alias_key) DO UPDATE SET entity_id = excluded.entity_id""",
+                [(k, name, entity_id) for k, name in aliases.items() if k],
             )
+            result.append(entity_id)
+    return result
+
+
+def get_pain_entity(entity_id: int) -> dict | None:
+    """按 id 取痛点实体（已合并的 id 返回主实体），附别名列表"""
+    with get_db(readonly=True) as conn:
+        canonical = _canonical_entity(conn, entity_id)
+        if canonical is None:
+            return None
+        row = conn.execute("SELECT * FROM pain_point_entities WHERE id = ?", (canonical,)).fetchone()
+        aliases = [r[0] for r in conn.execute(
+            "SELECT alias FROM pain_point_aliases WHERE entity_id = ? ORDER BY alias", (canonical,))]
+    entity = dict(row)
+    entity["aliases"] = aliases
+    return entity
+
+
+def get_pain_entity_history(entity_id: int, limit: int = 12) -> list[dict]:
+    """某个痛点实体最近 N 轮的排名记录（旧 → 新，每轮取最高分）"""
+    with get_db(readonly=True) as conn:
+        rows = conn.execute(
+            """SELECT run_date, MAX(pphi_score) AS pphi_score, mentions, MIN(rank) AS rank
+               FROM pphi_history WHERE entity_id = ?
+               GROUP BY run_date ORDER BY run_date DESC LIMIT ?""",
+            (entity_id, limit),
+        ).fetchall()
+    return [dict(r) for r in reversed(rows)]
 
 
 def get_post_count() -> dict:
-    """获取帖子统计"""
-    with get_db() as conn:
-        total = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
-        by_source = {}
-        for row in conn.execute("SELECT source, COUNT(*) as cnt FROM posts GROUP BY source"):
-            by_source[row["source"]] = row["cnt"]
-    return {"total": total, "by_source": by_source}
+    """获取帖子统计（读 source_stats 汇总表）"""
+    stats = get_summary_stats()
+    return {"total": stats["total_posts"], "by_source": stats["by_source"]}
 
 
 def save_checkpoint(source: str, post_count: int):
@@ -316,6 +801,39 @@ def get_checkpoint(source: str) -> dict | None:
     return dict(row) if row else None
 
 
+def save_scrape_run(source: str, fetched: int, new_posts: int, requests: int = 0,
+                    errors: int = 0, rate_limited: int = 0, not_modified: bool = False,
+                    duration_sec: float = 0.0):
+    """记录单个数据源一次抓取的产出与健康度（调度器依据）"""
+    with get_db() as conn:
+        conn.execute(
+            """INSERT INTO scrape_history
+               (source, fetched, new_posts, requests, errors, rate_limited, not_modified, duration_sec)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (source, fetched, new_posts, requests, errors, rate_limited,
+             int(not_modified), round(duration_sec, 1))
+        )
+        # 每个源只保留最近 200 次
+        conn.execute(
+            """DELETE FROM scrape_history WHERE source = ? AND id NOT IN
+               (SELECT id FROM scrape_history WHERE source = ? ORDER BY id DESC LIMIT 200)""",
+            (source, source)
+        )
+
+
+def get_scrape_history(source: str, limit: int = 10) -> list[dict]:
+    """最近 N 次抓取记录（新 → 旧）"""
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT source, scraped_at, fetched, new_posts, requests, errors,
+                      rate_limited, not_modified, duration_sec
+               FROM scrape_history WHERE source = ?
+               ORDER BY id DESC LIMIT ?""",
+            (source, limit)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
 def get_trend_data(days: int = 30) -> list[dict]:
     """获取最近 N 天的 PPHI 趋势数据"""
     with get_db() as conn:
@@ -329,37 +847,88 @@ def get_trend_data(days: int = 30) -> list[dict]:
     return [dict(r) for r in rows]
 
 
-def backup_db(max_backups: int = 7):
-    """备份数据库文件，保留最近 N 份"""
+def backup_db(max_backups: int = 7, compress: bool = False, keep_daily: int = 0,
+              pages_per_step: int = 1024, step_sleep: float = 0.005,
+              backup_dir: Path = None) -> dict | None:
+    """在线备份数据库（SQLite backup API），保留最近 N 份
+
+    按 pages_per_step 页分步复制，步间让出锁，不阻塞 Web 端读取；
+    复制的是一致快照（含 WAL 中已提交的数据）。compress=True 时 gzip 压缩。
+    keep_daily > 0 时，除最近 N 份外再保留最近 keep_daily 天每天最新的一份。
+    每次备份的耗时和大小追加到 backup_log.jsonl。
+    """
+    import gzip
     import shutil
     if not DB_PATH.exists():
-        return
-    backup_dir = DB_PATH.parent / "backup"
+        return None
+    backup_dir = Path(backup_dir) if backup_dir else DB_PATH.parent / "backup"
     backup_dir.mkdir(parents=True, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    dest = backup_dir / f"gpu_insight_{timestamp}.db"
-    shutil.copy2(str(DB_PATH), str(dest))
-    # 清理旧备份
-    backups = sorted(backup_dir.glob("gpu_insight_*.db"), reverse=True)
-    for old in backups[max_backups:]:
-        old.unlink()
-    print(f"  [DB] 备份: {dest.name}（保留 {min(len(backups), max_backups)} 份）")
+    dest = backup_dir / f"gpu_insight_{timestamp}.db{'.gz' if compress else ''}"
+    tmp = backup_dir / f".gpu_insight_{timestamp}.db.tmp"
+
+    t0 = time.perf_counter()
+    target = sqlite3.connect(str(tmp))
+    try:
+        with get_db(readonly=True) as conn:
+            conn.backup(target, pages=max(1, pages_per_step), sleep=step_sleep)
+    finally:
+        target.close()
+    db_bytes = tmp.stat().st_size
+    if compress:
+        with open(tmp, "rb") as src, gzip.open(dest, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        tmp.unlink()
+    else:
+        tmp.replace(dest)
+    entry = {
+        "file": dest.name,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "duration_sec": round(time.perf_counter() - t0, 3),
+        "db_bytes": db_bytes,
+        "size_bytes": dest.stat().st_size,
+    }
+    with open(backup_dir / "backup_log.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    # 清理旧备份：最近 N 份 + 每天最新一份（文件名时间戳倒序即新 → 旧）
+    backups = sorted(backup_dir.glob("gpu_insight_*.db*"), key=lambda p: p.name, reverse=True)
+    keep = set(backups[:max_backups])
+    days_seen = set()
+    for b in backups:
+        day = b.name[len("gpu_insight_"):][:8]
+        if len(days_seen) >= keep_daily:
+            break
+        if day not in days_seen:
+            days_seen.add(day)
+            keep.add(b)
+    for old in backups:
+        if old not in keep:
+            old.unlink()
+    print(f"  [DB] 备份: {dest.name} {entry['size_bytes'] / 1024 / 1024:.1f}MB "
+          f"({entry['duration_sec']:.1f}s，保留 {len(keep)} 份)")
+    return entry
 
 
 def cleanup_old_history(keep_runs: int = 30):
     """清理 pphi_history 旧数据，只保留最近 N 轮"""
     with get_db() as conn:
-        dates = conn.execute(
-            "SELECT DISTINCT run_date FROM pphi_history ORDER BY run_date DESC"
-        ).fetchall()
-        if len(dates) <= keep_runs:
+        row = conn.execute(
+            "SELECT run_date FROM run_summary ORDER BY run_date DESC LIMIT 1 OFFSET ?",
+            (keep_runs - 1,),
+        ).fetchone()
+        if not row or not conn.execute(
+            "SELECT 1 FROM run_summary WHERE run_date < ? LIMIT 1", (row["run_date"],)
+        ).fetchone():
             return 0
 
-        cutoff_date = dates[keep_runs - 1]["run_date"]
+        cutoff_date = row["run_date"]
         result = conn.execute(
             "DELETE FROM pphi_history WHERE run_date < ?", (cutoff_date,)
         )
         deleted = result.rowcount
+        conn.execute("DELETE FROM history_gpu_tags WHERE run_date < ?", (cutoff_date,))
+        conn.execute("DELETE FROM history_posts WHERE run_date < ?", (cutoff_date,))
         if deleted > 0:
             print(f"  [DB] 清理 pphi_history: 删除 {deleted} 行（保留最近 {keep_runs} 轮）")
         return deleted
@@ -1,22 +1,63 @@
-"""GPU-Insight GPU 产品标签识别器 — L0 本地正则，零 token"""
+"""GPU-Insight GPU 产品标签识别器 — L0 本地正则，零 token
 
+标签结果按 (标题+正文哈希, gpu_products.yaml 的 md5) 缓存：进程内 LRU + posts.tag_hash / tag_version。
+同一帖子在抓取、流水线第 3 步、热词统计中只打一次标，产品配置变更后才重打。
+"""
+
+import hashlib
 import re
+import threading
 import yaml
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 
+_PRODUCTS_PATH = Path(__file__).parent.parent.parent / "config" / "gpu_products.yaml"
 _PRODUCTS: Optional[dict] = None
+_PRODUCTS_VERSION: Optional[str] = None
+_PRODUCTS_MTIME: Optional[int] = None
+
+_TAG_CACHE_SIZE = 20000
+_tag_cache: OrderedDict = OrderedDict()
+_lock = threading.Lock()
 
 
 def _load_products() -> dict:
-    global _PRODUCTS
+    global _PRODUCTS, _PRODUCTS_VERSION, _PRODUCTS_MTIME
     if _PRODUCTS is None:
-        path = Path(__file__).parent.parent.parent / "config" / "gpu_products.yaml"
-        with open(path, "r", encoding="utf-8") as f:
-            _PRODUCTS = yaml.safe_load(f)
+        raw = _PRODUCTS_PATH.read_bytes()
+        _PRODUCTS_MTIME = _PRODUCTS_PATH.stat().st_mtime_ns
+        _PRODUCTS_VERSION = hashlib.md5(raw).hexdigest()
+        _PRODUCTS = yaml.safe_load(raw.decode("utf-8"))
     return _PRODUCTS
 
 
+def products_version() -> str:
+    """gpu_products.yaml 内容的 md5，作为标签缓存的版本号"""
+    _load_products()
+    return _PRODUCTS_VERSION
+
+
+def _refresh_products():
+    """配置文件被修改过则丢弃已编译的模式和标签缓存（批量入口调用，单帖不做 stat）"""
+    global _PRODUCTS, _PRODUCTS_MTIME, _MODEL_PATTERNS, _MATCHER
+    try:
+        mtime = _PRODUCTS_PATH.stat().st_mtime_ns
+    except OSError:
+        return
+    if _PRODUCTS is not None and mtime != _PRODUCTS_MTIME:
+        raw = _PRODUCTS_PATH.read_bytes()
+        if hashlib.md5(raw).hexdigest() != _PRODUCTS_VERSION:
+            with _lock:
+                _PRODUCTS = None
+                _MODEL_PATTERNS = None
+                _MATCHER = None
+                _tag_cache.clear()
+            print("  [!] gpu_products.yaml 已变更，GPU 标签将按新配置重打")
+        else:
+            _PRODUCTS_MTIME = mtime
+
+
 def _build_model_patterns(products: dict) -> list[tuple[str, str, str, re.Pattern]]:
     """构建 (brand, series, model, pattern) 列表，按型号长度降序（优先匹配长型号）"""
     patterns = []
@@ -90,6 +131,18 @@ def _build_brand_patterns(products: dict) -> list[tuple[str, re.Pattern]]:
 _MODEL_PATTERNS = None
 _MFR_PATTERNS = None
 _BRAND_PATTERNS = None
+_MATCHER = None
+_MODEL_BRAND = None
+
+# 文本切成字母段 / 数字段；每个模式都有一个必然以完整段出现的锚点
+_TOKEN_RE = re.compile(r"[0-9]+|[a-zA-Z]+")
+_DIGITS_RE = re.compile(r"[0-9]+")
+_LOOKAROUND_RE = re.compile(r"\(\?<?[!=][^)]*\)")
+_UNESCAPE_RE = re.compile(r"\\(.)")
+# IGNORECASE 下会与 ASCII 字母互相匹配的非 ASCII 字符（İ ı ſ K），出现时退回逐个模式匹配
+_FOLD_CHARS = frozenset("İıſK")
+
+_MODEL, _BRAND, _MFR = 0, 1, 2
 
 
 def _get_patterns():
@@ -102,6 +155,76 @@ def _get_patterns():
     return _MODEL_PATTERNS, _MFR_PATTERNS, _BRAND_PATTERNS
 
 
+def _literal(pattern: str) -> str:
+    """还原模式的字面量：去掉前后断言和 \\b，\\s* 记作空格"""
+    s = _LOOKAROUND_RE.sub("", pattern).replace(r"\b", "").replace(r"\s*", " ")
+    return _UNESCAPE_RE.sub(r"\1", s)
+
+
+def _anchor(pat: re.Pattern) -> Optional[str]:
+    """模式的锚点：匹配文本中必然作为完整字母 / 数字段出现的一段（小写）
+
+    - 型号模式取第一个数字段：前有字母 / 空白 / 断言，后不接数字
+    - \\b 别名取第一个段：\\b 保证它前面不是字母数字
+    空格可被 \\s* 吞掉而拼出更长的段时不建锚点（放入每次都检查的列表）。
+    """
+    literal = _literal(pat.pattern)
+    if pat.pattern.startswith(r"\b"):
+        m = _TOKEN_RE.match(literal)
+        return m.group().lower() if m else None
+    spaced = _DIGITS_RE.search(literal)
+    joined = _DIGITS_RE.search(literal.replace(" ", ""))
+    if not spaced or not joined or spaced.group() != joined.group():
+        return None
+    return spaced.group()
+
+
+def _get_matcher():
+    """锚点索引：{段 → [(类别, 标签, pattern)]}，另有无锚点模式和非 ASCII 别名
+
+    标签：型号为 (brand, series, model)，品牌 / 厂商为名称。
+    """
+    global _MATCHER, _MODEL_BRAND
+    if _MATCHER is None:
+        model_pats, mfr_pats, brand_pats = _get_patterns()
+        entries = [(_MODEL, (brand, ser, model), pat) for brand, ser, model, pat in model_pats]
+        entries += [(_BRAND, name, pat) for name, pat in brand_pats]
+        entries += [(_MFR, name, pat) for name, pat in mfr_pats]
+        index: dict[str, list] = {}
+        always = []
+        non_ascii = []
+        for entry in entries:
+            pat = entry[2]
+            if not pat.pattern.isascii():
+                # 中文别名直接匹配：先做子串判断
+                non_ascii.append((_literal(pat.pattern).lower(), entry))
+                continue
+            anchor = _anchor(pat)
+            if anchor:
+                index.setdefault(anchor, []).append(entry)
+            else:
+                always.append(entry)
+        _MATCHER = (index, always, non_ascii)
+        _MODEL_BRAND = {model: brand for brand, _, model, _ in model_pats}
+    return _MATCHER
+
+
+def _candidates(text: str) -> list:
+    """一次切段扫描，取出锚点出现过的模式（必要条件，最终仍由原 pattern 确认）"""
+    index, always, non_ascii = _get_matcher()
+    if not text.isascii() and not _FOLD_CHARS.isdisjoint(text):
+        return [e for entries in index.values() for e in entries] + always + [e for _, e in non_ascii]
+    found = list(always)
+    for token in {m.group().lower() for m in _TOKEN_RE.finditer(text)}:
+        entries = index.get(token)
+        if entries:
+            found.extend(entries)
+    if non_ascii and not text.isascii():
+        lowered = text.lower()
+        found.extend(e for literal, e in non_ascii if literal in lowered)
+    return found
+
+
 def tag_gpu_products(text: str) -> dict:
     """从文本中识别 GPU 产品标签
 
@@ -113,29 +236,26 @@ def tag_gpu_products(text: str) -> dict:
             "manufacturers": ["ASUS"]
         }
     """
-    model_pats, mfr_pats, brand_pats = _get_patterns()
-
     brands = set()
     models = set()
     series = set()
     manufacturers = set()
-
-    # 匹配具体型号（同时确定品牌和系列）
-    for brand, ser, model, pat in model_pats:
-        if pat.search(text):
-            brands.add(brand)
-            models.add(model)
-            series.add(ser)
-
-    # 匹配品牌别名（补充没有具体型号但提到品牌的情况）
-    for brand, pat in brand_pats:
-        if pat.search(text):
-            brands.add(brand)
-
-    # 匹配板卡厂商
-    for mfr, pat in mfr_pats:
-        if pat.search(text):
-            manufacturers.add(mfr)
+    matched = set()
+
+    # 候选模式逐个确认；同一型号 / 品牌 / 厂商命中一次即可
+    for kind, label, pat in _candidates(text):
+        if kind == _MODEL:
+            if label not in matched and pat.search(text):
+                matched.add(label)
+                brand, ser, model = label
+                brands.add(brand)
+                models.add(model)
+                series.add(ser)
+        elif kind == _BRAND:
+            if label not in brands and pat.search(text):
+                brands.add(label)
+        elif label not in manufacturers and pat.search(text):
+            manufacturers.add(label)
 
     return {
         "brands": sorted(brands),
@@ -145,17 +265,12 @@ def tag_gpu_products(text: str) -> dict:
     }
 
 
-def tag_post(post: dict) -> dict:
-    """给单条帖子打 GPU 产品标签，写入 _gpu_tags 字段
-
-    品牌精确化策略：标题优先。
+def _tag_text(title: str, content: str) -> dict:
+    """品牌精确化策略：标题优先。
     - 标题中识别到的型号 → 确定品牌（高置信）
     - 正文中识别到的型号 → 仅当品牌与标题一致时才纳入
     - 如果标题无型号，退回到全文匹配（兼容旧逻辑）
     """
-    title = post.get("title", "") or ""
-    content = post.get("content", "") or ""
-
     title_tags = tag_gpu_products(title)
     title_brands = set(title_tags["brands"])
     title_models = set(title_tags["models"])
@@ -167,11 +282,9 @@ def tag_post(post: dict) -> dict:
         merged_series = set(title_tags["series"])
         merged_mfrs = set(title_tags["manufacturers"])
 
-        model_pats, _, _ = _get_patterns()
-        model_brand_map = {model: brand for brand, _, model, _ in model_pats}
-
+        _get_matcher()
         for m in content_tags["models"]:
-            brand = model_brand_map.get(m, "")
+            brand = _MODEL_BRAND.get(m, "")
             if brand in title_brands:
                 merged_models.add(m)
         for s in content_tags["series"]:
@@ -179,22 +292,129 @@ def tag_post(post: dict) -> dict:
         for mfr in content_tags["manufacturers"]:
             merged_mfrs.add(mfr)
 
-        post["_gpu_tags"] = {
+        return {
             "brands": sorted(title_brands),
             "models": sorted(merged_models),
             "series": sorted(merged_series),
             "manufacturers": sorted(merged_mfrs),
         }
-    else:
-        # 标题无型号 → 全文匹配（兼容旧逻辑）
-        full_text = f"{title} {content}"
-        post["_gpu_tags"] = tag_gpu_products(full_text)
+    # 标题无型号 → 全文匹配（兼容旧逻辑）
+    return tag_gpu_products(f"{title} {content}")
+
+
+def tag_key(post: dict) -> str:
+    """标签缓存键：标题 + 正文的 md5"""
+    text = f"{post.get('title', '') or ''}\0{post.get('content', '') or ''}"
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _apply(post: dict, key: str, version: str, tags: dict):
+    post["_gpu_tags"] = {k: list(v) for k, v in tags.items()}  # 缓存里的列表不外借
+    post["_tag_hash"] = key
+    post["_tag_version"] = version
+
 
+def _remember(key: str, version: str, tags: dict):
+    with _lock:
+        _tag_cache[(key, version)] = tags
+        _tag_cache.move_to_end((key, version))
+        while len(_tag_cache) > _TAG_CACHE_SIZE:
+            _tag_cache.popitem(last=False)
+
+
+def _cached(key: str, version: str) -> Optional[dict]:
+    with _lock:
+        tags = _tag_cache.get((key, version))
+        if tags is not None:
+            _tag_cache.move_to_end((key, version))
+        return tags
+
+
+def tag_post(post: dict) -> dict:
+    """给单条帖子打 GPU 产品标签，写入 _gpu_tags 字段（及缓存键 _tag_hash / _tag_version）"""
+    version = products_version()
+    key = tag_key(post)
+    tags = _cached(key, version)
+    if tags is None:
+        tags = _tag_text(post.get("title", "") or "", post.get("content", "") or "")
+        _remember(key, version, tags)
+    _apply(post, key, version, tags)
     return post
 
 
 def tag_posts(posts: list[dict]) -> list[dict]:
-    """批量打标签"""
+    """批量打标签：依次查进程内缓存、posts 表中的缓存键，都未命中才重新匹配"""
+    _refresh_products()
+    version = products_version()
+    missed = []
     for post in posts:
-        tag_post(post)
+        key = tag_key(post)
+        tags = _cached(key, version)
+        if tags is not None:
+            _apply(post, key, version, tags)
+        else:
+            missed.append((post, key))
+
+    stored = {}
+    ids = [p["id"] for p, _ in missed if p.get("id")]
+    if ids:
+        try:
+            from src.utils.db import get_stored_tags
+            stored = get_stored_tags(ids, version)
+        except Exception as e:
+            print(f"  [!] 读取已存 GPU 标签失败，全部重新匹配: {e}")
+
+    for post, key in missed:
+        hit = stored.get(post.get("id"))
+        if hit and hit[0] == key:
+            tags = hit[1]
+        else:
+            tags = _tag_text(post.get("title", "") or "", post.get("content", "") or "")
+        _remember(key, version, tags)
+        _apply(post, key, version, tags)
     return posts
+
+
+def retag_stale_posts(batch: int = 2000) -> int:
+    """重打 tag_version 与当前 gpu_products.yaml 不一致的帖子，返回重打条数
+
+    只在产品配置变更（或旧库升级）后有工作量。posts 表不存正文，正文取自 posts_fts；
+    没有已索引正文的行（旧库回填、FTS5 不可用）保留抓取时的标签，只更新 tag_version，
+    tag_hash 置空使其不被当作缓存命中，帖子再次出现时按完整正文重打。
+    post_gpu_tags 随之更新，model_mentions 由触发器同步。
+    """
+    from src.utils import db
+
+    _refresh_products()
+    version = products_version()
+    total = 0
+    while True:
+        with db.get_db() as conn:
+            if db._fts_available:
+                sql = """SELECT p.id, p.title, COALESCE(f.content, '') AS content FROM posts p
+                         LEFT JOIN posts_fts f ON f.rowid = p.rowid"""
+            else:
+                sql = "SELECT p.id, p.title, '' AS content FROM posts p"
+            rows = conn.execute(
+                sql + """ WHERE p.id != ''
+                          AND (p.tag_version IS NULL OR p.tag_version < ? OR p.tag_version > ?) LIMIT ?""",
+                (version, version, batch),
+            ).fetchall()
+            if not rows:
+                break
+            posts = [{"id": r["id"], "title": r["title"] or "", "content": r["content"]}
+                     for r in rows if r["content"]]
+            # 只有标题时打出的标签会丢掉正文里的型号，不能覆盖已存标签
+            conn.executemany(
+                "UPDATE posts SET tag_version = ?, tag_hash = NULL WHERE id = ?",
+                [(version, r["id"]) for r in rows if not r["content"]],
+            )
+            for post in posts:
+                tag_post(post)
+            db.save_post_tags(posts)
+        total += len(posts)
+        if len(rows) < batch:
+            break
+    if total:
+        print(f"  [DB] 按新产品配置重打 GPU 标签 {total} 条")
+    return total
@@ -466,16 +466,12 @@ def discover_from_db(min_mentions: int = 2) -> dict:
                         if w not in STOPWORDS_EN and not _is_existing_keyword(w, existing_words, existing_phrases):
                             en_counter[w] += 1
 
-        # 2. 统计 GPU 型号讨论热度
-        from src.utils.gpu_tagger import tag_post
-        model_counter = Counter()
-        title_rows = conn.execute("SELECT title FROM posts").fetchall()
-        for row in title_rows:
-            title = row["title"] if isinstance(row, dict) or hasattr(row, "keys") else row[0]
-            post = {"title": title, "content": title}
-            tag_post(post)
-            for m in post.get("_gpu_tags", {}).get("models", []):
-                model_counter[m] += 1
+    # 2. GPU 型号讨论热度：model_mentions 随 post_gpu_tags 增量维护，
+    #    只有 gpu_products.yaml 变更后过期的帖子需要重打标签
+    from src.utils.db import get_model_mentions
+    from src.utils.gpu_tagger import retag_stale_posts
+    retag_stale_posts()
+    model_ranks = [m for m, _ in get_model_mentions(10)]
 
     new_zh = [w for w, c in zh_counter.most_common(MAX_DISCOVERED_ZH * 2) if c >= min_mentions]
     new_en = [w for w, c in en_counter.most_common(MAX_DISCOVERED_EN * 2) if c >= min_mentions]
@@ -483,7 +479,6 @@ def discover_from_db(min_mentions: int = 2) -> dict:
     # 语义去重
     new_zh = _dedup_similar_words(new_zh)[:MAX_DISCOVERED_ZH]
     new_en = _dedup_similar_words(new_en)[:MAX_DISCOVERED_EN]
-    model_ranks = [m for m, c in model_counter.most_common(10)]
 
     return {"zh": new_zh, "en": new_en, "model_ranks": model_ranks}
 
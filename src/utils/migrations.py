@@ -0,0 +1,570 @@
+"""GPU-Insight 数据库 schema 迁移 — 按 PRAGMA user_version 顺序执行
+
+每个步骤有递增版本号。init_db 先读 user_version，已是最新就直接返回，
+启动开销不随迁移步骤增多而增长。落后时在 BEGIN IMMEDIATE 写锁内重读版本再逐步执行，
+web 和 pipeline 容器同时启动也只有一个进程真正迁移，另一个拿到锁后发现已是最新。
+
+旧库（user_version = 0）可能已有部分表和列，所以每个步骤都必须幂等
+（IF NOT EXISTS / 先查列再 ALTER）。
+
+需要扫全表的回填登记到 schema_backfills，迁移提交后分批执行：每批一个短事务，
+游标与数据同一事务提交，其它进程可在批次之间读写，中断后下次启动从断点继续。
+新表/新列的二级索引在回填完成后再建，避免边写边维护索引。
+"""
+
+import sqlite3
+import time
+
+_BACKFILL_BATCH = 2000
+_BACKFILL_SLEEP = 0.01  # 批次间让出写锁
+
+
+def _statements(script: str):
+    """把多语句脚本拆成单条语句（executescript 会隐式提交，迁移事务里不能用）"""
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                yield buf.strip()
+            buf = ""
+    if buf.strip().strip(";").strip():
+        yield buf.strip()
+
+
+def run_script(conn: sqlite3.Connection, script: str):
+    for statement in _statements(script):
+        conn.execute(statement)
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _add_columns(conn: sqlite3.Connection, columns: list[tuple]):
+    """安全添加新列：先查 table_info，已存在的跳过"""
+    existing = {}
+    for table, column, col_type in columns:
+        if table not in existing:
+            existing[table] = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in existing[table]:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+            existing[table].add(column)
+
+
+def _register_backfill(conn: sqlite3.Connection, name: str):
+    conn.execute("INSERT OR IGNORE INTO schema_backfills (name) VALUES (?)", (name,))
+
+
+# ── 迁移步骤 ─────────────────────────────────────────────
+
+def _m001_base(conn: sqlite3.Connection):
+    """帖子 / 痛点 / PPHI 历史 / 抓取记录"""
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS posts (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            title TEXT,
+            url TEXT,
+            replies INTEGER DEFAULT 0,
+            likes INTEGER DEFAULT 0,
+            gpu_tags TEXT,
+            timestamp TEXT,
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_posts_hash ON posts(content_hash);
+        CREATE INDEX IF NOT EXISTS idx_posts_source ON posts(source);
+
+        CREATE TABLE IF NOT EXISTS pain_points (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_date TEXT NOT NULL,
+            pain_point TEXT NOT NULL,
+            category TEXT,
+            mentions INTEGER DEFAULT 0,
+            sources TEXT,
+            gpu_tags TEXT,
+            source_urls TEXT,
+            evidence TEXT,
+            hidden_need TEXT,
+            confidence REAL DEFAULT 0,
+            pphi_score REAL DEFAULT 0,
+            total_replies INTEGER DEFAULT 0,
+            total_likes INTEGER DEFAULT 0,
+            earliest_timestamp TEXT,
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_pp_date ON pain_points(run_date);
+
+        CREATE TABLE IF NOT EXISTS pphi_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_date TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            pain_point TEXT NOT NULL,
+            pphi_score REAL NOT NULL,
+            mentions INTEGER DEFAULT 0,
+            gpu_tags TEXT,
+            source_urls TEXT,
+            hidden_need TEXT,
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_pphi_date ON pphi_history(run_date);
+        CREATE INDEX IF NOT EXISTS idx_pphi_date_pain ON pphi_history(run_date, pain_point);
+
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            source TEXT PRIMARY KEY,
+            last_scrape_at TEXT NOT NULL,
+            last_post_count INTEGER DEFAULT 0,
+            total_scraped INTEGER DEFAULT 0
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_posts_url ON posts(url);
+
+        CREATE TABLE IF NOT EXISTS scrape_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            scraped_at TEXT DEFAULT (datetime('now')),
+            fetched INTEGER DEFAULT 0,
+            new_posts INTEGER DEFAULT 0,
+            requests INTEGER DEFAULT 0,
+            errors INTEGER DEFAULT 0,
+            rate_limited INTEGER DEFAULT 0,
+            not_modified INTEGER DEFAULT 0,
+            duration_sec REAL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_scrape_history_source ON scrape_history(source, scraped_at);
+
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name TEXT PRIMARY KEY,
+            cursor INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            started_at TEXT DEFAULT (datetime('now')),
+            finished_at TEXT
+        );
+    """)
+    # 早期库由 ALTER TABLE 逐步加出来的列
+    _add_columns(conn, [
+        ("pain_points", "total_replies", "INTEGER DEFAULT 0"),
+        ("pain_points", "total_likes", "INTEGER DEFAULT 0"),
+        ("pain_points", "earliest_timestamp", "TEXT"),
+        ("pphi_history", "total_replies", "INTEGER DEFAULT 0"),
+        ("pphi_history", "total_likes", "INTEGER DEFAULT 0"),
+        ("pphi_history", "inferred_need_json", "TEXT"),  # v9.5: 完整推理对象（reasoning_chain + munger_review）
+        ("pphi_history", "category", "TEXT"),  # v9.5: 痛点分类
+        ("pphi_history", "affected_users", "TEXT"),  # v9.5: 影响范围
+        ("posts", "comments", "TEXT"),
+        # v9: AI 相关性过滤结果
+        ("posts", "relevance_class", "INTEGER DEFAULT -1"),
+        ("posts", "relevance_reason", "TEXT"),
+        # v9.9: 数据质量分层
+        ("pphi_history", "quality_tier", "TEXT DEFAULT 'bronze'"),
+        # v1.2: 证据字段
+        ("pphi_history", "evidence", "TEXT"),
+        # 评论快照抓取时的回复数（评论缓存：回复增长超过阈值才重抓）
+        ("posts", "comments_replies", "INTEGER"),
+    ])
+
+
+_LINK_INDEXES = {
+    "post_gpu_tags": """
+        CREATE INDEX IF NOT EXISTS idx_post_gpu_tags_value ON post_gpu_tags(kind, value);
+    """,
+    "history_links": """
+        CREATE INDEX IF NOT EXISTS idx_history_gpu_tags_run ON history_gpu_tags(run_date, kind, value);
+        CREATE INDEX IF NOT EXISTS idx_history_gpu_tags_value ON history_gpu_tags(kind, value);
+        CREATE INDEX IF NOT EXISTS idx_history_posts_run ON history_posts(run_date);
+        CREATE INDEX IF NOT EXISTS idx_history_posts_post ON history_posts(post_id);
+    """,
+    "pain_point_links": """
+        CREATE INDEX IF NOT EXISTS idx_pain_point_posts_post ON pain_point_posts(post_id);
+    """,
+}
+
+
+def _m002_link_tables(conn: sqlite3.Connection):
+    """GPU 标签 / 来源帖子关联表；旧库从 JSON 列分批回填"""
+    fresh = not _table_exists(conn, "post_gpu_tags")
+    run_script(conn, """
+        -- 关联表：GPU 标签 / 来源帖子按行展开，按型号、来源查询走索引而非解码 JSON
+        CREATE TABLE IF NOT EXISTS post_gpu_tags (
+            post_id TEXT NOT NULL,
+            kind TEXT NOT NULL,         -- brands / models / series / manufacturers
+            value TEXT NOT NULL,
+            PRIMARY KEY (post_id, kind, value)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS history_gpu_tags (
+            history_id INTEGER NOT NULL,
+            run_date TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (history_id, kind, value)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS history_posts (
+            history_id INTEGER NOT NULL,
+            run_date TEXT NOT NULL,
+            seq INTEGER NOT NULL,       -- 在 source_urls 中的顺序
+            url TEXT,
+            post_id TEXT,               -- 入库时按 posts.url 解析，找不到为 NULL
+            source TEXT,
+            PRIMARY KEY (history_id, seq)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS pain_point_posts (
+            pain_point_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            url TEXT,
+            post_id TEXT,
+            source TEXT,
+            PRIMARY KEY (pain_point_id, seq)
+        ) WITHOUT ROWID;
+    """)
+    for name, index_sql in _LINK_INDEXES.items():
+        if fresh:
+            _register_backfill(conn, name)
+        else:
+            run_script(conn, index_sql)
+
+
+def _m003_pain_entities(conn: sqlite3.Connection):
+    """痛点实体表 + 历史行 entity_id（空值由 rankers._backfill_entities 按规范化名称归入）"""
+    run_script(conn, """
+        -- 痛点实体：稳定 id + 规范化名称 + 别名，历史行按 entity_id 关联（改名/合并后 id 不变）
+        CREATE TABLE IF NOT EXISTS pain_point_entities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            norm_key TEXT NOT NULL UNIQUE,
+            display_name TEXT NOT NULL,
+            category TEXT,
+            merged_into INTEGER,        -- 被合并后指向主实体，旧 id 的链接据此跳转
+            first_seen TEXT DEFAULT (datetime('now')),
+            last_seen TEXT DEFAULT (datetime('now'))
+        );
+        CREATE TABLE IF NOT EXISTS pain_point_aliases (
+            alias_key TEXT PRIMARY KEY,  -- 规范化后的名称
+            alias TEXT NOT NULL,         -- 原始名称
+            entity_id INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_pain_point_aliases_entity ON pain_point_aliases(entity_id);
+    """)
+    _add_columns(conn, [
+        ("pphi_history", "entity_id", "INTEGER"),
+        ("pain_points", "entity_id", "INTEGER"),
+    ])
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_pphi_entity ON pphi_history(entity_id, run_date);
+        CREATE INDEX IF NOT EXISTS idx_pp_entity ON pain_points(entity_id);
+    """)
+
+
+_SUMMARY_SCHEMA = """
+    -- 物化汇总表：由下面的触发器在写入时增量维护，看板查询不再扫历史表
+    CREATE TABLE IF NOT EXISTS source_stats (
+        source TEXT NOT NULL,
+        relevance_class INTEGER NOT NULL,   -- -1 未判断 / 0 排除 / >0 保留
+        posts INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (source, relevance_class)
+    );
+    CREATE TABLE IF NOT EXISTS run_summary (
+        run_date TEXT PRIMARY KEY,
+        pain_count INTEGER NOT NULL DEFAULT 0,
+        top_pphi REAL,
+        needs_count INTEGER NOT NULL DEFAULT 0,  -- hidden_need 非空的痛点数
+        top_pains TEXT                           -- 前 8 名名称，逗号分隔
+    );
+    CREATE TABLE IF NOT EXISTS pain_point_stats (
+        pain_point TEXT PRIMARY KEY,
+        runs INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS summary_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO summary_counters VALUES ('runs', 0), ('pains', 0);
+    CREATE INDEX IF NOT EXISTS idx_posts_relevance ON posts(relevance_class, created_at);
+
+    CREATE TRIGGER IF NOT EXISTS stats_posts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO source_stats VALUES (new.source, COALESCE(new.relevance_class, -1), 1)
+            ON CONFLICT(source, relevance_class) DO UPDATE SET posts = posts + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_posts_delete AFTER DELETE ON posts BEGIN
+        UPDATE source_stats SET posts = posts - 1
+            WHERE source = old.source AND relevance_class = COALESCE(old.relevance_class, -1);
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_posts_relevance AFTER UPDATE OF relevance_class ON posts
+    WHEN COALESCE(old.relevance_class, -1) != COALESCE(new.relevance_class, -1) BEGIN
+        UPDATE source_stats SET posts = posts - 1
+            WHERE source = old.source AND relevance_class = COALESCE(old.relevance_class, -1);
+        INSERT INTO source_stats VALUES (new.source, COALESCE(new.relevance_class, -1), 1)
+            ON CONFLICT(source, relevance_class) DO UPDATE SET posts = posts + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_pphi_insert AFTER INSERT ON pphi_history BEGIN
+        INSERT INTO run_summary VALUES (
+            new.run_date, 1, new.pphi_score, COALESCE(new.hidden_need, '') != '',
+            CASE WHEN new.rank <= 8 THEN new.pain_point END
+        ) ON CONFLICT(run_date) DO UPDATE SET
+            pain_count = pain_count + 1,
+            top_pphi = MAX(COALESCE(top_pphi, excluded.top_pphi), excluded.top_pphi),
+            needs_count = needs_count + excluded.needs_count,
+            top_pains = CASE WHEN excluded.top_pains IS NULL THEN top_pains
+                ELSE COALESCE(top_pains || ',', '') || excluded.top_pains END;
+        INSERT INTO pain_point_stats VALUES (new.pain_point, 1)
+            ON CONFLICT(pain_point) DO UPDATE SET runs = runs + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_pphi_delete AFTER DELETE ON pphi_history BEGIN
+        UPDATE run_summary SET pain_count = pain_count - 1,
+            needs_count = needs_count - (COALESCE(old.hidden_need, '') != '')
+            WHERE run_date = old.run_date;
+        DELETE FROM run_summary WHERE run_date = old.run_date AND pain_count <= 0;
+        UPDATE pain_point_stats SET runs = runs - 1 WHERE pain_point = old.pain_point;
+        DELETE FROM pain_point_stats WHERE pain_point = old.pain_point AND runs <= 0;
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_pphi_need AFTER UPDATE OF hidden_need ON pphi_history
+    WHEN (COALESCE(old.hidden_need, '') != '') != (COALESCE(new.hidden_need, '') != '') BEGIN
+        UPDATE run_summary
+            SET needs_count = needs_count + (COALESCE(new.hidden_need, '') != '')
+                                          - (COALESCE(old.hidden_need, '') != '')
+            WHERE run_date = new.run_date;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_runs_insert AFTER INSERT ON run_summary BEGIN
+        UPDATE summary_counters SET value = value + 1 WHERE name = 'runs';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_runs_delete AFTER DELETE ON run_summary BEGIN
+        UPDATE summary_counters SET value = value - 1 WHERE name = 'runs';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_pains_insert AFTER INSERT ON pain_point_stats BEGIN
+        UPDATE summary_counters SET value = value + 1 WHERE name = 'pains';
+    END;
+    CREATE TRIGGER IF NOT EXISTS stats_pains_delete AFTER DELETE ON pain_point_stats BEGIN
+        UPDATE summary_counters SET value = value - 1 WHERE name = 'pains';
+    END;
+"""
+
+
+def _m004_summary_tables(conn: sqlite3.Connection):
+    """看板汇总表 + 维护触发器，按现有数据全量重算一次"""
+    from src.utils.db import rebuild_summary_tables
+    run_script(conn, _SUMMARY_SCHEMA)
+    rebuild_summary_tables(conn)
+
+
+def _m005_posts_fts(conn: sqlite3.Connection):
+    """全文索引 posts_fts（trigram 分词），rowid 与 posts.rowid 对齐
+
+    posts 表本身不存正文，旧库只能回填标题和评论；SQLite 不支持 FTS5 时跳过，检索退化为 LIKE。
+    """
+    fresh = not _table_exists(conn, "posts_fts")
+    try:
+        run_script(conn, """
+            CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                title, content, comments, tokenize = 'trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+                DELETE FROM posts_fts WHERE rowid = old.rowid;
+            END;
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"  [!] SQLite 不支持 FTS5 trigram，全文检索不可用: {e}")
+        return
+    if fresh:
+        _register_backfill(conn, "posts_fts")
+
+
+def _m006_near_dup_index(conn: sqlite3.Connection):
+    """近似去重：MinHash 签名 + LSH 分带索引（见 cleaners/near_dup.py）"""
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS post_minhash (
+            post_id TEXT PRIMARY KEY,
+            source TEXT,
+            signature BLOB NOT NULL,
+            cluster_id TEXT NOT NULL,   -- 簇内最早出现的帖子 id，首帖指向自己
+            similarity REAL,            -- 与命中帖子的估计 Jaccard，首帖为 NULL
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_post_minhash_cluster ON post_minhash(cluster_id);
+        CREATE INDEX IF NOT EXISTS idx_post_minhash_created ON post_minhash(created_at);
+        CREATE TABLE IF NOT EXISTS near_dup_bands (
+            bucket INTEGER NOT NULL,    -- 分带哈希（含带号）
+            post_id TEXT NOT NULL,
+            PRIMARY KEY (bucket, post_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_near_dup_bands_post ON near_dup_bands(post_id);
+    """)
+
+
+def _m007_tag_cache(conn: sqlite3.Connection):
+    """GPU 标签缓存键 + 型号提及计数
+
+    posts.tag_hash / tag_version 记录 gpu_tags 对应的 (标题+正文哈希, gpu_products.yaml 版本)，
+    键不变时不再重新打标。model_mentions 由 post_gpu_tags 上的触发器增量维护。
+    旧行 tag_version 为 NULL，由 gpu_tagger.retag_stale_posts 按需重打。
+    """
+    _add_columns(conn, [
+        ("posts", "tag_hash", "TEXT"),
+        ("posts", "tag_version", "TEXT"),
+    ])
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_posts_tag_version ON posts(tag_version);
+
+        CREATE TABLE IF NOT EXISTS model_mentions (
+            model TEXT PRIMARY KEY,
+            posts INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS mentions_insert AFTER INSERT ON post_gpu_tags
+        WHEN new.kind = 'models' BEGIN
+            INSERT INTO model_mentions VALUES (new.value, 1)
+                ON CONFLICT(model) DO UPDATE SET posts = posts + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS mentions_delete AFTER DELETE ON post_gpu_tags
+        WHEN old.kind = 'models' BEGIN
+            UPDATE model_mentions SET posts = posts - 1 WHERE model = old.value;
+            DELETE FROM model_mentions WHERE model = old.value AND posts <= 0;
+        END;
+
+        DELETE FROM model_mentions;
+        INSERT INTO model_mentions
+            SELECT value, COUNT(*) FROM post_gpu_tags WHERE kind = 'models' GROUP BY value;
+    """)
+
+
+# (版本号, 说明, 步骤)：只能在末尾追加，已发布的步骤不要改版本号
+MIGRATIONS = [
+    (1, "基础表", _m001_base),
+    (2, "GPU 标签 / 来源帖子关联表", _m002_link_tables),
+    (3, "痛点实体", _m003_pain_entities),
+    (4, "看板汇总表", _m004_summary_tables),
+    (5, "全文索引", _m005_posts_fts),
+    (6, "近似去重索引", _m006_near_dup_index),
+    (7, "GPU 标签缓存", _m007_tag_cache),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# ── 分批回填 ─────────────────────────────────────────────
+# fn(conn, cursor, batch) -> 新游标；返回 None 表示已完成
+
+def _backfill_post_tags(conn: sqlite3.Connection, cursor: int, batch: int) -> int | None:
+    from src.utils.db import _loads, _tag_rows
+    rows = conn.execute(
+        "SELECT rowid, id, gpu_tags FROM posts WHERE rowid > ? ORDER BY rowid LIMIT ?", (cursor, batch)
+    ).fetchall()
+    conn.executemany("INSERT OR IGNORE INTO post_gpu_tags VALUES (?, ?, ?)",
+                     [t for _, pid, tags in rows for t in _tag_rows(pid, _loads(tags, {}))])
+    return rows[-1][0] if len(rows) == batch else None
+
+
+def _backfill_history_links(conn: sqlite3.Connection, cursor: int, batch: int) -> int | None:
+    from src.utils.db import _loads, _insert_history_links
+    rows = conn.execute(
+        """SELECT id, run_date, gpu_tags, source_urls FROM pphi_history
+           WHERE id > ? ORDER BY id LIMIT ?""", (cursor, batch)
+    ).fetchall()
+    for hid, run_date, tags, urls in rows:
+        _insert_history_links(conn, hid, run_date, _loads(tags, {}), _loads(urls, []))
+    return rows[-1][0] if len(rows) == batch else None
+
+
+def _backfill_pain_point_links(conn: sqlite3.Connection, cursor: int, batch: int) -> int | None:
+    from src.utils.db import _loads, _resolve_post_links
+    rows = conn.execute(
+        "SELECT id, source_urls FROM pain_points WHERE id > ? ORDER BY id LIMIT ?", (cursor, batch)
+    ).fetchall()
+    for ppid, urls in rows:
+        conn.executemany("INSERT OR IGNORE INTO pain_point_posts VALUES (?, ?, ?, ?, ?)",
+                         [(ppid, *link) for link in _resolve_post_links(conn, _loads(urls, []))])
+    return rows[-1][0] if len(rows) == batch else None
+
+
+def _backfill_posts_fts(conn: sqlite3.Connection, cursor: int, batch: int) -> int | None:
+    last = conn.execute(
+        "SELECT MAX(rowid), COUNT(*) FROM (SELECT rowid FROM posts WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+        (cursor, batch),
+    ).fetchone()
+    if last[0] is not None:
+        # 回填期间 save_posts 已写入的行（带正文）保持不动
+        conn.execute(
+            """INSERT INTO posts_fts (rowid, title, content, comments)
+               SELECT rowid, title, '', COALESCE(comments, '') FROM posts p
+               WHERE rowid > ? AND rowid <= ?
+                 AND NOT EXISTS (SELECT 1 FROM posts_fts f WHERE f.rowid = p.rowid)""",
+            (cursor, last[0]),
+        )
+    return last[0] if last[1] == batch else None
+
+
+# 名称 → (回填函数, 完成后执行的建索引脚本)
+_BACKFILLS = {
+    "post_gpu_tags": (_backfill_post_tags, _LINK_INDEXES["post_gpu_tags"]),
+    "history_links": (_backfill_history_links, _LINK_INDEXES["history_links"]),
+    "pain_point_links": (_backfill_pain_point_links, _LINK_INDEXES["pain_point_links"]),
+    "posts_fts": (_backfill_posts_fts, ""),
+}
+
+
+def run_backfills(conn: sqlite3.Connection, batch: int = _BACKFILL_BATCH):
+    """执行未完成的回填（多个进程同时执行也安全：每批在写锁内重读游标）"""
+    pending = [r[0] for r in conn.execute("SELECT name FROM schema_backfills WHERE done = 0 ORDER BY rowid")]
+    for name in pending:
+        if name not in _BACKFILLS:
+            continue  # 更新版本代码登记的回填
+        fn, index_sql = _BACKFILLS[name]
+        t0 = time.time()
+        batches = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor, done = conn.execute(
+                    "SELECT cursor, done FROM schema_backfills WHERE name = ?", (name,)
+                ).fetchone()
+                if not done:
+                    cursor = fn(conn, cursor, batch)
+                    if cursor is None:
+                        run_script(conn, index_sql)
+                        conn.execute(
+                            "UPDATE schema_backfills SET done = 1, finished_at = datetime('now') WHERE name = ?",
+                            (name,),
+                        )
+                        done = True
+                    else:
+                        conn.execute("UPDATE schema_backfills SET cursor = ? WHERE name = ?", (cursor, name))
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                print(f"  [!] 回填 {name} 失败，下次启动从断点继续: {e}")
+                break
+            batches += 1
+            if done:
+                if batches > 1:
+                    print(f"  [DB] 回填 {name} 完成（{batches} 批，{time.time() - t0:.1f}s）")
+                break
+            time.sleep(_BACKFILL_SLEEP)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """把库升级到 SCHEMA_VERSION 并跑完待完成的回填，返回当前版本
+
+    conn 需为 isolation_level=None（事务由这里显式控制）。
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]  # 拿到写锁后重读
+            for step_version, description, step in MIGRATIONS:
+                if step_version <= version:
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {step_version}")
+                print(f"  [DB] schema 迁移 v{step_version}: {description}")
+                version = step_version
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    run_backfills(conn)
+    return version
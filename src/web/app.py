@@ -9,7 +9,7 @@ from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import JSONResponse, StreamingResponse
-from src.utils.db import get_db
+from src.utils.db import get_db, get_run_summaries, get_summary_stats
 
 app = FastAPI(title="GPU-Insight", description="显卡用户痛点智能分析系统")
 
@@ -31,20 +31,20 @@ def _load_rankings() -> dict:
 def _get_trend_data() -> dict:
     """从 DB 获取 PPHI 趋势数据"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
+            # 取最近 30 次运行（覆盖约 5 天），只读这些轮次的行
+            dates = sorted(r["run_date"] for r in conn.execute(
+                "SELECT run_date FROM run_summary ORDER BY run_date DESC LIMIT 30"
+            ))
             rows = conn.execute(
-                """SELECT run_date, pain_point, pphi_score
-                   FROM pphi_history ORDER BY run_date ASC"""
-            ).fetchall()
+                f"""SELECT run_date, pain_point, pphi_score FROM pphi_history
+                    WHERE run_date IN ({",".join("?" * len(dates))})""",
+                dates,
+            ).fetchall() if dates else []
 
         if not rows:
             return {"labels": [], "datasets": []}
 
-        # 按日期分组
-        dates = sorted(set(r["run_date"] for r in rows))
-        # 取最近 30 次运行（覆盖约 5 天）
-        dates = dates[-30:]
-
         # 找出出现频率最高的 top 5 痛点
         from collections import Counter
         pp_counter = Counter(r["pain_point"] for r in rows if r["run_date"] in dates)
@@ -72,12 +72,9 @@ def _get_trend_data() -> dict:
 def _get_source_distribution() -> dict:
     """从 DB 获取来源分布"""
     try:
-        with get_db() as conn:
-            rows = conn.execute(
-                "SELECT source, COUNT(*) as cnt FROM posts GROUP BY source"
-            ).fetchall()
-        labels = [r["source"] for r in rows]
-        data = [r["cnt"] for r in rows]
+        by_source = get_summary_stats()["by_source"]
+        labels = sorted(by_source)
+        data = [by_source[l] for l in labels]
         colors = {"reddit": "#FF5722", "nga": "#4CAF50", "tieba": "#FF9800", "chiphell": "#1976D2"}
         bg = [colors.get(l, "#9C27B0") for l in labels]
         return {"labels": labels, "data": data, "backgroundColor": bg}
@@ -88,12 +85,8 @@ def _get_source_distribution() -> dict:
 def _get_cumulative_stats() -> dict:
     """从 DB 获取累计统计"""
     try:
-        with get_db() as conn:
-            total_posts = conn.execute("SELECT COUNT(*) as c FROM posts").fetchone()["c"]
-            total_runs = conn.execute("SELECT COUNT(DISTINCT run_date) as c FROM pphi_history").fetchone()["c"]
-            total_pains = conn.execute("SELECT COUNT(DISTINCT pain_point) as c FROM pphi_history").fetchone()["c"]
-            total_sources = conn.execute("SELECT COUNT(DISTINCT source) as c FROM posts").fetchone()["c"]
-        return {"total_posts": total_posts, "total_runs": total_runs, "total_pains": total_pains, "total_sources": total_sources}
+        stats = get_summary_stats()
+        return {k: stats[k] for k in ("total_posts", "total_runs", "total_pains", "total_sources")}
     except Exception:
         return {"total_posts": 0, "total_runs": 0, "total_pains": 0, "total_sources": 0}
 
@@ -101,50 +94,56 @@ def _get_cumulative_stats() -> dict:
 def _get_run_delta() -> dict:
     """对比最新两轮 pphi_history，计算新增痛点数和新增 GPU 型号数"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             dates = conn.execute(
-                "SELECT DISTINCT run_date FROM pphi_history ORDER BY run_date DESC LIMIT 2"
+                "SELECT run_date FROM run_summary ORDER BY run_date DESC LIMIT 2"
             ).fetchall()
             if len(dates) < 2:
                 return {"new_pains": 0, "new_models": 0, "prev_date": ""}
 
             curr_date, prev_date = dates[0]["run_date"], dates[1]["run_date"]
 
-            curr_rows = conn.execute(
-                "SELECT pain_point, gpu_tags FROM pphi_history WHERE run_date = ?", (curr_date,)
-            ).fetchall()
-            prev_rows = conn.execute(
-                "SELECT pain_point, gpu_tags FROM pphi_history WHERE run_date = ?", (prev_date,)
-            ).fetchall()
+            curr_pains = {r["pain_point"] for r in conn.execute(
+                "SELECT pain_point FROM pphi_history WHERE run_date = ?", (curr_date,))}
+            prev_pains = {r["pain_point"] for r in conn.execute(
+                "SELECT pain_point FROM pphi_history WHERE run_date = ?", (prev_date,))}
+            # 型号差集直接在关联表上算（idx_history_gpu_tags_run）
+            new_models = conn.execute(
+                """SELECT COUNT(DISTINCT value) AS c FROM history_gpu_tags
+                   WHERE run_date = ? AND kind = 'models'
+                   AND value NOT IN (SELECT value FROM history_gpu_tags
+                                     WHERE run_date = ? AND kind = 'models')""",
+                (curr_date, prev_date)
+            ).fetchone()["c"]
 
-        curr_pains = set(r["pain_point"] for r in curr_rows)
-        prev_pains = set(r["pain_point"] for r in prev_rows)
         new_pains = len(curr_pains - prev_pains)
 
-        curr_models = set()
-        for r in curr_rows:
-            tags = json.loads(r["gpu_tags"]) if r["gpu_tags"] else {}
-            curr_models.update(tags.get("models", []))
-        prev_models = set()
-        for r in prev_rows:
-            tags = json.loads(r["gpu_tags"]) if r["gpu_tags"] else {}
-            prev_models.update(tags.get("models", []))
-        new_models = len(curr_models - prev_models)
-
         return {"new_pains": new_pains, "new_models": new_models, "prev_date": prev_date}
     except Exception:
         return {"new_pains": 0, "new_models": 0, "prev_date": ""}
 
 
-def _get_pain_trend(pain_point_name: str) -> dict:
-    """获取单个痛点的 PPHI 历史趋势"""
+def _get_pain_trend(pain_point_name: str, entity_id: int = None) -> dict:
+    """获取单个痛点的 PPHI 历史趋势（有实体 id 时按 id 查，改名/合并后历史不断）"""
+    if entity_id:
+        try:
+            from src.utils.db import get_pain_entity_history
+            rows = get_pain_entity_history(entity_id, limit=12)
+            if rows:
+                return {
+                    "labels": [r["run_date"][5:] for r in rows],
+                    "scores": [r["pphi_score"] for r in rows],
+                    "mentions": [r["mentions"] for r in rows],
+                }
+        except Exception:
+            logging.exception("DB query failed")
     if not pain_point_name:
         return {"labels": [], "scores": [], "mentions": []}
     try:
         from src.utils.db import get_db
         import re
         base_name = re.sub(r'[（(][^）)]*[）)]', '', pain_point_name).strip()
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             rows = conn.execute(
                 """SELECT run_date, pphi_score, mentions
                    FROM pphi_history
@@ -210,15 +209,16 @@ def _load_source_posts(pain_point: dict) -> list[dict]:
     if not source_urls:
         return []
     try:
-        with get_db() as conn:
-            posts = []
-            for url in source_urls[:20]:
-                row = conn.execute(
-                    "SELECT id, source, title, url, replies, likes, timestamp FROM posts WHERE url = ?",
-                    (url,)
-                ).fetchone()
-                if row:
-                    posts.append(dict(row))
+        urls = source_urls[:20]
+        with get_db(readonly=True) as conn:
+            by_url = {}
+            for r in conn.execute(
+                f"""SELECT id, source, title, url, replies, likes, timestamp FROM posts
+                    WHERE url IN ({','.join('?' * len(urls))})""",
+                urls
+            ):
+                by_url.setdefault(r["url"], dict(r))
+            posts = [by_url[u] for u in urls if u in by_url]
             # 如果 URL 匹配不到，尝试用 post id 前缀匹配
             if not posts:
                 for url in source_urls[:20]:
@@ -251,7 +251,7 @@ async def pain_point_detail(request: Request, rank: int):
     posts = _load_source_posts(pain_point)
 
     # 获取该痛点的 PPHI 历史趋势
-    trend_data = _get_pain_trend(pain_point.get("pain_point", ""))
+    trend_data = _get_pain_trend(pain_point.get("pain_point", ""), pain_point.get("entity_id"))
 
     return templates.TemplateResponse(request, "details.html", {
         "pain_point": pain_point,
@@ -261,6 +261,37 @@ async def pain_point_detail(request: Request, rank: int):
     })
 
 
+@app.get("/pain/{entity_id}")
+async def pain_entity_detail(request: Request, entity_id: int):
+    """痛点永久链接：按实体 id 访问，已合并的旧 id 跳转到主实体"""
+    from src.utils.db import get_pain_entity
+    try:
+        entity = get_pain_entity(entity_id)
+    except Exception:
+        logging.exception("DB query failed")
+        entity = None
+    if entity and entity["id"] != entity_id:
+        from starlette.responses import RedirectResponse
+        return RedirectResponse(f"/pain/{entity['id']}")
+
+    rankings = _load_rankings().get("rankings", [])
+    pain_point = next((r for r in rankings if entity and r.get("entity_id") == entity["id"]), None)
+    if pain_point is None and entity:
+        # 已跌出当前排名：用实体信息展示历史
+        pain_point = {"pain_point": entity["display_name"], "category": entity.get("category") or "",
+                      "entity_id": entity["id"], "source_urls": []}
+    pain_point = pain_point or {}
+
+    return templates.TemplateResponse(request, "details.html", {
+        "pain_point": pain_point,
+        "posts": _load_source_posts(pain_point),
+        "trend_data_json": json.dumps(
+            _get_pain_trend(pain_point.get("pain_point", ""), pain_point.get("entity_id")),
+            ensure_ascii=False),
+        "active_page": "",
+    })
+
+
 @app.get("/api/rankings")
 async def api_rankings():
     """API: 获取排名数据"""
@@ -327,6 +358,39 @@ async def api_gpu_models():
     return JSONResponse({"models": _get_gpu_model_insights()})
 
 
+@app.get("/api/gpu-models/{model}/posts")
+async def api_gpu_model_posts(model: str, source: str = "", limit: int = 50):
+    """API: 某个 GPU 型号的相关帖子（可按来源过滤）"""
+    from src.utils.db import get_posts_by_model
+    try:
+        posts = get_posts_by_model(model, source or None, max(1, min(limit, 200)))
+    except Exception:
+        logging.exception("DB query failed")
+        posts = []
+    return JSONResponse({"model": model, "posts": posts})
+
+
+@app.get("/api/search")
+async def api_search(q: str = "", source: str = "", since: str = "", until: str = "",
+                     model: str = "", limit: int = 20):
+    """API: 帖子全文检索（标题/正文/评论），可按来源、日期、GPU 型号过滤"""
+    import time
+    from src.utils.db import search_posts
+    t0 = time.perf_counter()
+    try:
+        results = search_posts(q, source=source or None, since=since or None, until=until or None,
+                               model=model or None, limit=max(1, min(limit, 100)))
+    except Exception as e:
+        logging.exception("search failed")
+        return JSONResponse({"error": str(e), "results": []}, status_code=400)
+    return JSONResponse({
+        "query": q,
+        "count": len(results),
+        "took_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "results": results,
+    })
+
+
 @app.get("/api/health")
 async def health():
     """健康检查"""
@@ -341,7 +405,7 @@ async def admin(request: Request):
     # 1. 数据源健康
     sources = []
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             rows = conn.execute(
                 "SELECT source, last_scrape_at, last_post_count, total_scraped FROM scrape_checkpoints ORDER BY source"
             ).fetchall()
@@ -397,22 +461,19 @@ async def admin(request: Request):
     # 3. 异常告警
     alerts = []
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             # 检查最新一轮
-            latest = conn.execute("SELECT MAX(run_date) as rd FROM pphi_history").fetchone()
-            if latest and latest["rd"]:
-                rd = latest["rd"]
-                pain_count = conn.execute(
-                    "SELECT COUNT(*) as c FROM pphi_history WHERE run_date = ?", (rd,)
-                ).fetchone()["c"]
+            latest = conn.execute(
+                "SELECT run_date, pain_count, needs_count FROM run_summary ORDER BY run_date DESC LIMIT 1"
+            ).fetchone()
+            if latest:
+                rd = latest["run_date"]
+                pain_count = latest["pain_count"]
                 if pain_count == 0:
                     alerts.append({"level": "error", "msg": f"最新轮次 {rd} 痛点数为 0"})
 
                 # 检查隐藏需求是否全空
-                needs = conn.execute(
-                    "SELECT COUNT(*) as c FROM pphi_history WHERE run_date = ? AND hidden_need != '' AND hidden_need IS NOT NULL", (rd,)
-                ).fetchone()["c"]
-                if needs == 0 and pain_count > 0:
+                if latest["needs_count"] == 0 and pain_count > 0:
                     alerts.append({"level": "warning", "msg": f"最新轮次隐藏需求全部为空"})
 
             # 检查爬虫超时（>8h 未更新）
@@ -447,17 +508,9 @@ async def admin(request: Request):
     # 6. AI 过滤统计
     filter_stats = {"total": 0, "kept": 0, "dropped": 0, "recent_drops": []}
     try:
-        with get_db() as conn:
-            # 统计已判断的帖子
-            total_judged = conn.execute(
-                "SELECT COUNT(*) as c FROM posts WHERE relevance_class >= 0"
-            ).fetchone()["c"]
-            kept = conn.execute(
-                "SELECT COUNT(*) as c FROM posts WHERE relevance_class > 0"
-            ).fetchone()["c"]
-            dropped = conn.execute(
-                "SELECT COUNT(*) as c FROM posts WHERE relevance_class = 0"
-            ).fetchone()["c"]
+        # 已判断 / 保留 / 排除计数来自 source_stats 汇总表
+        summary = get_summary_stats()
+        with get_db(readonly=True) as conn:
             # 最近被排除的帖子（方便人工复查是否误杀）
             recent_drops = conn.execute(
                 """SELECT title, source, relevance_reason, created_at
@@ -465,9 +518,9 @@ async def admin(request: Request):
                    ORDER BY created_at DESC LIMIT 20"""
             ).fetchall()
             filter_stats = {
-                "total": total_judged,
-                "kept": kept,
-                "dropped": dropped,
+                "total": summary["judged"],
+                "kept": summary["kept"],
+                "dropped": summary["dropped"],
                 "recent_drops": [dict(r) for r in recent_drops],
             }
     except Exception:
@@ -519,23 +572,14 @@ async def report(request: Request):
 async def history(request: Request):
     """历史轮次浏览"""
     try:
-        with get_db() as conn:
-            # 获取所有运行轮次
-            runs = conn.execute(
-                """SELECT run_date, COUNT(*) as pain_count,
-                          ROUND(MAX(pphi_score), 1) as top_pphi,
-                          GROUP_CONCAT(DISTINCT pain_point) as pain_list
-                   FROM pphi_history
-                   GROUP BY run_date
-                   ORDER BY run_date DESC"""
-            ).fetchall()
+        # 各轮汇总由 run_summary 在写入时维护
         run_list = []
-        for r in runs:
+        for r in get_run_summaries():
             run_list.append({
                 "run_date": r["run_date"],
                 "pain_count": r["pain_count"],
-                "top_pphi": r["top_pphi"],
-                "pain_list": (r["pain_list"] or "")[:100],
+                "top_pphi": round(r["top_pphi"], 1) if r["top_pphi"] is not None else None,
+                "pain_list": (r["top_pains"] or "")[:100],
             })
     except Exception:
         logging.exception("DB query failed")
@@ -554,7 +598,7 @@ async def history_detail(request: Request, run_date: str = ""):
         from starlette.responses import RedirectResponse
         return RedirectResponse("/history")
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             rows = conn.execute(
                 """SELECT rank, pain_point, pphi_score, mentions, gpu_tags, source_urls, hidden_need, inferred_need_json, category, affected_users
                    FROM pphi_history
@@ -658,25 +702,34 @@ async def api_weekly_report():
 def _get_evolution_data() -> dict:
     """获取痛点排名演变数据（Bump Chart 用）"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
+            dates = [r["run_date"] for r in conn.execute(
+                "SELECT DISTINCT run_date FROM pphi_history ORDER BY run_date DESC LIMIT 10"
+            )][::-1]  # 最近 10 轮
+            if not dates:
+                return {"dates": [], "series": []}
+            # 按实体 id 追踪（改名不断线），无 id 的旧行退回按名称
             rows = conn.execute(
-                """SELECT run_date, pain_point, rank, pphi_score
-                   FROM pphi_history
-                   ORDER BY run_date ASC, rank ASC"""
+                f"""SELECT h.run_date, h.rank, h.pain_point,
+                           COALESCE('e' || h.entity_id, 'n' || h.pain_point) AS pkey,
+                           e.display_name
+                    FROM pphi_history h
+                    LEFT JOIN pain_point_entities e ON e.id = h.entity_id
+                    WHERE h.run_date IN ({','.join('?' * len(dates))})""",
+                dates
             ).fetchall()
 
-        if not rows:
-            return {"dates": [], "series": []}
-
-        dates = sorted(set(r["run_date"] for r in rows))
-        dates = dates[-10:]  # 最近 10 轮
-
         # 找出在这些轮次中出现最多的 Top 8 痛点
         from collections import Counter
-        pp_counter = Counter(
-            r["pain_point"] for r in rows if r["run_date"] in dates
-        )
+        pp_counter = Counter(r["pkey"] for r in rows)
         top_pps = [pp for pp, _ in pp_counter.most_common(8)]
+        rank_of = {}
+        names = {}
+        for r in rows:
+            key = (r["pkey"], r["run_date"])
+            if key not in rank_of or r["rank"] < rank_of[key]:
+                rank_of[key] = r["rank"]
+            names[r["pkey"]] = r["display_name"] or r["pain_point"]
 
         colors = [
             "#5b8def", "#9d8abf", "#5ec49e", "#d4a04a",
@@ -685,16 +738,9 @@ def _get_evolution_data() -> dict:
 
         series = []
         for i, pp in enumerate(top_pps):
-            ranks = []
-            for d in dates:
-                rank = next(
-                    (r["rank"] for r in rows if r["run_date"] == d and r["pain_point"] == pp),
-                    None
-                )
-                ranks.append(rank)
             series.append({
-                "name": pp[:20],
-                "data": ranks,
+                "name": names[pp][:20],
+                "data": [rank_of.get((pp, d)) for d in dates],
                 "color": colors[i % len(colors)],
             })
 
@@ -2,11 +2,17 @@
 import sys, os
 sys.stdout.reconfigure(encoding='utf-8')
 import functools
+import json
+import sqlite3
 print = functools.partial(print, flush=True)
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.utils.db import get_db, filter_new_posts, save_posts, get_post_count
+from src.utils.db import (
+    get_db, get_db_stats, backup_db, save_post_tags, get_posts_by_model, save_rankings, search_posts,
+    assign_pain_entities, get_pain_entity, filter_new_posts, save_posts, get_post_count,
+    get_comment_snapshots, update_relevance, get_summary_stats, get_run_summaries,
+)
 
 
 def _make_posts():
@@ -70,6 +76,397 @@ def test_content_hash_dedup():
         conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
 
 
+def test_comment_snapshot_kept():
+    """无评论的重复抓取不覆盖已存评论，快照记录抓取时的回复数"""
+    posts = _make_posts()
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+    posts[0]["comments"] = "[+3] 太贵了"
+    save_posts(posts)
+    save_posts([{**posts[0], "comments": "", "replies": 25}])
+    snaps = get_comment_snapshots(["test_1", "test_2"])
+    assert list(snaps) == ["test_1"]
+    assert snaps["test_1"] == {"comments": "[+3] 太贵了", "comments_replies": 10}
+    # 清理
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+
+
+def test_bulk_filter_chunks():
+    """超过单批 IN 上限的批量过滤：按 id 和内容哈希都能识别旧帖"""
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+    save_posts(_make_posts())
+    batch = [{"id": f"test_bulk_{i}", "content": f"批量帖子 {i}"} for i in range(1200)]
+    batch.append({"id": "test_2", "content": "内容已变"})  # id 命中
+    batch.append({"id": "test_bulk_x", "content": "显卡散热不行"})  # 内容哈希命中
+    new = filter_new_posts(batch)
+    assert len(new) == 1200
+    assert all(p["id"].startswith("test_bulk_") and p["id"] != "test_bulk_x" for p in new)
+    # 清理
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+
+
+def test_update_relevance_only():
+    """相关性回写只改 relevance 两列，未判定(-1)的帖子不动"""
+    posts = _make_posts()
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+    save_posts(posts)
+    posts[0].update({"_relevance_class": 2, "_relevance_reason": "fast_pass", "replies": 999})
+    update_relevance(posts)
+    with get_db() as conn:
+        rows = {r["id"]: r for r in conn.execute(
+            "SELECT id, replies, relevance_class, relevance_reason FROM posts WHERE id LIKE 'test_%'")}
+    assert (rows["test_1"]["relevance_class"], rows["test_1"]["relevance_reason"]) == (2, "fast_pass")
+    assert rows["test_1"]["replies"] == 10
+    assert rows["test_2"]["relevance_class"] == -1
+    # 清理
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+
+
+def test_connection_reuse():
+    """同线程复用连接，嵌套共享事务，只读连接拒绝写入"""
+    with get_db() as conn:
+        pass
+    before = get_db_stats()
+    with get_db() as outer:
+        with get_db() as inner:
+            assert inner is outer
+            inner.execute("DELETE FROM posts WHERE id = 'test_reuse'")
+        assert outer.in_transaction  # 内层退出不提交
+    after = get_db_stats()
+    assert after["connections_opened"] == before["connections_opened"]
+    assert after["queries"] > before["queries"]
+    assert after["transactions"] == before["transactions"] + 1
+
+    with get_db(readonly=True) as ro:
+        assert ro is not outer
+        try:
+            ro.execute("DELETE FROM posts WHERE id = 'test_reuse'")
+            assert False, "只读连接不应允许写入"
+        except sqlite3.OperationalError:
+            pass
+
+
+def test_backup_db():
+    """在线备份：gzip 压缩后可还原，超出保留数的旧备份被清理"""
+    import gzip
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for name in ("gpu_insight_20200101_0000.db.gz", "gpu_insight_20200102_0000.db.gz"):
+            (tmp / name).write_bytes(b"")
+        entry = backup_db(max_backups=2, compress=True, backup_dir=tmp)
+        assert entry["size_bytes"] > 0 and entry["db_bytes"] >= entry["size_bytes"]
+        names = sorted(p.name for p in tmp.glob("gpu_insight_*"))
+        assert names == ["gpu_insight_20200102_0000.db.gz", entry["file"]]
+        assert (tmp / "backup_log.jsonl").exists()
+
+        restored = tmp / "restored.db"
+        restored.write_bytes(gzip.decompress((tmp / entry["file"]).read_bytes()))
+        conn = sqlite3.connect(str(restored))
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        conn.close()
+
+
+def test_link_tables():
+    """打标回写 post_gpu_tags；排名的 source_urls 入库时解析为 post_id"""
+    posts = _make_posts()
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+        conn.execute("DELETE FROM post_gpu_tags WHERE post_id LIKE 'test_%'")
+    save_posts(posts)
+    posts[0]["_gpu_tags"] = {"brands": ["NVIDIA"], "models": ["RTX 5090"], "series": ["RTX 50"], "manufacturers": []}
+    posts[1]["_gpu_tags"] = {"brands": ["AMD"], "models": [], "series": [], "manufacturers": []}
+    save_post_tags(posts)
+    assert [p["id"] for p in get_posts_by_model("RTX 5090", source="test")] == ["test_1"]
+
+    save_rankings([{"rank": 1, "pain_point": "test_痛点", "pphi_score": 1,
+                    "gpu_tags": posts[0]["_gpu_tags"], "source_urls": ["http://a", "http://missing"]},
+                   {"rank": 2, "pain_point": "test_痛点2", "pphi_score": 1,
+                    "gpu_tags": {}, "source_urls": [], "source_post_ids": ["test_2"]}])
+    with get_db() as conn:
+        hid = conn.execute("SELECT MAX(id) FROM pphi_history WHERE pain_point = 'test_痛点'").fetchone()[0]
+        links = conn.execute("SELECT url, post_id, source FROM history_posts WHERE history_id = ? ORDER BY seq",
+                             (hid,)).fetchall()
+        models = conn.execute("SELECT value FROM history_gpu_tags WHERE history_id = ? AND kind = 'models'",
+                              (hid,)).fetchall()
+        assert [tuple(r) for r in links] == [("http://a", "test_1", "test"), ("http://missing", None, None)]
+        assert [r[0] for r in models] == ["RTX 5090"]
+        # 批量插入后按 id 对应回各自排名
+        assert [tuple(r) for r in conn.execute(
+            "SELECT post_id FROM history_posts WHERE history_id = ?", (hid + 1,))] == [("test_2",)]
+        # 清理
+        conn.execute("DELETE FROM history_posts WHERE history_id IN (?, ?)", (hid, hid + 1))
+        conn.execute("DELETE FROM history_gpu_tags WHERE history_id IN (?, ?)", (hid, hid + 1))
+        conn.execute("DELETE FROM pphi_history WHERE id IN (?, ?)", (hid, hid + 1))
+        conn.execute("DELETE FROM post_gpu_tags WHERE post_id LIKE 'test_%'")
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+
+
+def test_search_posts():
+    """全文检索：trigram 匹配正文，短词退化为 LIKE，来源过滤生效"""
+    posts = _make_posts()
+    posts[0]["content"] = "RTX 5090 太贵了，12VHPWR 接口还会烧"
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+    save_posts(posts)
+    hits = search_posts("12VHPWR", source="test")
+    assert [h["id"] for h in hits] == ["test_1"]
+    assert "<mark>12VHPWR</mark>" in hits[0]["snippet"]
+    assert [h["id"] for h in search_posts("驱动", source="test")] == ["test_2"]
+    assert search_posts("12VHPWR", source="nga") == []
+    # 再次保存时未带正文（非热帖不抓正文）：索引保留原正文
+    save_posts([{**posts[0], "content": ""}])
+    assert [h["id"] for h in search_posts("12VHPWR", source="test")] == ["test_1"]
+    # 删除帖子时触发器同步删除索引行
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+    assert search_posts("12VHPWR", source="test") == []
+
+
+def test_pain_entities():
+    """痛点实体：别名命中同一 id；跨实体合并后旧 id 指向主实体"""
+    with get_db() as conn:
+        conn.execute("DELETE FROM pain_point_aliases WHERE alias_key LIKE 'test_%'")
+        conn.execute("DELETE FROM pain_point_entities WHERE norm_key LIKE 'test_%'")
+    a, b = assign_pain_entities([
+        {"key": "test_价格昂贵", "display_name": "test_价格昂贵", "aliases": {}},
+        {"key": "test_太贵", "display_name": "test_太贵", "aliases": {}},
+    ])
+    assert a != b
+    assert assign_pain_entities([{"key": "test_价格昂贵", "display_name": "test_价格昂贵（新）",
+                                  "aliases": {}}]) == [a]
+    merged = assign_pain_entities([{"key": "test_价格昂贵", "display_name": "test_价格过高",
+                                    "aliases": {"test_太贵": "test_太贵"}}])
+    assert merged == [min(a, b)]
+    entity = get_pain_entity(max(a, b))
+    assert entity["id"] == min(a, b)
+    assert entity["display_name"] == "test_价格过高"
+    assert set(entity["aliases"]) >= {"test_价格昂贵", "test_太贵"}
+    # 清理
+    with get_db() as conn:
+        conn.execute("DELETE FROM pain_point_aliases WHERE entity_id IN (?, ?)", (a, b))
+        conn.execute("DELETE FROM pain_point_entities WHERE id IN (?, ?)", (a, b))
+
+
+def test_summary_tables():
+    """汇总表随写入增量更新，并与原始表全量聚合一致"""
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+        conn.execute("DELETE FROM pphi_history WHERE pain_point LIKE 'test_%'")
+    before = get_summary_stats()
+    posts = _make_posts()
+    save_posts(posts)
+    save_posts(posts)  # 重复写入只更新，不重复计数
+    posts[0]["_relevance_class"] = 0
+    posts[1]["_relevance_class"] = 2
+    update_relevance(posts)
+    after = get_summary_stats()
+    assert after["total_posts"] == before["total_posts"] + 3
+    assert after["by_source"]["test"] == 3
+    assert after["dropped"] == before["dropped"] + 1
+    assert after["kept"] == before["kept"] + 1
+
+    save_rankings([
+        {"rank": 1, "pain_point": "test_汇总A", "pphi_score": 9.5, "hidden_need": "需要降价"},
+        {"rank": 2, "pain_point": "test_汇总B", "pphi_score": 3.0},
+    ])
+    run = get_run_summaries(limit=1)[0]
+    assert (run["pain_count"], run["top_pphi"], run["needs_count"]) == (2, 9.5, 1)
+    assert run["top_pains"].endswith("test_汇总A,test_汇总B")
+    assert get_summary_stats()["total_pains"] == after["total_pains"] + 2
+
+    with get_db() as conn:
+        # 与原始表聚合对照
+        assert get_summary_stats()["total_posts"] == conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        assert get_summary_stats()["total_runs"] == conn.execute(
+            "SELECT COUNT(DISTINCT run_date) FROM pphi_history").fetchone()[0]
+        # 清理
+        conn.execute("DELETE FROM pphi_history WHERE pain_point LIKE 'test_%'")
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+    final = get_summary_stats()
+    assert final["total_posts"] == before["total_posts"]
+    assert final["total_pains"] == before["total_pains"]
+    assert final["dropped"] == before["dropped"]
+
+
+def test_schema_migrations():
+    """旧库按 user_version 升级到最新并分批回填；已是最新时不再执行任何步骤"""
+    import contextlib
+    import io
+    import json
+    import tempfile
+    from pathlib import Path
+    import src.utils.db as db_mod
+    from src.utils.migrations import SCHEMA_VERSION, migrate, run_backfills
+
+    tmp = tempfile.mktemp(suffix=".db")
+    conn = sqlite3.connect(tmp)
+    conn.execute("""CREATE TABLE posts (
+        id TEXT PRIMARY KEY, source TEXT NOT NULL, content_hash TEXT NOT NULL,
+        title TEXT, url TEXT, replies INTEGER DEFAULT 0, likes INTEGER DEFAULT 0,
+        gpu_tags TEXT, timestamp TEXT, created_at TEXT DEFAULT (datetime('now')))""")
+    conn.executemany("INSERT INTO posts (id, source, content_hash, title, gpu_tags) VALUES (?, 'nga', 'h', ?, ?)",
+                     [(f"nga_{i}", f"帖子 {i}", json.dumps({"models": ["RTX 5090"]})) for i in range(25)])
+    conn.commit()
+    conn.close()
+
+    original_path, original_init = db_mod.DB_PATH, db_mod._initialized
+    db_mod.DB_PATH, db_mod._initialized = Path(tmp), False
+    try:
+        conn = sqlite3.connect(tmp, isolation_level=None)
+        assert migrate(conn) == SCHEMA_VERSION
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert conn.execute("SELECT COUNT(*) FROM post_gpu_tags").fetchone()[0] == 25
+        assert conn.execute("SELECT COUNT(*) FROM posts_fts").fetchone()[0] == 25
+        # 回填可断点续跑：游标之后的行才会补
+        conn.execute("DELETE FROM post_gpu_tags WHERE post_id != 'nga_0'")
+        conn.execute("UPDATE schema_backfills SET done = 0, cursor = 20 WHERE name = 'post_gpu_tags'")
+        run_backfills(conn, batch=2)
+        assert conn.execute("SELECT COUNT(*) FROM post_gpu_tags").fetchone()[0] == 6
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            migrate(conn)
+        assert "schema 迁移" not in out.getvalue()
+        conn.close()
+        assert get_post_count()["total"] == 25
+    finally:
+        db_mod.close_db()
+        db_mod.DB_PATH, db_mod._initialized = original_path, original_init
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(tmp + suffix):
+                os.unlink(tmp + suffix)
+
+
+def test_near_duplicates():
+    """转载帖跨批次归入首帖所在簇，不同内容不受影响"""
+    from src.cleaners.near_dup import find_near_duplicates, get_cluster
+    story = "VideoCardz 消息：RTX 5080 Super 将配备 24GB GDDR7 显存，预计明年一月 CES 发布，功耗维持 360W 不变"
+    config = {"near_dup": {"threshold": 0.6}}
+
+    def cleanup():
+        with get_db() as conn:
+            conn.execute("DELETE FROM near_dup_bands WHERE post_id LIKE 'test_nd%'")
+            conn.execute("DELETE FROM post_minhash WHERE post_id LIKE 'test_nd%'")
+
+    cleanup()
+    first, stats = find_near_duplicates([
+        {"id": "test_nd1", "source": "videocardz", "title": "RTX 5080 Super", "content": story},
+        {"id": "test_nd2", "source": "nga", "title": "驱动问题", "content": "新驱动装完以后显示器间歇性黑屏，换了线材也没用，有人遇到过吗"},
+    ], config)
+    assert len(first) == 2 and stats["duplicates"] == 0
+    kept, stats = find_near_duplicates([
+        {"id": "test_nd3", "source": "reddit", "title": "RTX 5080 Super", "content": story + "（转自 VideoCardz）"},
+        {"id": "test_nd4", "source": "mydrivers", "title": "RTX 5080 Super", "content": "快讯：" + story},
+    ], config)
+    assert kept == [] and stats["duplicates"] == 2
+    assert [m["post_id"] for m in get_cluster("test_nd4")][0] == "test_nd1"
+    # 同一帖子再次出现：沿用原簇，首帖仍保留
+    kept, _ = find_near_duplicates([first[0]], config)
+    assert kept == [first[0]]
+    cleanup()
+
+
+def test_save_posts_fallback_keeps_outer_writes():
+    """脏数据回退逐条写入时，外层事务中尚未提交的写入不受影响"""
+    with get_db() as conn:
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_sp%'")
+    with get_db() as conn:
+        conn.execute("INSERT INTO posts (id, source, content_hash) VALUES ('test_sp_outer', 'test', 'x')")
+        save_posts([
+            {"id": "test_sp_good", "source": "test", "title": "RTX 5090", "content": "RTX 5090 花屏"},
+            {"id": "test_sp_bad", "source": None, "title": "脏数据"},  # source NOT NULL
+        ])
+    with get_db() as conn:
+        ids = {r[0] for r in conn.execute("SELECT id FROM posts WHERE id LIKE 'test_sp%'")}
+        conn.execute("DELETE FROM posts WHERE id LIKE 'test_sp%'")
+    assert ids == {"test_sp_outer", "test_sp_good"}
+
+
+def test_tag_cache():
+    """GPU 标签按 (内容哈希, 产品配置版本) 复用；型号提及数随 post_gpu_tags 增量维护"""
+    import src.utils.gpu_tagger as tagger
+    from src.utils.db import get_model_mentions
+
+    def cleanup():
+        with get_db() as conn:
+            conn.execute("DELETE FROM post_gpu_tags WHERE post_id LIKE 'test_%'")
+            conn.execute("DELETE FROM posts WHERE id LIKE 'test_%'")
+
+    def mentions(model):
+        return dict(get_model_mentions(1000)).get(model, 0)
+
+    cleanup()
+    before = mentions("RTX 5090")
+    posts = tagger.tag_posts(_make_posts())
+    save_posts(posts)
+    assert mentions("RTX 5090") == before + 1
+    expected = [p["_gpu_tags"] for p in posts]
+
+    # 新进程：内存缓存为空，标签从 posts 行取回，不重新匹配
+    calls = []
+    original = tagger._tag_text
+    tagger._tag_text = lambda title, content: calls.append(title) or original(title, content)
+    try:
+        tagger._tag_cache.clear()
+        again = tagger.tag_posts(_make_posts())
+        assert [p["_gpu_tags"] for p in again] == expected and calls == []
+        changed = _make_posts()
+        changed[0]["content"] = "RTX 5090 太贵了，还是 RTX 4090 划算"
+        tagger.tag_posts(changed)
+        assert calls == ["RTX 5090 太贵了"]
+        save_post_tags(changed)
+        assert mentions("RTX 4090") >= 1
+
+        # 产品配置版本变化：只重打过期的行
+        with get_db() as conn:
+            conn.execute("UPDATE posts SET tag_version = 'stale' WHERE id = 'test_2'")
+        calls.clear()
+        tagger._tag_cache.clear()
+        assert tagger.retag_stale_posts() >= 1
+        assert "AMD 驱动又崩了" in calls and "RTX 5090 太贵了" not in calls
+        with get_db() as conn:
+            version = conn.execute("SELECT tag_version FROM posts WHERE id = 'test_2'").fetchone()[0]
+        assert version == tagger.products_version()
+
+        # 没有已索引正文的旧行：保留抓取时的标签（正文里的型号不能丢）
+        legacy = {"id": "test_legacy", "source": "test", "title": "驱动更新后黑屏怎么办",
+                  "content": "RTX 4090 华硕猛禽", "url": "http://legacy"}
+        save_posts(tagger.tag_posts([legacy]))
+        with get_db() as conn:
+            conn.execute("UPDATE posts SET tag_version = NULL, tag_hash = NULL WHERE id = 'test_legacy'")
+            conn.execute("""UPDATE posts_fts SET content = ''
+                            WHERE rowid = (SELECT rowid FROM posts WHERE id = 'test_legacy')""")
+        tagger.retag_stale_posts()
+        assert "test_legacy" in [p["id"] for p in get_posts_by_model("RTX 4090")]
+        with get_db() as conn:
+            row = conn.execute("SELECT tag_version, tag_hash FROM posts WHERE id = 'test_legacy'").fetchone()
+        assert tuple(row) == (tagger.products_version(), None)
+
+        # 再次保存时只有标题：重打仍按已索引的正文，正文里的型号保留
+        body = {"id": "test_resaved", "source": "test", "title": "花屏求助",
+                "content": "RTX 4070 Ti 超频后花屏", "url": "http://resaved"}
+        save_posts(tagger.tag_posts([body]))
+        save_posts([{**body, "content": ""}])
+        with get_db() as conn:
+            conn.execute("UPDATE posts SET tag_version = 'stale' WHERE id = 'test_resaved'")
+        tagger._tag_cache.clear()
+        tagger.retag_stale_posts()
+        with get_db() as conn:
+            row = conn.execute("SELECT gpu_tags, tag_hash FROM posts WHERE id = 'test_resaved'").fetchone()
+        assert "RTX 4070 Ti" in json.loads(row[0])["models"] and row[1] is not None
+    finally:
+        tagger._tag_text = original
+    assert mentions("RTX 5090") == before + 1
+    cleanup()
+    assert mentions("RTX 5090") == before
+
+
 if __name__ == "__main__":
     test_filter_new_posts()
     print("第一次过滤: 3/3 条新帖 ✓")
@@ -79,4 +476,30 @@ if __name__ == "__main__":
     print("混合过滤: 1/3 条新帖 ✓")
     test_content_hash_dedup()
     print("内容去重: 0/1 条新帖 ✓")
+    test_comment_snapshot_kept()
+    print("评论快照保留 ✓")
+    test_bulk_filter_chunks()
+    print("批量分块过滤 ✓")
+    test_update_relevance_only()
+    print("相关性窄更新 ✓")
+    test_connection_reuse()
+    print("连接复用 ✓")
+    test_backup_db()
+    print("在线备份 ✓")
+    test_link_tables()
+    print("关联表 ✓")
+    test_search_posts()
+    print("全文检索 ✓")
+    test_pain_entities()
+    print("痛点实体 ✓")
+    test_summary_tables()
+    print("汇总表 ✓")
+    test_schema_migrations()
+    print("schema 迁移 ✓")
+    test_near_duplicates()
+    print("近似去重 ✓")
+    test_save_posts_fallback_keeps_outer_writes()
+    print("保存点回退 ✓")
+    test_tag_cache()
+    print("GPU 标签缓存 ✓")
     print("\n全部通过!")
@@ -109,6 +109,23 @@ def test_no_match():
     return True
 
 
+def test_matcher_edge_cases():
+    """锚点预筛不改变结果：重叠命中、数字 / 字母粘连、Unicode 词边界、大小写折叠"""
+    cases = [
+        ("4070ti 发热", ["RTX 4070", "RTX 4070 Super", "RTX 4070 Ti", "RTX 4070 Ti Super"], ["NVIDIA"]),
+        ("x5090 and 50900", [], []),
+        ("AMD显卡 n卡", [], ["NVIDIA"]),
+        ("İntel Arc A770", ["Arc A770"], ["INTEL"]),
+        ("rtx  4090 / 9070xt", ["RTX 4090", "RX 9070", "RX 9070 XT"], ["AMD", "NVIDIA"]),
+    ]
+    for text, models, brands in cases:
+        result = tag_gpu_products(text)
+        assert result["models"] == models, f"'{text}' -> {result['models']}"
+        assert result["brands"] == brands, f"'{text}' -> {result['brands']}"
+        print(f"  PASS: '{text}' -> {result['models']}")
+    return True
+
+
 class TestBrandPrecision:
     """品牌精确化测试 — 标题优先策略（30 条标注样本）"""
 
@@ -269,6 +286,9 @@ if __name__ == "__main__":
     print("[5] 无 GPU 内容")
     results.append(test_no_match())
     print()
+    print("[6] 预筛边界情况")
+    results.append(test_matcher_edge_cases())
+    print()
 
     total = len(results)
     passed = sum(results)
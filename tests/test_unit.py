@@ -7,6 +7,15 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from src.scrapers.base_scraper import BaseScraper
+
+
+class _Scraper(BaseScraper):
+    """不抓取任何帖子的最小爬虫，用于测试基类行为"""
+
+    def fetch_posts(self, last_id=None):
+        return []
+
 
 class TestConfig:
     """测试配置加载"""
@@ -47,6 +56,35 @@ class TestCleaner:
         result = _deduplicate(posts)
         assert len(result) == 2
 
+    def test_minhash_similarity(self):
+        from src.cleaners.near_dup import minhash, similarity
+        a = "rtx5090显卡首发评测功耗高达575w需要新的12v2x6供电接口散热表现出色但价格昂贵"
+        b = "rtx5090显卡首发评测功耗高达575w需要新的12v2x6供电接口散热表现很好但价格昂贵"
+        c = "amd驱动更新后游戏频繁黑屏回滚旧版驱动才恢复正常建议大家暂时不要升级"
+        assert minhash(a) == minhash(a)
+        assert similarity(minhash(a), minhash(b)) > 0.7
+        assert similarity(minhash(a), minhash(c)) < 0.2
+
+    def test_convert_traditional(self):
+        import opencc
+        from src.cleaners import _convert_traditional
+        from src.cleaners.t2s import convert_texts, needs_conversion, shutdown_pool
+        trad = "這張顯示卡的驅動程式有問題，遊戲時經常當機"
+        expected = opencc.OpenCC("t2s").convert(trad)
+        assert not needs_conversion("RTX 5090 driver crash")
+        assert not needs_conversion("显卡驱动有问题")
+        assert needs_conversion(trad)
+        posts = _convert_traditional([{"title": "RTX 5090 review", "content": trad}])
+        assert posts[0]["title"] == "RTX 5090 review"
+        assert posts[0]["content"] == expected
+        # 进程池路径结果一致
+        texts = [trad + str(i) for i in range(8)] + ["plain english"]
+        config = {"cleaning": {"t2s": {"pool_min": 2, "workers": 2}}}
+        try:
+            assert convert_texts(texts, config) == [expected + str(i) for i in range(8)] + ["plain english"]
+        finally:
+            shutdown_pool()
+
     def test_truncate(self):
         from src.cleaners import _truncate
         posts = [{"content": "a" * 3000}]
@@ -413,3 +451,440 @@ class TestQualityTier:
         from src.rankers import _classify_quality_tier
         data = {}
         assert _classify_quality_tier(data) == "bronze"
+
+
+class TestScrapeAllForums:
+    """并行抓取调度测试（不联网，不写 DB）"""
+
+    def test_parallel_keeps_source_order(self):
+        import time
+        from unittest.mock import patch
+        from src.scrapers import scrape_all_forums
+        config = {
+            "runtime": {"parallel_scraping": True, "scrape_workers": 3, "source_timeout_sec": 30},
+            "sources": {"a": {"enabled": True}, "b": {"enabled": True}, "c": {"enabled": True}},
+        }
+        delays = {"a": 0.3, "b": 0.1, "c": 0.2}  # 先完成的源不应排到前面
+
+        class _Fake:
+            def __init__(self, config):
+                self.deadline = None
+
+            def scrape(self):
+                time.sleep(delays[self.name])
+                return [{"id": f"{self.name}_1", "source": self.name, "title": self.name}]
+
+        scraper_map = {name: type(f"Fake_{name}", (_Fake,), {"name": name}) for name in delays}
+        with patch("src.scrapers._get_scraper_map", return_value=scraper_map), \
+             patch("src.utils.db.get_checkpoint", return_value=None), \
+             patch("src.utils.db.filter_new_posts", side_effect=lambda posts: posts), \
+             patch("src.utils.db.save_posts"), \
+             patch("src.utils.db.save_scrape_run"), \
+             patch("src.utils.db.get_scrape_history", return_value=[]), \
+             patch("src.utils.db.save_checkpoint") as save_cp:
+            posts = scrape_all_forums(config)
+        assert [p["source"] for p in posts] == ["a", "b", "c"]
+        assert save_cp.call_count == 3
+
+
+class TestHttpClients:
+    """按 (host, verify) 共享连接池；爬虫自己的 Cookie 不进共享 Cookie 罐"""
+
+    def test_client_reused_per_host_and_verify(self):
+        from src.scrapers.base_scraper import _get_client, close_http_clients
+        try:
+            client = _get_client("bbs.nga.cn", True)
+            assert _get_client("bbs.nga.cn", True) is client
+            assert _get_client("bbs.nga.cn", False) is not client
+            assert _get_client("www.v2ex.com", True) is not client
+        finally:
+            close_http_clients()
+
+    def test_cookies_do_not_leak_between_scrapers(self, tmp_path):
+        import httpx
+        from unittest.mock import patch
+
+        seen = []
+
+        def handler(request):
+            if request.url.path == "/login":
+                return httpx.Response(302, headers={"Location": "/forum"})
+            seen.append(request.headers.get("Cookie", ""))
+            return httpx.Response(200, text="ok")
+
+        client = httpx.Client(transport=httpx.MockTransport(handler), follow_redirects=True)
+        first = _Scraper("first", {"paths": {"raw_data": str(tmp_path)}})
+        second = _Scraper("second", {"paths": {"raw_data": str(tmp_path)}})
+        with patch("src.scrapers.base_scraper._get_client", return_value=client), \
+             patch.object(BaseScraper, "throttle", return_value=True):
+            assert first.safe_request("https://www.chiphell.com/login", cookies={"auth": "1"})
+            assert second.safe_request("https://www.chiphell.com/forum")
+        assert seen == ["auth=1", ""]  # 重定向后仍带上；另一个爬虫看不到
+        assert "auth" not in client.cookies
+
+
+class TestRateLimiter:
+    """按域名令牌桶（假时钟，不真正 sleep）"""
+
+    def test_registrable_domain(self):
+        from src.scrapers.rate_limiter import registrable_domain
+        assert registrable_domain("https://www.reddit.com/r/nvidia") == "reddit.com"
+        assert registrable_domain("https://old.reddit.com/x") == "reddit.com"
+        assert registrable_domain("https://bbs.nga.cn/thread.php") == "nga.cn"
+        assert registrable_domain("https://news.example.com.cn/a") == "example.com.cn"
+
+    def test_burst_then_wait(self):
+        from src.scrapers.rate_limiter import RateLimiter
+        clock = {"t": 0.0}
+        slept = []
+        limiter = RateLimiter(clock=lambda: clock["t"],
+                              sleep=lambda sec: slept.append(sec) or clock.update(t=clock["t"] + sec))
+        limiter.configure("https://www.v2ex.com", per_minute=60, burst=2)
+        for _ in range(3):
+            assert limiter.acquire("https://www.v2ex.com/api/topics/latest.json")
+        # 前两次走突发预算，第三次按 1/s 等待
+        assert slept == [pytest.approx(1.0)]
+
+    def test_shared_across_subdomains_and_retry_after(self):
+        from src.scrapers.rate_limiter import RateLimiter
+        clock = {"t": 0.0}
+        slept = []
+        limiter = RateLimiter(clock=lambda: clock["t"],
+                              sleep=lambda sec: slept.append(sec) or clock.update(t=clock["t"] + sec))
+        limiter.configure("https://www.reddit.com", per_minute=60, burst=5)
+        limiter.on_throttle("https://old.reddit.com/r/amd", 429, retry_after="12")
+        assert limiter.acquire("https://www.reddit.com/r/nvidia")
+        assert slept[0] >= 12
+        assert limiter.stats()["reddit.com"]["rate_per_min"] == 30.0
+
+    def test_deadline_skips_without_consuming(self):
+        import time
+        from src.scrapers.rate_limiter import RateLimiter
+        clock = {"t": 0.0}
+        slept = []
+        limiter = RateLimiter(clock=lambda: clock["t"],
+                              sleep=lambda sec: slept.append(sec) or clock.update(t=clock["t"] + sec))
+        limiter.configure("https://api.bilibili.com", per_minute=60, burst=1)
+        limiter.on_throttle("https://api.bilibili.com/x", 412)
+        assert not limiter.acquire("https://api.bilibili.com/x", deadline=time.time() + 5)
+        assert slept == []
+
+    def test_persistent_429_counts_as_error(self, tmp_path):
+        """重试用完仍被限流：记为失败，调度器据此放慢该源"""
+        import httpx
+        from unittest.mock import patch
+
+        client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(429)))
+        scraper = _Scraper("fake", {"paths": {"raw_data": str(tmp_path)}})
+        with patch("src.scrapers.base_scraper._get_client", return_value=client), \
+             patch.object(scraper, "throttle", return_value=True), \
+             patch.object(scraper, "report_throttle", return_value=0.0) as report:
+            assert scraper.safe_request("https://test.invalid/x", max_retries=2) is None
+        assert report.call_count == 2
+        assert scraper.request_stats["errors"] == 1
+
+
+class TestConditionalRequest:
+    """ETag / Last-Modified 条件请求缓存（MockTransport，不联网）"""
+
+    def test_304_short_circuits_and_persists_validators(self, tmp_path):
+        import httpx
+        from unittest.mock import patch
+        from src.scrapers.videocardz_scraper import VideoCardzScraper
+
+        def handler(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            html = '<a href="https://videocardz.com/newz/nvidia-rtx-5090-melting-connector">x</a>'
+            return httpx.Response(200, text=html, headers={"ETag": '"v1"'})
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        config = {"paths": {"raw_data": str(tmp_path)}}
+        with patch("src.scrapers.base_scraper._get_client", return_value=client), \
+             patch("src.scrapers.base_scraper.BaseScraper.throttle", return_value=True):
+            first = VideoCardzScraper(config)
+            assert len(first.scrape()) == 1
+            assert not first.not_modified
+
+            second = VideoCardzScraper(config)
+            assert second.scrape() == []
+            assert second.not_modified
+        assert (tmp_path / "videocardz" / ".http_cache.json").exists()
+
+
+class TestEnrichPosts:
+    """热帖详情并发补全"""
+
+    def test_prioritizes_by_replies_and_applies_updates(self, tmp_path):
+        scraper = _Scraper("fake", {"paths": {"raw_data": str(tmp_path)},
+                                    "runtime": {"enrich_workers": 2}})
+        posts = [{"id": f"p{i}", "replies": r} for i, r in enumerate([5, 50, 1, 20, 30])]
+        seen = []
+
+        def fetch(post):
+            seen.append(post["id"])
+            return {"comments": f"c-{post['id']}"} if post["id"] != "p3" else None
+
+        fetched = scraper.enrich_posts(posts, fetch, min_replies=2, max_items=3)
+        assert fetched == 2
+        assert sorted(seen) == ["p1", "p3", "p4"]  # 回复数前三（>2）
+        assert posts[1]["comments"] == "c-p1" and posts[4]["comments"] == "c-p4"
+        assert "comments" not in posts[0] and "comments" not in posts[3]
+        assert scraper.deadline is None
+
+    def test_stage_deadline_is_thread_local(self, tmp_path):
+        """阶段预算只约束工作线程，不改写共享的 scraper.deadline"""
+        import time
+
+        scraper = _Scraper("fake", {"paths": {"raw_data": str(tmp_path)}})
+        scraper.deadline = time.time() + 600
+        seen = []
+
+        def fetch(post):
+            seen.append((scraper.deadline, scraper._deadline_passed()))
+            return None
+
+        scraper.enrich_posts([{"id": "p1", "replies": 5}], fetch, time_budget=0,
+                             use_comment_cache=False)
+        assert seen and seen[0][1] is True  # 工作线程按已耗尽的阶段预算判断
+        assert seen[0][0] == scraper.deadline and not scraper._deadline_passed()
+
+    def test_comment_cache_opt_out(self, tmp_path):
+        """补正文的抓取（NGA）不能被评论快照跳过"""
+        from unittest.mock import patch
+
+        scraper = _Scraper("fake", {"paths": {"raw_data": str(tmp_path)}})
+        snapshot = {"p1": {"comments": "旧评论", "comments_replies": 20}}
+        with patch("src.utils.db.get_comment_snapshots", return_value=snapshot):
+            cached = [{"id": "p1", "replies": 20}]
+            assert scraper.enrich_posts(cached, lambda p: {"content": "正文"}) == 0
+            assert cached[0] == {"id": "p1", "replies": 20, "comments": "旧评论"}
+            fresh = [{"id": "p1", "replies": 20}]
+            assert scraper.enrich_posts(fresh, lambda p: {"content": "正文"}, use_comment_cache=False) == 1
+            assert fresh[0]["content"] == "正文"
+
+
+class TestChiphellFastPath:
+    """Chiphell：有收获的 Cookie 时走 httpx，不启动浏览器"""
+
+    HTML = ('<table><tbody id="normalthread_123"><tr><th><a class="s xst" href="thread-123-1-1.html">'
+            '5090 花屏</a></th><td class="by"><cite><a>u</a></cite></td>'
+            '<td class="num"><a>12</a><em>300</em></td></tr></tbody></table>')
+
+    def test_harvested_cookies_skip_browser(self, tmp_path):
+        import json
+        from unittest.mock import patch, MagicMock
+        from src.scrapers.chiphell_pw_scraper import ChiphellPlaywrightScraper
+
+        scraper = ChiphellPlaywrightScraper({"paths": {"raw_data": str(tmp_path)}})
+        scraper._harvested_file.write_text(json.dumps(
+            [{"name": "cf", "value": "ok", "domain": ".chiphell.com"}]))
+        resp = MagicMock(status_code=200, text=self.HTML)
+        with patch.object(scraper, "safe_request", return_value=resp) as req, \
+             patch("src.scrapers.browser_pool.get_browser_pool") as pool:
+            posts = scraper.fetch_posts()
+        assert [p["id"] for p in posts] == ["chh_123"]
+        assert posts[0]["replies"] == 12
+        assert req.call_args.kwargs["cookies"] == {"cf": "ok"}
+        pool.assert_not_called()
+
+
+class TestCassetteReplay:
+    """HTTP 回放：不联网、不限流，直接解析录制的响应"""
+
+    def test_replay_techpowerup(self, tmp_path):
+        import httpx
+        from unittest.mock import patch
+        from src.scrapers import cassette
+        from src.scrapers.techpowerup_scraper import TechPowerUpScraper
+
+        html = ('<article class="newspost" data-id="1"><h1><a href="/1/rtx-5090-connector-melts" '
+                'class="newslink">RTX 5090 connector melts</a></h1></article>')
+        config = {"paths": {"raw_data": str(tmp_path / "raw"), "cassettes": str(tmp_path / "cas")},
+                  "runtime": {"http_mode": "replay"}}
+        cassette.record(cassette.cassette_dir(config, "techpowerup"), "https://www.techpowerup.com/",
+                        httpx.Response(200, text=html))
+
+        scraper = TechPowerUpScraper(config)
+        with patch("src.scrapers.base_scraper._get_client") as client:
+            posts = scraper.fetch_posts()
+        client.assert_not_called()
+        assert [p["id"] for p in posts] == ["tpu_rtx-5090-connector-melts"]
+        assert scraper.replay_misses == 0
+
+
+class TestScheduler:
+    """自适应调度：零产出退避、限流退避"""
+
+    SCHED = {"enabled": True, "max_backoff_factor": 4, "min_interval_hours": 1}
+
+    def test_interval_factors(self):
+        from src.scrapers.scheduler import effective_interval
+        run = lambda new_posts, rate_limited=0: {"new_posts": new_posts, "rate_limited": rate_limited,
+                                                 "errors": 0, "requests": 10, "not_modified": 0}
+        cfg = {"interval_hours": 4}
+        assert effective_interval(cfg, [], self.SCHED, 4)[0] == 4
+        assert effective_interval(cfg, [run(30)] * 3, self.SCHED, 4) == (4, "正常")
+        assert effective_interval({"interval_hours": 8}, [run(30)] * 3, self.SCHED, 4)[0] == 8
+        assert effective_interval(cfg, [run(0)] * 3, self.SCHED, 4)[0] == 16
+        assert effective_interval(cfg, [run(0)] * 10, self.SCHED, 4)[0] == 16  # 上限 ×4
+        assert effective_interval(cfg, [run(5, rate_limited=1)], self.SCHED, 4)[0] == 8
+
+    def test_plan_skips_backed_off_source(self):
+        from datetime import datetime
+        from unittest.mock import patch
+        from src.scrapers.scheduler import plan_sources
+        run = lambda new_posts: {"new_posts": new_posts, "rate_limited": 0, "errors": 0, "requests": 10,
+                                 "not_modified": 0, "scraped_at": "2026-01-01 00:00:00"}
+        config = {"scheduling": self.SCHED,
+                  "sources": {"quiet": {"interval_hours": 4}, "busy": {"interval_hours": 4}}}
+        history = {
+            "quiet": [run(0)] * 3,
+            "busy": [run(40)] * 3,
+        }
+        with patch("src.utils.db.get_scrape_history", side_effect=lambda name, limit: history[name]):
+            due, skipped = plan_sources(config, ["quiet", "busy"], now=datetime(2026, 1, 1, 4, 0))
+        assert due == ["busy"]
+        assert "quiet" in skipped
+
+
+class TestStreamingPreprocessor:
+    """流式预处理：逐源微批 + 跨源去重，L3 结果与整批一致"""
+
+    class _FakeLLM:
+        def call_simple(self, prompt, system):
+            import re
+            n = int(re.search(r"请分类以下 (\d+) 条", prompt).group(1))
+            return "\n".join("2" for _ in range(n))
+
+    def test_batches_dedup_and_select(self, tmp_path):
+        from src.analyzers.stream import StreamingPreprocessor
+        from src.analyzers.funnel import select_funnel, run_funnel
+        config = {"paths": {"processed_data": str(tmp_path)}}
+        batch_a = [{"id": pid, "title": title, "content": title, "source": "reddit", "_source": "reddit"}
+                   for pid, title in (("a1", "RTX 5090 黑屏 crash"), ("a2", "显卡 驱动 崩溃"))]
+        batch_b = [{"id": pid, "title": title, "content": title, "source": "nga", "_source": "nga"}
+                   for pid, title in (("b1", "RTX 5090 黑屏 crash"), ("b2", "4060 温度高"))]
+
+        stream = StreamingPreprocessor(config, self._FakeLLM(), skip_ai_filter=True)
+        stream.submit("reddit", [dict(p) for p in batch_a])
+        stream.submit("nga", [dict(p) for p in batch_b])
+        classified = stream.finish(timeout=30)
+        assert sorted(p["id"] for p in classified) == ["a1", "a2", "b2"]  # b1 与 a1 内容重复
+
+        deep, _ = select_funnel(classified)
+        deep_batch, _ = run_funnel([dict(p) for p in batch_a] + [dict(batch_b[1])], self._FakeLLM())
+        assert [p["id"] for p in deep] == [p["id"] for p in deep_batch]
+
+
+class TestContentStore:
+    """压缩内容库：按 hash 去重、字典训练后可随机读取、JSONL 压实、分层归档"""
+
+    def test_put_get_and_dictionary(self, tmp_path):
+        from src.utils.content_store import ContentStore
+        from src.utils.db import content_hash
+        store = ContentStore(tmp_path / "c.db", tmp_path / "a.db", {"dict_samples": 30})
+        posts = [{"id": f"nga_{i}", "source": "nga", "title": f"RTX 5090 驱动黑屏 {i}",
+                  "content": f"更新驱动后黑屏 {i} " * 20, "comments": "同样问题 | 回滚驱动解决"}
+                 for i in range(45)]
+        assert store.put_many(posts[:40]) == 40
+        assert store.put_many(posts[:5]) == 0  # 已存在且评论未变，跳过
+        assert store._dict_id is not None
+        store.put_many(posts[40:])  # 用字典压缩的新条目
+        got = store.get(content_hash(posts[7]["content"]))
+        assert got["id"] == "nga_7" and got["comments"] == posts[7]["comments"]
+        assert store.stats()["ratio"] > 2
+
+        # 后续抓取刷新了评论：覆盖旧快照；不带评论的重复抓取不清空已有评论
+        assert store.put_many([dict(posts[7], comments="同样问题 | 回滚驱动解决 | 新驱动已修复")]) == 1
+        assert store.put_many([dict(posts[7], comments="")]) == 0
+        assert store.get(content_hash(posts[7]["content"]))["comments"].endswith("新驱动已修复")
+        assert store.put_many([{"pain_point": "驱动黑屏", "mentions": 3}]) == 0  # 不是帖子
+        store.close()
+
+    def test_compact_and_retier(self, tmp_path):
+        import json
+        from datetime import datetime, timedelta, timezone
+        from src.utils.content_store import ContentStore
+        from src.utils.db import content_hash
+        raw = tmp_path / "raw" / "nga"
+        raw.mkdir(parents=True)
+        posts = [{"id": f"nga_{i}", "source": "nga", "title": f"RTX 5090 驱动黑屏 {i}",
+                  "content": f"更新驱动后黑屏 {i} " * 20} for i in range(10)]
+        (raw / "2020-01-01.jsonl").write_text(
+            "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in posts), encoding="utf-8")
+        (raw / "2099-01-01.jsonl").write_text("", encoding="utf-8")
+        store = ContentStore(tmp_path / "c.db", tmp_path / "a.db")
+        assert store.compact_jsonl([raw], tmp_path / "archive")["files"] == 0  # 默认关闭
+        assert (raw / "2020-01-01.jsonl").exists()
+        result = store.compact_jsonl([raw], tmp_path / "archive", older_than_days=3)
+        assert result["files"] == 1
+        assert not (raw / "2020-01-01.jsonl").exists() and (raw / "2099-01-01.jsonl").exists()
+        assert (tmp_path / "archive" / "nga" / "2020-01-01.jsonl.gz").exists()
+        # 归档不可读（校验失败）时不删原文件
+        (raw / "2020-01-02.jsonl").write_text("{}\n", encoding="utf-8")
+        (tmp_path / "archive" / "nga" / "2020-01-02.jsonl.gz").write_bytes(b"not gzip")
+        assert store.compact_jsonl([raw], tmp_path / "archive", older_than_days=3)["files"] == 0
+        assert (raw / "2020-01-02.jsonl").exists()
+
+        later = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=365)
+        assert store.retier(later) == {"warm": 10, "archive": 10}
+        assert store.get(content_hash(posts[3]["content"]))["id"] == "nga_3"  # 归档后仍可读
+        assert set(store.stats()["tiers"]) == {"archive"}
+        store.close()
+
+    def test_compact_ignores_non_post_files(self, tmp_path):
+        """processed/ 下的痛点、隐藏需求、审核结果只归档，不当作帖子导入"""
+        import json
+        from src.utils.content_store import ContentStore
+        processed = tmp_path / "processed"
+        processed.mkdir()
+        pains = [{"pain_point": f"驱动黑屏 {i}", "mentions": i} for i in range(5)]
+        for name in ("pain_points", "hidden_needs", "reviewed"):
+            (processed / f"{name}_2020-01-01.jsonl").write_text(
+                "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in pains), encoding="utf-8")
+        (processed / "cleaned_2020-01-01.jsonl").write_text(json.dumps(
+            {"id": "nga_1", "title": "4090 花屏", "content": "4090 花屏求助"}, ensure_ascii=False) + "\n",
+            encoding="utf-8")
+        store = ContentStore(tmp_path / "c.db")
+        assert store.compact_jsonl([processed], tmp_path / "archive", older_than_days=3)["files"] == 4
+        assert store._conn.execute("SELECT post_id FROM content").fetchall() == [("nga_1",)]
+        assert (tmp_path / "archive" / "processed" / "pain_points_2020-01-01.jsonl.gz").exists()
+        store.close()
+
+
+class TestColumnar:
+    """测试 Parquet 列式数据集"""
+
+    def test_disabled_is_noop(self, tmp_path):
+        from src.utils import columnar
+        config = {"columnar": {"enabled": False, "path": str(tmp_path)}}
+        assert columnar.write_records("cleaned", [{"id": "1", "source": "nga"}], config) == []
+        if columnar.pa is None:  # 开启但缺 pyarrow：跳过写入，不抛异常
+            config["columnar"]["enabled"] = True
+            assert columnar.write_records("cleaned", [{"id": "1", "source": "nga"}], config) == []
+        assert not any(tmp_path.iterdir())
+
+    def test_partitioned_roundtrip(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        from datetime import datetime
+        from src.utils.columnar import write_records, iter_records
+        config = {"columnar": {"enabled": True, "path": str(tmp_path)}}
+        write_records("cleaned", [
+            {"id": "a", "source": "nga", "likes": 3, "_gpu_tags": {"models": ["RTX 5090"]}},
+            {"id": "b", "source": "reddit", "likes": None},
+        ], config, when=datetime(2026, 1, 1))
+        # 新增列 + 类型放宽
+        write_records("cleaned", [{"id": "c", "source": "nga", "likes": 2.5, "lang": "zh"}],
+                      config, when=datetime(2026, 1, 2))
+        assert (tmp_path / "cleaned" / "date=2026-01-02" / "source=nga").is_dir()
+        rows = list(iter_records("cleaned", columns=["id", "likes", "lang", "source"], config=config))
+        assert rows == [
+            {"id": "a", "likes": 3.0, "lang": None, "source": "nga"},
+            {"id": "b", "likes": None, "lang": None, "source": "reddit"},
+            {"id": "c", "likes": 2.5, "lang": "zh", "source": "nga"},
+        ]
+        assert [r["id"] for r in iter_records("cleaned", columns=["id"], since="2026-01-02",
+                                              sources=["nga"], config=config)] == ["c"]
+        assert json.loads(next(iter_records("cleaned", columns=["_gpu_tags"], config=config))["_gpu_tags"]) \
+            == {"models": ["RTX 5090"]}
@@ -173,6 +173,15 @@ class TestAPI:
         assert data["models"][0]["model"] == "RTX 4090"
         assert data["models"][0]["top_pphi"] == 45.2
 
+    def test_search_api(self):
+        with patch("src.utils.db.search_posts", return_value=[{"id": "reddit_1", "title_hl": "<mark>5090</mark>"}]) as m:
+            r = client.get("/api/search", params={"q": "5090", "source": "reddit"})
+        assert r.status_code == 200
+        data = r.json()
+        assert data["count"] == 1
+        assert m.call_args.kwargs["source"] == "reddit"
+        assert m.call_args.kwargs["model"] is None
+
     def test_weekly_report_api(self):
         r = client.get("/api/weekly-report")
         assert r.status_code == 200